@@ -26,6 +26,10 @@ from models.models import (
     AssessmentDocument,
     QuizDocument,
     QuizAttemptDocument,
+    QuizAttemptSummaryDocument,
+    QuizLeaderboardEntryDocument,
+    BankQuestionDocument,
+    IdempotencyRecordDocument,
     
     # Class & Chat features
     ClassDocument,
@@ -33,6 +37,9 @@ from models.models import (
     
     # AI Recommendation
     RecommendationDocument,
+    
+    # Search
+    SearchEventDocument,
 )
 
 _settings = get_settings()
@@ -66,6 +73,10 @@ async def init_database() -> None:
             AssessmentDocument,
             QuizDocument,
             QuizAttemptDocument,
+            QuizAttemptSummaryDocument,
+            QuizLeaderboardEntryDocument,
+            BankQuestionDocument,
+            IdempotencyRecordDocument,
             
             # Class & Chat features
             ClassDocument,
@@ -73,6 +84,9 @@ async def init_database() -> None:
             
             # AI Recommendation
             RecommendationDocument,
+            
+            # Search
+            SearchEventDocument,
         ],
     )
 
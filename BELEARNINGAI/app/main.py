@@ -7,7 +7,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.database import close_database, init_database
 from config.config import get_settings
 from config.logging_config import setup_logging
+from middleware.rate_limit import RateLimitMiddleware, create_rate_limit_backend
+from middleware.request_context import RequestContextMiddleware
 from routers.routers import api_router
+from services.search_service import flush_search_events
 
 settings = get_settings()
 
@@ -19,6 +22,7 @@ async def lifespan(app: FastAPI):
     setup_logging()
     await init_database()
     yield
+    await flush_search_events()
     await close_database()
 
 
@@ -29,6 +33,20 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Memo/identity map theo từng request (enrollment, Course, User, ...)
+app.add_middleware(RequestContextMiddleware, debug_header=settings.debug)
+
+# Rate limit theo user/IP - tắt khi chạy test suite.
+# Đăng ký trước CORS (middleware thêm sau bọc ngoài) để response 429 vẫn có
+# header CORS - nếu không trình duyệt báo lỗi mạng thay vì 429.
+if settings.rate_limit_enabled and not settings.testing:
+    app.add_middleware(
+        RateLimitMiddleware,
+        requests_per_minute=settings.rate_limit_per_minute,
+        ip_requests_per_minute=settings.rate_limit_per_ip_per_minute,
+        backend=create_rate_limit_backend(settings.rate_limit_backend),
+    )
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.allowed_origins,
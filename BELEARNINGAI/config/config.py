@@ -30,6 +30,10 @@ class Settings(BaseSettings):
     google_api_key: str = Field(..., alias="GOOGLE_API_KEY")
     gemini_model: str = Field(default="gemini-1.5-pro", alias="GEMINI_MODEL")
     
+    # Ngân hàng câu hỏi module: sinh thêm câu hỏi nền khi ngân hàng (module, độ khó) còn ít hơn target
+    question_bank_prefetch_enabled: bool = Field(default=True, alias="QUESTION_BANK_PREFETCH_ENABLED")
+    question_bank_target_size: int = Field(default=60, alias="QUESTION_BANK_TARGET_SIZE")
+    
     # Redis Cache (Optional)
     redis_url: Optional[str] = Field(default="redis://localhost:6379/0", alias="REDIS_URL")
     
@@ -59,7 +63,22 @@ class Settings(BaseSettings):
     
     # Security Settings
     rate_limit_per_minute: int = Field(default=100, alias="RATE_LIMIT_PER_MINUTE")
+    # Bucket chung mỗi IP (mọi user + guest); để trống -> 10 x RATE_LIMIT_PER_MINUTE
+    rate_limit_per_ip_per_minute: Optional[int] = Field(default=None, alias="RATE_LIMIT_PER_IP_PER_MINUTE")
+    rate_limit_enabled: bool = Field(default=True, alias="RATE_LIMIT_ENABLED")
+    rate_limit_backend: str = Field(default="memory", alias="RATE_LIMIT_BACKEND")  # memory|redis
     bcrypt_rounds: int = Field(default=12, alias="BCRYPT_ROUNDS")
+    # Scheme băm mật khẩu mặc định (hash cũ của scheme khác vẫn verify được và được rehash khi login)
+    password_hash_scheme: str = Field(default="argon2", alias="PASSWORD_HASH_SCHEME")
+    # Thời gian verify mục tiêu (ms) cho scripts/calibrate_password_hashing.py
+    password_hash_target_ms: int = Field(default=100, alias="PASSWORD_HASH_TARGET_MS")
+    # Cost cố định cho mọi worker/host - đổi giá trị thì hash cũ được rehash khi login
+    argon2_memory_cost_kib: int = Field(default=65536, alias="ARGON2_MEMORY_COST_KIB")
+    argon2_parallelism: int = Field(default=2, alias="ARGON2_PARALLELISM")
+    argon2_time_cost: int = Field(default=2, alias="ARGON2_TIME_COST")
+    # Pool băm mật khẩu: số worker (mặc định = số CPU) và số request tối đa đang chờ
+    password_hash_workers: Optional[int] = Field(default=None, alias="PASSWORD_HASH_WORKERS")
+    password_hash_queue_limit: int = Field(default=64, alias="PASSWORD_HASH_QUEUE_LIMIT")
     
     # Logging & Monitoring
     log_level: str = Field(default="INFO", alias="LOG_LEVEL")
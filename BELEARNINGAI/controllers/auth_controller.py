@@ -3,6 +3,7 @@ Auth Controller - Xử lý requests liên quan authentication
 Tuân thủ: CHUCNANG.md Section 2.1, ENDPOINTS.md /auth/* routes, API_SCHEMA.md
 """
 
+import asyncio
 from datetime import datetime, timedelta
 from typing import Dict
 from fastapi import HTTPException, status
@@ -56,6 +57,9 @@ async def handle_register(request: RegisterRequest) -> RegisterResponse:
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Email {request.email} đã được sử dụng"
         )
+    except HTTPException:
+        # 503 khi password pool quá tải
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -76,7 +80,7 @@ async def handle_login(request: LoginRequest) -> LoginResponse:
     Raises:
         HTTPException 401: Email hoặc password không đúng hoặc tài khoản inactive
     """
-    # Authenticate user
+    # Authenticate user (projection các field login + verify trong password pool)
     user = await auth_service.authenticate_user(
         email=request.email,
         password=request.password
@@ -95,10 +99,6 @@ async def handle_login(request: LoginRequest) -> LoginResponse:
             detail="Account is inactive"
         )
     
-    # Cập nhật last_login_at
-    user.last_login_at = datetime.utcnow()
-    await user.save()
-    
     # Tạo access token (15 phút)
     access_token = auth_service.create_access_token(
         data={"sub": str(user.id), "email": user.email, "role": user.role}
@@ -111,16 +111,9 @@ async def handle_login(request: LoginRequest) -> LoginResponse:
         expires_delta=refresh_token_expires
     )
     
-    # Lưu refresh token vào database
-    expires_at = datetime.utcnow() + refresh_token_expires
-    await auth_service.save_refresh_token(
-        user_id=str(user.id),
-        token=refresh_token,
-        expires_at=expires_at
-    )
-    
-    # Trả về response theo API_SCHEMA.md
-    return LoginResponse(
+    # Trả về response theo API_SCHEMA.md (build trước khi ghi DB: nếu lỗi thì
+    # không còn task ghi nào bị bỏ dở)
+    response = LoginResponse(
         access_token=access_token,
         refresh_token=refresh_token,
         token_type="Bearer",
@@ -132,6 +125,19 @@ async def handle_login(request: LoginRequest) -> LoginResponse:
             avatar=user.avatar_url
         )
     )
+    
+    # Cập nhật last_login_at ($set atomic) và lưu refresh token song song.
+    # Refresh token phải có trong DB trước khi client nhận được
+    expires_at = datetime.utcnow() + refresh_token_expires
+    await asyncio.gather(
+        auth_service.record_login(str(user.id), user.new_password_hash),
+        auth_service.save_refresh_token(
+            user_id=str(user.id),
+            token=refresh_token,
+            expires_at=expires_at
+        )
+    )
+    return response
 
 
 async def handle_logout(user_id: str) -> LogoutResponse:
@@ -146,6 +152,8 @@ async def handle_logout(user_id: str) -> LogoutResponse:
     """
     # Xóa tất cả refresh tokens của user (logout all devices)
     await auth_service.delete_all_user_tokens(user_id)
+    # Access token đang lưu hành cũng hết hiệu lực ngay
+    await auth_service.revoke_user_access_tokens(user_id)
     
     return LogoutResponse(message="Đăng xuất thành công")
 
@@ -156,6 +164,7 @@ async def logout_all(current_user_id: str) -> Dict:
     Endpoint: POST /auth/logout-all
     """
     count = await auth_service.delete_all_user_tokens(current_user_id)
+    await auth_service.revoke_user_access_tokens(current_user_id)
     
     return {
         "message": f"Đã đăng xuất {count} phiên đăng nhập"
@@ -60,14 +60,12 @@ async def handle_send_chat_message(
             detail="Khóa học không tồn tại"
         )
     
-    # Kiểm tra enrollment (nếu không phải owner)
-    if course.owner_id != user_id:
-        enrollment = await enrollment_service.get_user_enrollment(user_id, course_id)
-        if not enrollment or enrollment.status == "cancelled":
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Bạn cần đăng ký khóa học để sử dụng chatbot"
-            )
+    # Kiểm tra enrollment (owner/admin luôn có quyền)
+    if not await enrollment_service.has_course_access(user_id, course_id, current_user.get("role")):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Bạn cần đăng ký khóa học để sử dụng chatbot"
+        )
     
     # Tìm hoặc tạo conversation
     if request.conversation_id:
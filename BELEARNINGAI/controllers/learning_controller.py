@@ -31,8 +31,7 @@ from schemas.learning import (
 from models.models import Quiz, generate_uuid
 
 # Import services
-from services import learning_service, enrollment_service, course_service
-from services.ai_service import generate_module_quiz
+from services import learning_service, enrollment_service, course_service, question_bank_service
 
 # Setup logger
 logger = logging.getLogger(__name__)
@@ -84,8 +83,7 @@ async def handle_get_module_detail(
         )
     
     # Kiểm tra user đã đăng ký course chưa
-    enrollment = await enrollment_service.get_user_enrollment(user_id, course_id)
-    if not enrollment or enrollment.status == "cancelled":
+    if not await enrollment_service.has_course_access(user_id, course_id, current_user.get("role")):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Bạn cần đăng ký khóa học để xem module"
@@ -152,8 +150,7 @@ async def handle_get_lesson_content(
         )
     
     # Kiểm tra enrollment
-    enrollment = await enrollment_service.get_user_enrollment(user_id, course_id)
-    if not enrollment or enrollment.status == "cancelled":
+    if not await enrollment_service.has_course_access(user_id, course_id, current_user.get("role")):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Bạn cần đăng ký khóa học để xem lesson"
@@ -176,7 +173,7 @@ async def handle_get_lesson_content(
     navigation = lesson_data.get("navigation", {})
     prev_lesson = navigation.get("previous_lesson")
     if prev_lesson and prev_lesson.get("id"):
-        # Nếu có previous lesson, check xem nó đã completed chưa
+        # Nếu có previous lesson, check xem nó đã completed chưa (enrollment đã memo trong request)
         enrollment = await enrollment_service.get_user_enrollment(user_id, course_id)
         if enrollment and prev_lesson.get("id") not in enrollment.completed_lessons:
             # Previous lesson chưa completed, lesson này bị khóa
@@ -221,8 +218,7 @@ async def handle_get_course_modules(
         )
     
     # Kiểm tra enrollment
-    enrollment = await enrollment_service.get_user_enrollment(user_id, course_id)
-    if not enrollment or enrollment.status == "cancelled":
+    if not await enrollment_service.has_course_access(user_id, course_id, current_user.get("role")):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Bạn cần đăng ký khóa học"
@@ -264,8 +260,7 @@ async def handle_get_module_outcomes(
     user_id = current_user.get("user_id")
     
     # Kiểm tra enrollment
-    enrollment = await enrollment_service.get_user_enrollment(user_id, course_id)
-    if not enrollment or enrollment.status == "cancelled":
+    if not await enrollment_service.has_course_access(user_id, course_id, current_user.get("role")):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Bạn cần đăng ký khóa học"
@@ -308,8 +303,7 @@ async def handle_get_module_resources(
     user_id = current_user.get("user_id")
     
     # Kiểm tra enrollment
-    enrollment = await enrollment_service.get_user_enrollment(user_id, course_id)
-    if not enrollment or enrollment.status == "cancelled":
+    if not await enrollment_service.has_course_access(user_id, course_id, current_user.get("role")):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Bạn cần đăng ký khóa học"
@@ -371,15 +365,13 @@ async def handle_generate_module_assessment(
             detail="Khóa học không tồn tại"
         )
     
-    # Verify enrollment (if not owner)
-    if course.owner_id != user_id:
-        enrollment = await enrollment_service.get_user_enrollment(user_id, course_id)
-        if not enrollment or enrollment.status == "cancelled":
-            logger.warning(f"User {user_id} not enrolled in course {course_id}")
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Bạn cần đăng ký khóa học để tạo bài kiểm tra"
-            )
+    # Verify enrollment (owner/admin luôn có quyền)
+    if not await enrollment_service.has_course_access(user_id, course_id, current_user.get("role")):
+        logger.warning(f"User {user_id} not enrolled in course {course_id}")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Bạn cần đăng ký khóa học để tạo bài kiểm tra"
+        )
     
     # Get module with learning outcomes
     module = None
@@ -422,20 +414,24 @@ async def handle_generate_module_assessment(
     }
     difficulty = difficulty_map.get(request.difficulty_preference, "medium")
     
-    # Call AI service to generate questions (with fallback on error)
+    # Lấy câu hỏi từ ngân hàng câu hỏi của module (thiếu thì gọi AI, có fallback)
+    quiz_id = generate_uuid()
     try:
-        quiz_data = await generate_module_quiz(
+        quiz_data = await question_bank_service.get_module_quiz(
+            course_id=course_id,
+            module_id=module_id,
             module_title=module.title,
             learning_outcomes=outcomes_list,
             module_description=module.description,
             question_count=request.question_count or 10,
             difficulty=difficulty,
-            focus_outcomes=request.focus_topics  # Note: focus_topics are skill tags in request
+            focus_outcomes=request.focus_topics,  # Note: focus_topics are skill tags in request
+            seed=quiz_id
         )
         logger.info(f"Quiz generated - {len(quiz_data['questions'])} questions, {quiz_data['total_points']} points")
     except Exception as e:
         # This should not happen anymore since we added fallback in AI service
-        logger.error(f"Unexpected error in generate_module_quiz: {str(e)}", exc_info=True)
+        logger.error(f"Unexpected error in get_module_quiz: {str(e)}", exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Không thể tạo bài kiểm tra lúc này"
@@ -445,16 +441,12 @@ async def handle_generate_module_assessment(
     # This ensures question_id in response matches question_id in DB for quiz submission
     questions_with_ids = []
     for q in quiz_data["questions"]:
-        # Generate unique question_id
-        question_id = str(generate_uuid())
-        
-        # Add question_id to question data
+        # Câu từ ngân hàng giữ id của ngân hàng, câu mới sinh thì tạo id mới
         q_with_id = q.copy()
-        q_with_id["question_id"] = question_id
+        q_with_id["question_id"] = q.get("question_id") or str(generate_uuid())
         questions_with_ids.append(q_with_id)
     
     # Create Quiz document with questions that have question_id
-    quiz_id = generate_uuid()
     quiz = Quiz(
         id=quiz_id,
         course_id=course_id,
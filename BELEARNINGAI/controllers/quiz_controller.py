@@ -2,7 +2,7 @@
 Quiz Controller - Xử lý requests quiz
 Tuân thủ: CHUCNANG.md Section 2.4.3-2.4.7 + 3.3.1-3.3.5, ENDPOINTS.md quiz_router
 
-Controller này xử lý 10 endpoints:
+Controller này xử lý 11 endpoints:
 STUDENT FEATURES (2.4.3-2.4.7):
 - GET /quizzes/{id} - Chi tiết quiz
 - POST /quizzes/{id}/attempt - Làm quiz
@@ -16,15 +16,15 @@ INSTRUCTOR FEATURES (3.3.1-3.3.5):
 - PUT /quizzes/{id} - Update quiz
 - DELETE /quizzes/{id} - Xóa quiz
 - GET /quizzes/{id}/class-results - Xem kết quả cả lớp
+- GET /quizzes/{id}/leaderboard - Bảng xếp hạng lớp
 """
 
 from typing import Dict, Optional, List
-from fastapi import HTTPException, status
+from fastapi import HTTPException, Response, status
 from datetime import datetime
 
 # Import schemas
 from schemas.quiz import (
-    QuizDetailResponse,
     QuizAttemptRequest,
     QuizAttemptResponse,
     QuizResultsResponse,
@@ -40,11 +40,16 @@ from schemas.quiz import (
     QuizUpdateRequest,
     QuizUpdateResponse,
     QuizDeleteResponse,
-    QuizClassResultsResponse
+    QuizClassResultsResponse,
+    QuizLeaderboardResponse
 )
 
 # Import services
-from services import quiz_service, enrollment_service, course_service, ai_service
+from services import (
+    quiz_service, enrollment_service, course_service, ai_service, idempotency_service,
+    class_service, leaderboard_service
+)
+from utils.http_cache import etag_matches
 
 
 # ============================================================================
@@ -53,8 +58,9 @@ from services import quiz_service, enrollment_service, course_service, ai_servic
 
 async def handle_get_quiz_detail(
     quiz_id: str,
-    current_user: Dict
-) -> QuizDetailResponse:
+    current_user: Dict,
+    if_none_match: Optional[str] = None
+) -> Response:
     """
     2.4.3: Lấy thông tin chi tiết quiz
     
@@ -66,12 +72,17 @@ async def handle_get_quiz_detail(
     - Duration
     - Trạng thái attempts của user
     
+    Phần chung của quiz được serialize sẵn một lần cho mỗi phiên bản quiz
+    (cả lớp mở cùng quiz chỉ build một lần); ETag theo phiên bản quiz và
+    summary attempts của user, If-None-Match khớp -> 304 không build body.
+    
     Args:
         quiz_id: ID của quiz
         current_user: User hiện tại
+        if_none_match: Header If-None-Match (optional)
         
     Returns:
-        QuizDetailResponse
+        Response JSON theo QuizDetailResponse, hoặc 304 Not Modified
         
     Raises:
         404: Quiz không tồn tại
@@ -81,37 +92,44 @@ async def handle_get_quiz_detail(
     """
     user_id = current_user.get("user_id")
     
-    # Lấy quiz
-    quiz = await quiz_service.get_quiz_by_id(quiz_id)
-    if not quiz:
+    # Lấy phiên bản quiz (không load questions)
+    version = await quiz_service.get_quiz_version(quiz_id)
+    if not version:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Quiz không tồn tại"
         )
     
     # Kiểm tra enrollment nếu quiz thuộc course
-    if quiz.course_id:
-        enrollment = await enrollment_service.get_user_enrollment(user_id, quiz.course_id)
-        if not enrollment or enrollment.status == "cancelled":
+    if version.course_id:
+        if not await enrollment_service.has_course_access(user_id, version.course_id, current_user.get("role")):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Bạn cần đăng ký khóa học để xem quiz"
             )
     
-    # Lấy attempts của user
-    attempts = await quiz_service.get_user_quiz_attempts(user_id, quiz_id)
-    
-    return QuizDetailResponse(
-        id=str(quiz.id),
-        title=quiz.title,
-        description=quiz.description,
-        question_count=len(quiz.questions),  # Fix: add missing field
-        time_limit=quiz.time_limit_minutes,  # Fix: correct field name
-        pass_threshold=int(quiz.passing_score),  # Fix: correct field name and type
-        mandatory_question_count=sum(1 for q in quiz.questions if q.get("is_mandatory", False)),  # Fix: calculate
-        user_attempts=len(attempts),  # Fix: should be int, not list
-        best_score=max([a.score for a in attempts]) if attempts else None,
-        last_attempt_at=attempts[0].started_at if attempts else None
+    # Summary attempts của user (một point lookup)
+    summary = await quiz_service.get_attempt_summary(user_id, quiz_id)
+    
+    # Dữ liệu theo user nên chỉ cho client cache riêng và luôn revalidate
+    headers = {
+        "ETag": quiz_service.student_quiz_etag(quiz_id, version.updated_at, summary),
+        "Cache-Control": "private, no-cache"
+    }
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    payload = await quiz_service.get_student_quiz_payload(quiz_id, version.updated_at)
+    if not payload:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Quiz không tồn tại"
+        )
+    
+    return Response(
+        content=quiz_service.render_student_quiz(payload, summary),
+        media_type="application/json",
+        headers=headers
     )
 
 
@@ -122,7 +140,8 @@ async def handle_get_quiz_detail(
 async def handle_attempt_quiz(
     quiz_id: str,
     request: QuizAttemptRequest,
-    current_user: Dict
+    current_user: Dict,
+    idempotency_key: Optional[str] = None
 ) -> QuizAttemptResponse:
     """
     2.4.4: Submit answers cho quiz
@@ -132,11 +151,17 @@ async def handle_attempt_quiz(
     - Điều kiện pass: score >= 70% VÀ tất cả mandatory questions correct
     - Tính thời gian làm bài
     - Lưu attempt vào DB
+    - Bài nộp ghi vào attempt đang làm bằng update có điều kiện "chưa nộp":
+      request nộp trùng đồng thời (double-click) nhận lại kết quả đã lưu,
+      không ghi thêm attempt
+    - Có Idempotency-Key: gửi lại cùng key (kể cả sau khi request đầu đã xong)
+      trả kết quả lần nộp đầu, không chấm điểm/tạo attempt lần nữa
     
     Args:
         quiz_id: ID của quiz
         request: QuizAttemptRequest (answers list)
         current_user: User hiện tại
+        idempotency_key: Header Idempotency-Key (optional)
         
     Returns:
         QuizAttemptResponse (score, passed, total_questions)
@@ -145,9 +170,38 @@ async def handle_attempt_quiz(
         404: Quiz không tồn tại
         403: Vượt quá max_attempts
         400: Thiếu answers
+        409: Request cùng Idempotency-Key đang được xử lý
+        422: Idempotency-Key đã dùng cho bài nộp khác
         
     Endpoint: POST /api/v1/quizzes/{id}/attempt
     """
+    if not idempotency_key:
+        return await _attempt_quiz(quiz_id, request, current_user)
+    
+    response = await idempotency_service.run_idempotent(
+        user_id=current_user.get("user_id"),
+        scope=f"quiz_attempt:{quiz_id}",
+        key=idempotency_key,
+        payload=request.model_dump(mode="json"),
+        handler=lambda: _attempt_quiz(quiz_id, request, current_user),
+        status_code=status.HTTP_201_CREATED
+    )
+    return QuizAttemptResponse.model_validate(response)
+
+
+def _attempts_exhausted_error(quiz) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail=f"Bạn đã hết lượt làm quiz (max: {quiz.max_attempts})"
+    )
+
+
+async def _attempt_quiz(
+    quiz_id: str,
+    request: QuizAttemptRequest,
+    current_user: Dict
+) -> QuizAttemptResponse:
+    """Chấm điểm và lưu attempt (logic của handle_attempt_quiz)."""
     user_id = current_user.get("user_id")
     
     # Lấy quiz
@@ -160,20 +214,20 @@ async def handle_attempt_quiz(
     
     # Kiểm tra enrollment
     if quiz.course_id:
-        enrollment = await enrollment_service.get_user_enrollment(user_id, quiz.course_id)
-        if not enrollment or enrollment.status == "cancelled":
+        if not await enrollment_service.has_course_access(user_id, quiz.course_id, current_user.get("role")):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Bạn cần đăng ký khóa học"
             )
     
-    # Kiểm tra max attempts
-    attempts = await quiz_service.get_user_quiz_attempts(user_id, quiz_id)
-    if len(attempts) >= quiz.max_attempts and quiz.max_attempts > 0:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail=f"Bạn đã hết lượt làm quiz (max: {quiz.max_attempts})"
-        )
+    # Kiểm tra max attempts (chặn sớm trước khi chấm điểm; create_quiz_attempt
+    # kiểm tra lại atomic). Attempt đang làm vẫn nộp được.
+    summary = await quiz_service.get_attempt_summary(user_id, quiz_id)
+    if (
+        summary and not summary.live_attempt_id
+        and 0 < quiz.max_attempts <= summary.attempt_count
+    ):
+        raise _attempts_exhausted_error(quiz)
     
     # Validate answers
     if not request.answers or len(request.answers) != len(quiz.questions):
@@ -199,10 +253,8 @@ async def handle_attempt_quiz(
     )
     
     if not attempt:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Không thể lưu kết quả quiz"
-        )
+        # Quiz đã tồn tại -> None nghĩa là request đồng thời khác đã dùng lượt cuối
+        raise _attempts_exhausted_error(quiz)
     
     # Ensure submitted_at is set
     if not attempt.submitted_at:
@@ -305,9 +357,9 @@ async def handle_retake_quiz(
     
     Flow:
     - Lấy quiz gốc
-    - Sử dụng AI để sinh câu hỏi mới (similar difficulty)
-    - Tạo quiz mới
-    - Return quiz_id mới
+    - Tạo attempt mới
+    - Xáo trộn câu hỏi quiz gốc theo seed = attempt id (không insert quiz mới,
+      bài làm lại chấm bằng answer key của quiz gốc)
     
     Args:
         quiz_id: ID của quiz gốc
@@ -330,18 +382,21 @@ async def handle_retake_quiz(
     
     # Kiểm tra enrollment
     if original_quiz.course_id:
-        enrollment = await enrollment_service.get_user_enrollment(user_id, original_quiz.course_id)
-        if not enrollment or enrollment.status == "cancelled":
+        if not await enrollment_service.has_course_access(user_id, original_quiz.course_id, current_user.get("role")):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Bạn cần đăng ký khóa học"
             )
     
-    # Generate new quiz attempt
-    new_attempt = await quiz_service.create_new_attempt(user_id, original_quiz.id)
+    # Mở attempt mới (hoặc lấy attempt đang làm chưa nộp)
+    new_attempt = await quiz_service.create_new_attempt(
+        user_id, original_quiz.id, original_quiz.max_attempts
+    )
+    if not new_attempt:
+        raise _attempts_exhausted_error(original_quiz)
     
-    # Sinh quiz mới bằng AI
-    new_quiz = await quiz_service.generate_retake_quiz(original_quiz)
+    # Xáo trộn câu hỏi quiz gốc theo attempt (không tạo quiz mới)
+    questions = quiz_service.build_retake_questions(original_quiz, str(new_attempt.id))
     
     return QuizRetakeResponse(
         new_attempt_id=str(new_attempt.id),
@@ -349,10 +404,10 @@ async def handle_retake_quiz(
         message="Quiz mới đã được tạo với câu hỏi tương tự",
         questions=[
             RetakeQuestion(
-                id=str(q.get("id", "")),
+                id=str(q.get("question_id") or q.get("id", "")),
                 content=q.get("question_text", ""),
-                options=q.get("options", [])
-            ) for q in new_quiz.questions
+                options=q.get("options") or []
+            ) for q in questions
         ]
     )
 
@@ -1003,3 +1058,53 @@ async def handle_get_class_quiz_results(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi khi lấy kết quả lớp: {error_msg}"
         )
+
+
+async def handle_get_quiz_leaderboard(
+    quiz_id: str,
+    class_id: str,
+    limit: int,
+    current_user: Dict
+) -> QuizLeaderboardResponse:
+    """
+    3.3.5: Bảng xếp hạng quiz của lớp
+    
+    Business logic:
+    - Top-N và hạng của user hiện tại đọc từ bảng xếp hạng duy trì khi nộp bài
+      (không nạp attempts)
+    - Instructor của lớp, admin hoặc học viên trong lớp mới được xem
+    
+    Args:
+        quiz_id: ID của quiz
+        class_id: ID của class
+        limit: Số học viên top
+        current_user: User hiện tại
+        
+    Returns:
+        QuizLeaderboardResponse
+        
+    Raises:
+        404: Quiz/class không tồn tại hoặc quiz không thuộc course của lớp
+        403: Không thuộc lớp
+        
+    Endpoint: GET /api/v1/quizzes/{quiz_id}/leaderboard?class_id={class_id}
+    """
+    user_id = current_user.get("user_id")
+    role = current_user.get("role")
+    
+    version = await quiz_service.get_quiz_version(quiz_id)
+    cls = await class_service.get_class_by_id(class_id)
+    if not version or not cls or cls.course_id != version.course_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Quiz hoặc lớp học không tồn tại"
+        )
+    
+    if role != "admin" and cls.instructor_id != user_id and user_id not in cls.student_ids:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Bạn không thuộc lớp học này"
+        )
+    
+    result = await leaderboard_service.get_leaderboard(quiz_id, class_id, user_id, limit)
+    return QuizLeaderboardResponse(**result)
@@ -161,7 +161,10 @@ async def handle_get_search_history(current_user: Dict) -> SearchHistoryResponse
         )
 
 
-async def handle_get_search_analytics(current_user: Dict) -> SearchAnalytics:
+async def handle_get_search_analytics(
+    current_user: Dict,
+    days: int = search_service.SEARCH_ANALYTICS_WINDOW_DAYS
+) -> SearchAnalytics:
     """
     Lấy search analytics cho admin
     
@@ -172,6 +175,7 @@ async def handle_get_search_analytics(current_user: Dict) -> SearchAnalytics:
     
     Args:
         current_user: User context từ JWT
+        days: Số ngày gần nhất được thống kê
         
     Returns:
         SearchAnalytics với search performance data
@@ -189,7 +193,7 @@ async def handle_get_search_analytics(current_user: Dict) -> SearchAnalytics:
     
     try:
         # Lấy search analytics
-        analytics_data = await search_service.get_search_analytics()
+        analytics_data = await search_service.get_search_analytics(days)
         
         return SearchAnalytics(**analytics_data)
         
@@ -6,10 +6,36 @@ Tuân thủ: CHUCNANG.md Section 2.1.2-2.1.3 (Authentication flow)
 from typing import Optional, Dict
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from utils.security import decode_token
+from config.config import get_settings
+from services.auth_service import get_user_access_state
+from utils.security import decode_token_cached
 
 security = HTTPBearer()
 
+_ACCESS_TOKEN_LIFETIME_SECONDS = get_settings().access_token_expire_minutes * 60
+
+
+def _token_issued_at(payload: Dict) -> float:
+    """
+    Thời điểm cấp token (unix timestamp)
+    Token cũ không có iat được coi là cấp lúc exp - thời hạn access token.
+    """
+    issued_at = payload.get("iat")
+    if issued_at is None:
+        return payload.get("exp", 0) - _ACCESS_TOKEN_LIFETIME_SECONDS
+    return issued_at
+
+
+def _is_token_revoked(payload: Dict, access_state: Dict) -> bool:
+    """
+    Token bị thu hồi nếu cấp trước hoặc cùng thời điểm (mili giây) với mốc
+    logout gần nhất của user.
+    """
+    revoked_before = access_state.get("tokens_revoked_before")
+    if revoked_before is None:
+        return False
+    return _token_issued_at(payload) <= revoked_before
+
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security)
@@ -39,7 +65,7 @@ async def get_current_user(
     
     try:
         token = credentials.credentials
-        payload = decode_token(token)
+        payload = decode_token_cached(token)
         
         if not payload:
             raise HTTPException(
@@ -65,11 +91,28 @@ async def get_current_user(
                 headers={"WWW-Authenticate": "Bearer"}
             )
         
+        # Kiểm tra user còn active và token chưa bị thu hồi
+        # (access state được cache - thường chỉ là một lookup trong bộ nhớ)
+        access_state = await get_user_access_state(user_id)
+        if access_state["status"] != "active":
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Tài khoản không còn hoạt động",
+                headers={"WWW-Authenticate": "Bearer"}
+            )
+        if _is_token_revoked(payload, access_state):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token đã bị thu hồi",
+                headers={"WWW-Authenticate": "Bearer"}
+            )
+        
         # Trả về user info để sử dụng trong các handler
+        # Role lấy từ access state để đổi role có hiệu lực ngay
         return {
             "user_id": user_id,
             "email": payload.get("email"),
-            "role": payload.get("role")
+            "role": access_state["role"]
         }
         
     except HTTPException:
@@ -108,7 +151,7 @@ async def get_optional_user(
     
     try:
         token = credentials.credentials
-        payload = decode_token(token)
+        payload = decode_token_cached(token)
         
         if not payload:
             return None
@@ -122,11 +165,15 @@ async def get_optional_user(
         if not user_id:
             return None
         
+        access_state = await get_user_access_state(user_id)
+        if access_state["status"] != "active" or _is_token_revoked(payload, access_state):
+            return None
+        
         # Trả về user info
         return {
             "user_id": user_id,
             "email": payload.get("email"),
-            "role": payload.get("role")
+            "role": access_state["role"]
         }
         
     except Exception:
@@ -183,7 +230,7 @@ async def get_optional_user(
     
     try:
         token = credentials.credentials
-        payload = decode_token(token)
+        payload = decode_token_cached(token)
         
         if not payload:
             return None
@@ -192,17 +239,21 @@ async def get_optional_user(
         if payload.get("type") != "access":
             return None
         
+        # Validate required fields
+        if not payload.get("sub") or not payload.get("email"):
+            return None
+        
+        access_state = await get_user_access_state(payload["sub"])
+        if access_state["status"] != "active" or _is_token_revoked(payload, access_state):
+            return None
+        
         # Extract user info
         user_data = {
             "user_id": payload.get("sub"),
             "email": payload.get("email"),
-            "role": payload.get("role"),
+            "role": access_state["role"],
             "full_name": payload.get("full_name", "")
         }
-        
-        # Validate required fields
-        if not user_data["user_id"] or not user_data["email"]:
-            return None
             
         return user_data
         
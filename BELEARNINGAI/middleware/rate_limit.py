@@ -0,0 +1,235 @@
+"""
+Middleware giới hạn tần suất request (token bucket)
+Tuân thủ: RATE_LIMIT_PER_MINUTE trong config
+
+- Mỗi user (sub trong access token) hoặc mỗi guest (theo IP) có một bucket
+  dung lượng RATE_LIMIT_PER_MINUTE, nạp lại đều theo thời gian
+- Mỗi IP còn có một bucket chung RATE_LIMIT_PER_IP_PER_MINUTE cho mọi request
+  từ IP đó (kể cả đã đăng nhập) - lớn hơn bucket user vì cả lớp học có thể
+  dùng chung một IP (NAT)
+- Route gọi AI (Gemini) tốn nhiều token hơn route thường (không vượt dung lượng bucket)
+- Backend in-memory mặc định; RATE_LIMIT_BACKEND=redis dùng bucket chung
+  giữa các worker/instance
+- Hết token -> 429 kèm Retry-After
+"""
+
+import json
+import math
+import re
+import time
+from collections import OrderedDict
+from typing import Optional, Pattern, Protocol, Sequence, Tuple
+
+from config.config import get_settings
+from utils.security import decode_token_cached
+
+
+# (method, path pattern, cost) - request không khớp route nào có cost 1
+DEFAULT_ROUTE_COSTS: Tuple[Tuple[str, Pattern, int], ...] = (
+    ("POST", re.compile(r"^/api/v1/chat/course/[^/]+$"), 10),
+    ("POST", re.compile(r"^/api/v1/assessments/generate$"), 10),
+    ("POST", re.compile(r"^/api/v1/courses/from-prompt$"), 20),
+    ("POST", re.compile(r"^/api/v1/courses/[^/]+/modules/[^/]+/assessments/generate$"), 10),
+    ("POST", re.compile(r"^/api/v1/ai/generate-practice$"), 10),
+)
+
+# Không giới hạn health check và CORS preflight
+EXEMPT_PATHS = frozenset({"/health"})
+
+
+# ============================================================================
+# BACKENDS
+# ============================================================================
+
+class RateLimitBackend(Protocol):
+    """Backend lưu trạng thái bucket - có thể thay bằng implementation dùng chung."""
+
+    async def consume(self, key: str, cost: int, capacity: int, refill_per_second: float) -> float:
+        """
+        Lấy cost token từ bucket của key
+
+        Returns:
+            0 nếu được phép, ngược lại số giây cần chờ trước khi thử lại
+        """
+        ...
+
+
+class InMemoryTokenBucketBackend:
+    """
+    Token bucket trong bộ nhớ của worker hiện tại
+    Giữ tối đa max_keys bucket (LRU) để không tăng bộ nhớ vô hạn.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # key -> [tokens còn lại, thời điểm cập nhật]
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    async def consume(self, key: str, cost: int, capacity: int, refill_per_second: float) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+
+        if bucket is None:
+            bucket = [float(capacity), now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            elapsed = now - bucket[1]
+            bucket[0] = min(float(capacity), bucket[0] + elapsed * refill_per_second)
+            bucket[1] = now
+
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            return 0.0
+
+        return (cost - bucket[0]) / refill_per_second
+
+
+_REDIS_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * refill)
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    retry_after = (cost - tokens) / refill
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / refill) + 1)
+return tostring(retry_after)
+"""
+
+
+class RedisTokenBucketBackend:
+    """
+    Token bucket dùng chung qua Redis (atomic bằng Lua script)
+    Cần package redis (redis.asyncio) - chỉ import khi được chọn.
+    """
+
+    def __init__(self, redis_url: str, key_prefix: str = "ratelimit:"):
+        import redis.asyncio as redis_asyncio
+
+        self._client = redis_asyncio.from_url(redis_url)
+        self._script = self._client.register_script(_REDIS_TOKEN_BUCKET_SCRIPT)
+        self._key_prefix = key_prefix
+
+    async def consume(self, key: str, cost: int, capacity: int, refill_per_second: float) -> float:
+        retry_after = await self._script(
+            keys=[self._key_prefix + key],
+            args=[capacity, refill_per_second, cost, time.time()]
+        )
+        return float(retry_after)
+
+
+def create_rate_limit_backend(backend_name: str) -> RateLimitBackend:
+    """Tạo backend theo cấu hình RATE_LIMIT_BACKEND (memory|redis)."""
+    if backend_name == "redis":
+        settings = get_settings()
+        return RedisTokenBucketBackend(settings.redis_url)
+    return InMemoryTokenBucketBackend()
+
+
+# ============================================================================
+# ASGI MIDDLEWARE
+# ============================================================================
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware (không qua BaseHTTPMiddleware để giữ overhead thấp)
+
+    Args:
+        app: ASGI app được bọc
+        requests_per_minute: Dung lượng bucket mỗi user/guest và tốc độ nạp lại mỗi phút
+        ip_requests_per_minute: Dung lượng bucket chung mỗi IP (mặc định 10 x requests_per_minute)
+        backend: Nơi lưu bucket (mặc định in-memory)
+        route_costs: (method, path pattern, cost) cho các route đắt
+    """
+
+    def __init__(
+        self,
+        app,
+        requests_per_minute: int,
+        ip_requests_per_minute: Optional[int] = None,
+        backend: Optional[RateLimitBackend] = None,
+        route_costs: Sequence[Tuple[str, Pattern, int]] = DEFAULT_ROUTE_COSTS
+    ):
+        self.app = app
+        self.capacity = requests_per_minute
+        self.refill_per_second = requests_per_minute / 60.0
+        self.ip_capacity = ip_requests_per_minute or requests_per_minute * 10
+        self.ip_refill_per_second = self.ip_capacity / 60.0
+        self.backend = backend or InMemoryTokenBucketBackend()
+        self.route_costs = tuple(route_costs)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        cost = self._route_cost(scope["method"], scope["path"])
+        client = scope.get("client")
+        ip = client[0] if client else "unknown"
+
+        # Bucket IP trước: request bị chặn theo IP không tiêu token của user
+        retry_after = await self.backend.consume(
+            f"ip:{ip}", min(cost, self.ip_capacity), self.ip_capacity, self.ip_refill_per_second
+        )
+        if retry_after <= 0:
+            retry_after = await self.backend.consume(
+                self._client_key(scope, ip), min(cost, self.capacity),
+                self.capacity, self.refill_per_second
+            )
+
+        if retry_after > 0:
+            await self._send_too_many_requests(send, retry_after)
+            return
+
+        await self.app(scope, receive, send)
+
+    def _route_cost(self, method: str, path: str) -> int:
+        for route_method, pattern, cost in self.route_costs:
+            if method == route_method and pattern.match(path):
+                return cost
+        return 1
+
+    @staticmethod
+    def _client_key(scope, ip: str) -> str:
+        """Key bucket: user_id nếu access token hợp lệ, ngược lại guest theo IP."""
+        for header_name, header_value in scope["headers"]:
+            if header_name == b"authorization":
+                if header_value[:7].lower() == b"bearer ":
+                    try:
+                        # Payload được cache nên thường chỉ là một lookup
+                        payload = decode_token_cached(header_value[7:].decode("latin-1"))
+                        if payload.get("sub"):
+                            return f"user:{payload['sub']}"
+                    except Exception:
+                        pass
+                break
+
+        return f"guest:{ip}"
+
+    @staticmethod
+    async def _send_too_many_requests(send, retry_after: float) -> None:
+        body = json.dumps(
+            {"detail": "Quá nhiều request, vui lòng thử lại sau"},
+            ensure_ascii=False
+        ).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -4,9 +4,11 @@ Tuân thủ: CHUCNANG.md - Role-based permissions cho student/instructor/admin
 Tích hợp với auth middleware để kiểm tra quyền truy cập
 """
 
-from typing import Dict, List, Optional, Set
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional
 from fastapi import Depends, HTTPException, status
 from middleware.auth import get_current_user, get_optional_user
+from services import enrollment_service
 
 
 # ============================================================================
@@ -230,18 +232,68 @@ ADMIN_PERMISSIONS = INSTRUCTOR_PERMISSIONS | {
 }
 
 # Final role-permission mapping
-ROLE_PERMISSIONS: Dict[str, Set[str]] = {
-    Role.STUDENT: STUDENT_PERMISSIONS,
-    Role.INSTRUCTOR: INSTRUCTOR_PERMISSIONS,
-    Role.ADMIN: ADMIN_PERMISSIONS
+ROLE_PERMISSIONS: Dict[str, FrozenSet[str]] = {
+    Role.STUDENT: frozenset(STUDENT_PERMISSIONS),
+    Role.INSTRUCTOR: frozenset(INSTRUCTOR_PERMISSIONS),
+    Role.ADMIN: frozenset(ADMIN_PERMISSIONS)
+}
+
+# Role hierarchy: admin > instructor > student
+ROLE_LEVELS: Dict[str, int] = {
+    Role.STUDENT: 1,
+    Role.INSTRUCTOR: 2,
+    Role.ADMIN: 3
 }
 
 
+# ============================================================================
+# COMPILED BITMASKS - tính một lần khi import
+# ============================================================================
+
+# Mỗi permission một bit, theo thứ tự khai báo trong Permission
+PERMISSION_BITS: Dict[str, int] = {
+    value: 1 << index
+    for index, value in enumerate(
+        value for name, value in vars(Permission).items()
+        if name.isupper() and isinstance(value, str)
+    )
+}
+
+# Mỗi role một bitmask = OR các bit permission của role
+ROLE_PERMISSION_MASKS: Dict[str, int] = {
+    role: sum(PERMISSION_BITS[permission] for permission in permissions)
+    for role, permissions in ROLE_PERMISSIONS.items()
+}
+
+# Bit đại diện cho từng role (dùng cho require_any_role)
+ROLE_BITS: Dict[str, int] = {
+    role: 1 << index for index, role in enumerate(ROLE_LEVELS)
+}
+
+
+def _role_mask(roles: Iterable[str]) -> int:
+    mask = 0
+    for role in roles:
+        mask |= ROLE_BITS.get(role, 0)
+    return mask
+
+
+def _missing_role_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Thiếu thông tin vai trò người dùng"
+    )
+
+
 # ============================================================================
 # RBAC MIDDLEWARE FUNCTIONS
 # ============================================================================
+# Factory là hàm thường có cache: cùng tham số trả về cùng một dependency,
+# nên FastAPI cũng dedupe được trong một request. Checker vẫn là async def
+# vì FastAPI chạy dependency sync trong threadpool (đắt hơn một coroutine).
 
-async def require_role(required_role: str):
+@lru_cache(maxsize=None)
+def require_role(required_role: str):
     """
     Dependency để kiểm tra user có role yêu cầu
     
@@ -254,26 +306,15 @@ async def require_role(required_role: str):
     Raises:
         HTTPException 403: Nếu user không có quyền
     """
+    required_level = ROLE_LEVELS.get(required_role, 999)
+    
     async def role_checker(current_user: dict = Depends(get_current_user)):
         user_role = current_user.get("role")
         
         if not user_role:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Thiếu thông tin vai trò người dùng"
-            )
-        
-        # Kiểm tra role hierarchy: admin > instructor > student
-        role_hierarchy = {
-            Role.STUDENT: 1,
-            Role.INSTRUCTOR: 2, 
-            Role.ADMIN: 3
-        }
+            raise _missing_role_error()
         
-        user_level = role_hierarchy.get(user_role, 0)
-        required_level = role_hierarchy.get(required_role, 999)
-        
-        if user_level < required_level:
+        if ROLE_LEVELS.get(user_role, 0) < required_level:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Yêu cầu quyền {required_role}. Bạn hiện có quyền {user_role}"
@@ -284,7 +325,8 @@ async def require_role(required_role: str):
     return role_checker
 
 
-async def require_permission(permission: str):
+@lru_cache(maxsize=None)
+def require_permission(permission: str):
     """
     Dependency để kiểm tra user có permission cụ thể
     
@@ -297,19 +339,15 @@ async def require_permission(permission: str):
     Raises:
         HTTPException 403: Nếu user không có permission
     """
+    permission_bit = PERMISSION_BITS[permission]
+    
     async def permission_checker(current_user: dict = Depends(get_current_user)):
         user_role = current_user.get("role")
         
         if not user_role:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Thiếu thông tin vai trò người dùng"
-            )
-        
-        # Lấy permissions của role
-        user_permissions = ROLE_PERMISSIONS.get(user_role, set())
+            raise _missing_role_error()
         
-        if permission not in user_permissions:
+        if not ROLE_PERMISSION_MASKS.get(user_role, 0) & permission_bit:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Không có quyền thực hiện hành động này. Yêu cầu permission: {permission}"
@@ -320,7 +358,7 @@ async def require_permission(permission: str):
     return permission_checker
 
 
-async def require_any_role(allowed_roles: List[str]):
+def require_any_role(allowed_roles: List[str]):
     """
     Dependency để kiểm tra user có ít nhất một trong các roles được phép
     
@@ -333,17 +371,21 @@ async def require_any_role(allowed_roles: List[str]):
     Raises:
         HTTPException 403: Nếu user không có role nào được phép
     """
+    return _require_role_set(tuple(allowed_roles))
+
+
+@lru_cache(maxsize=None)
+def _require_role_set(allowed_roles: tuple):
+    allowed_mask = _role_mask(allowed_roles)
+    allowed_str = ", ".join(allowed_roles)
+    
     async def any_role_checker(current_user: dict = Depends(get_current_user)):
         user_role = current_user.get("role")
         
         if not user_role:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Thiếu thông tin vai trò người dùng"
-            )
+            raise _missing_role_error()
         
-        if user_role not in allowed_roles:
-            allowed_str = ", ".join(allowed_roles)
+        if not ROLE_BITS.get(user_role, 0) & allowed_mask:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Yêu cầu một trong các quyền: {allowed_str}. Bạn hiện có quyền {user_role}"
@@ -354,7 +396,7 @@ async def require_any_role(allowed_roles: List[str]):
     return any_role_checker
 
 
-async def require_ownership_or_admin(resource_owner_id: str):
+def require_ownership_or_admin(resource_owner_id: str):
     """
     Dependency để kiểm tra user là owner của resource hoặc là admin
     
@@ -387,26 +429,27 @@ async def require_ownership_or_admin(resource_owner_id: str):
     return ownership_checker
 
 
-async def check_enrollment_access(course_id: str, user_id: str) -> bool:
+async def check_enrollment_access(
+    course_id: str,
+    user_id: str,
+    user_role: Optional[str] = None
+) -> bool:
     """
-    Kiểm tra user có đang enrolled trong course không
+    Kiểm tra user có quyền truy cập nội dung course không
     
     Args:
         course_id: ID của course
         user_id: ID của user
+        user_role: Role của user (admin có toàn quyền)
         
     Returns:
-        bool: True nếu user enrolled hoặc là admin/instructor
+        bool: True nếu user enrolled (active/completed), là owner course hoặc admin
         
     Note:
-        Function này cần được implement trong service layer với database access
-        Kiểm tra enrollment, class membership, course ownership
+        Kết quả cache theo (user_id, course_id) trong enrollment_service,
+        invalidate khi enroll/hủy/tham gia lớp; enrollment được memo trong request
     """
-    # Stub implementation - cần gọi service functions để check:
-    # - Student: check enrollment trong course
-    # - Instructor: check class ownership hoặc course creation
-    # - Admin: full access
-    return True  # Temporary allow all - implement proper logic
+    return await enrollment_service.has_course_access(user_id, course_id, user_role)
 
 
 def has_permission(user_role: str, permission: str) -> bool:
@@ -420,11 +463,10 @@ def has_permission(user_role: str, permission: str) -> bool:
     Returns:
         bool: True nếu có permission
     """
-    user_permissions = ROLE_PERMISSIONS.get(user_role, set())
-    return permission in user_permissions
+    return bool(ROLE_PERMISSION_MASKS.get(user_role, 0) & PERMISSION_BITS.get(permission, 0))
 
 
-def get_user_permissions(user_role: str) -> Set[str]:
+def get_user_permissions(user_role: str) -> FrozenSet[str]:
     """
     Lấy tất cả permissions của một role
     
@@ -432,9 +474,9 @@ def get_user_permissions(user_role: str) -> Set[str]:
         user_role: Role của user
         
     Returns:
-        Set[str]: Tập hợp các permissions
+        FrozenSet[str]: Tập hợp các permissions (dùng chung, không copy)
     """
-    return ROLE_PERMISSIONS.get(user_role, set())
+    return ROLE_PERMISSIONS.get(user_role, frozenset())
 
 
 # ============================================================================
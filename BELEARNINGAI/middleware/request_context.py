@@ -0,0 +1,44 @@
+"""
+Middleware khởi tạo context riêng cho mỗi request
+Memo/identity map (enrollment, Course, User, ...) chỉ sống trong một request,
+không rò rỉ sang request khác dùng chung connection/task.
+"""
+
+from utils.request_context import request_scope
+
+
+# Header debug: số query DB tránh được nhờ memo/identity map trong request
+QUERIES_SAVED_HEADER = b"x-queries-saved"
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware mở request_scope() quanh mỗi HTTP request
+
+    Args:
+        app: ASGI app được bọc
+        debug_header: Thêm header X-Queries-Saved vào response (chỉ nên bật khi DEBUG)
+    """
+
+    def __init__(self, app, debug_header: bool = False):
+        self.app = app
+        self.debug_header = debug_header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with request_scope() as context:
+            if not self.debug_header:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_with_stats(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((QUERIES_SAVED_HEADER, str(context.queries_saved).encode("latin-1")))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_stats)
@@ -5,9 +5,10 @@ Naming: snake_case theo Python convention
 """
 
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict
 from beanie import Document, Indexed
 from pydantic import Field, EmailStr, BaseModel
+from pymongo import IndexModel
 import uuid
 
 
@@ -103,6 +104,7 @@ class User(Document):
     
     # Authentication tracking - theo API schema
     last_login_at: Optional[datetime] = Field(None, description="Lần đăng nhập cuối")
+    tokens_revoked_at: Optional[datetime] = Field(None, description="Access token cấp trước thời điểm này bị thu hồi (logout)")
     email_verified: bool = Field(default=False, description="Email đã xác thực chưa")
     phone_verified: bool = Field(default=False, description="Số điện thoại đã xác thực chưa")
     
@@ -116,7 +118,7 @@ class User(Document):
     class Settings:
         name = "users"
         indexes = [
-            [("email", 1)],  # Unique email
+            IndexModel([("email", 1)], unique=True),  # Unique email - login lookup
             "role",
             "status",
             "created_at",
@@ -132,10 +134,13 @@ class RefreshToken(Document):
     """
     Lưu trữ refresh tokens để quản lý phiên đăng nhập
     Collection: refresh_tokens
+
+    Chỉ lưu digest SHA-256 (hash_token) của token, không lưu token gốc.
+    TTL index trên expires_at để MongoDB tự dọn token hết hạn.
     """
     id: str = Field(default_factory=generate_uuid, alias="_id")
     user_id: str
-    token: str = Field(..., unique=True)
+    token_hash: str = Field(..., description="SHA-256 hex digest của refresh token")
     expires_at: datetime
     created_at: datetime = Field(default_factory=datetime.utcnow)
     
@@ -143,8 +148,9 @@ class RefreshToken(Document):
         name = "refresh_tokens"
         indexes = [
             "user_id",
-            "token",
-            "expires_at"
+            IndexModel([("token_hash", 1)], unique=True),
+            # Xóa document ngay khi tới expires_at
+            IndexModel([("expires_at", 1)], expireAfterSeconds=0)
         ]
 
 
@@ -522,7 +528,8 @@ class Quiz(Document):
             "created_at",
             [("course_id", 1), ("is_draft", 1)],
             [("lesson_id", 1), ("is_draft", 1)],
-            [("module_id", 1), ("quiz_type", 1)]  # For module assessments
+            [("module_id", 1), ("quiz_type", 1)],  # For module assessments
+            [("created_by", 1), ("created_at", -1)],  # Instructor quiz list
         ]
 
 
@@ -582,6 +589,135 @@ class QuizAttempt(Document):
         ]
 
 
+class BankQuestion(Document):
+    """
+    Câu hỏi trong ngân hàng câu hỏi của module
+    Collection: question_bank
+    Lưu một lần, gắn tag module/skill/độ khó; bài kiểm tra module được lắp
+    bằng cách chọn ngẫu nhiên từ ngân hàng thay vì gọi AI mỗi lần.
+    """
+    id: str = Field(default_factory=generate_uuid, alias="_id")
+    course_id: str = Field(..., description="UUID khóa học")
+    module_id: str = Field(..., description="UUID module")
+    outcome_id: Optional[str] = Field(None, description="Learning outcome liên quan")
+    skill_tag: Optional[str] = Field(None, description="Skill tag")
+    difficulty: str = Field(default="medium", description="easy|medium|hard")
+    
+    # Nội dung - cùng cấu trúc với Quiz.questions
+    type: str = Field(default="multiple_choice", description="multiple_choice|fill_in_blank|true_false")
+    question_text: str = Field(..., description="Nội dung câu hỏi")
+    options: List[str] = Field(default_factory=list)
+    correct_answer: str = Field(..., description="Đáp án đúng")
+    explanation: Optional[str] = None
+    points: int = Field(default=10, ge=1)
+    is_mandatory: bool = False
+    
+    # Hash nội dung (câu hỏi + đáp án) để không lưu trùng trong một module
+    content_hash: str = Field(..., description="SHA-1 nội dung đã chuẩn hóa")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    class Settings:
+        name = "question_bank"
+        indexes = [
+            [("module_id", 1), ("difficulty", 1)],
+            IndexModel([("module_id", 1), ("content_hash", 1)], unique=True)
+        ]
+
+
+class QuizAttemptSummary(Document):
+    """
+    Tổng hợp các lần thử của một user cho một quiz
+    Collection: quiz_attempt_summaries
+    Cập nhật atomic khi tạo/nộp attempt: kiểm tra lượt làm, điểm cao nhất,
+    trạng thái pass chỉ cần một point lookup thay vì đọc toàn bộ attempts.
+    """
+    id: str = Field(default_factory=generate_uuid, alias="_id")
+    user_id: str = Field(..., description="UUID user")
+    quiz_id: str = Field(..., description="UUID quiz")
+    
+    attempt_count: int = Field(default=0, description="Số attempt đã tạo (cấp attempt_number)")
+    best_score: Optional[float] = Field(None, description="Điểm cao nhất trong các attempt đã nộp")
+    passed: bool = Field(default=False, description="Đã pass ít nhất một lần")
+    last_attempt_at: Optional[datetime] = Field(None, description="Thời điểm tạo attempt gần nhất")
+    live_attempt_id: Optional[str] = Field(None, description="Attempt đang làm (chưa nộp) - bài nộp ghi vào attempt này")
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    class Settings:
+        name = "quiz_attempt_summaries"
+        indexes = [
+            IndexModel([("user_id", 1), ("quiz_id", 1)], unique=True)
+        ]
+
+
+class QuizLeaderboardEntry(Document):
+    """
+    Bảng xếp hạng quiz theo lớp: attempt tốt nhất của mỗi học viên
+    Collection: quiz_leaderboards
+    _id = "{quiz_id}:{class_id}:{user_id}", cập nhật atomic khi nộp bài
+    (chỉ thay khi điểm cao hơn, hoặc bằng điểm nhưng ít thời gian hơn).
+    Tên/avatar lưu kèm để top-N không phải đọc users.
+    """
+    id: str = Field(..., alias="_id")
+    quiz_id: str = Field(..., description="UUID quiz")
+    class_id: str = Field(..., description="UUID lớp học")
+    user_id: str = Field(..., description="UUID học viên")
+
+    # Thông tin hiển thị (denormalized từ users)
+    full_name: str = Field(default="Unknown")
+    avatar_url: Optional[str] = None
+
+    # Attempt tốt nhất
+    score: float = Field(default=0.0, description="Điểm cao nhất (0-100)")
+    time_spent_seconds: int = Field(default=0, description="Thời gian của attempt tốt nhất")
+    passed: bool = Field(default=False, description="Attempt tốt nhất có pass không")
+    completed_at: datetime = Field(default_factory=datetime.utcnow, description="Thời điểm nộp attempt tốt nhất")
+    attempt_count: int = Field(default=0, description="Số attempt đã nộp")
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "quiz_leaderboards"
+        indexes = [
+            # Thứ tự xếp hạng: top-N và đếm hạng của một học viên đều đi trên index này
+            IndexModel([
+                ("quiz_id", 1), ("class_id", 1),
+                ("score", -1), ("time_spent_seconds", 1), ("user_id", 1)
+            ], name="leaderboard_rank"),
+            [("class_id", 1), ("user_id", 1)],
+            "user_id"
+        ]
+
+
+# Thời gian giữ idempotency key trước khi MongoDB TTL index tự xóa
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+
+
+class IdempotencyRecord(Document):
+    """
+    Kết quả request theo Idempotency-Key (nộp bài quiz, ...)
+    Collection: idempotency_keys
+    _id = "{user_id}:{scope}:{key}" nên insert trùng key bị chặn bởi unique _id;
+    request lặp lại nhận response đã lưu, không chấm điểm/ghi DB lần nữa.
+    """
+    id: str = Field(..., alias="_id")
+    user_id: str = Field(..., description="UUID user gửi request")
+    scope: str = Field(..., description="Endpoint, ví dụ quiz_attempt:{quiz_id}")
+    request_hash: str = Field(..., description="SHA-256 của body request (phát hiện dùng lại key)")
+
+    status: str = Field(default="in_progress", description="in_progress|completed")
+    status_code: Optional[int] = Field(None, description="HTTP status của response đã lưu")
+    response: Optional[dict] = Field(None, description="Response JSON đã lưu")
+
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: datetime = Field(..., description="Thời điểm TTL index xóa record")
+
+    class Settings:
+        name = "idempotency_keys"
+        indexes = [
+            # Xóa document ngay khi tới expires_at
+            IndexModel([("expires_at", 1)], expireAfterSeconds=0)
+        ]
+
+
 # ============================================================================
 # PROGRESS MODEL (Section 2.4.9)
 # ============================================================================
@@ -793,6 +929,48 @@ class Recommendation(Document):
         ]
 
 
+# ============================================================================
+# SEARCH EVENT MODEL (Section 5.1)
+# ============================================================================
+
+# Thời gian giữ search events trước khi MongoDB TTL index tự xóa
+SEARCH_EVENT_RETENTION_DAYS = 90
+
+
+class SearchEvent(Document):
+    """
+    Sự kiện tìm kiếm (append-only) - nguồn dữ liệu cho lịch sử và analytics
+    Collection: search_events
+    Ghi theo batch từ search_service, tự hết hạn sau SEARCH_EVENT_RETENTION_DAYS
+    """
+    id: str = Field(default_factory=generate_uuid, alias="_id")
+    user_id: Optional[str] = Field(None, description="UUID user, null nếu là guest")
+    query: str = Field(..., description="Từ khóa gốc user nhập")
+    normalized_query: str = Field(..., description="Từ khóa đã chuẩn hóa (lowercase, bỏ dấu)")
+    
+    # Kết quả
+    results_by_category: Dict[str, int] = Field(
+        default_factory=dict,
+        description="Số kết quả theo category: {courses: 3, lessons: 5, ...}"
+    )
+    total_results: int = Field(default=0, description="Tổng số kết quả")
+    zero_results: bool = Field(default=False, description="Search không có kết quả nào")
+    latency_ms: int = Field(default=0, description="Thời gian xử lý search (ms)")
+    
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    class Settings:
+        name = "search_events"
+        indexes = [
+            [("user_id", 1), ("created_at", -1)],
+            [("zero_results", 1), ("normalized_query", 1)],
+            IndexModel(
+                [("created_at", 1)],
+                expireAfterSeconds=SEARCH_EVENT_RETENTION_DAYS * 24 * 3600
+            )
+        ]
+
+
 # ============================================================================
 # DOCUMENT ALIASES - for database.py imports
 # ============================================================================
@@ -807,10 +985,15 @@ EnrollmentDocument = Enrollment
 AssessmentDocument = AssessmentSession  # AssessmentSession được alias thành AssessmentDocument
 QuizDocument = Quiz
 QuizAttemptDocument = QuizAttempt
+QuizAttemptSummaryDocument = QuizAttemptSummary
+QuizLeaderboardEntryDocument = QuizLeaderboardEntry
+BankQuestionDocument = BankQuestion
+IdempotencyRecordDocument = IdempotencyRecord
 ProgressDocument = Progress
 ChatDocument = Conversation  # Conversation được alias thành ChatDocument
 ClassDocument = Class
 RecommendationDocument = Recommendation
+SearchEventDocument = SearchEvent
 
 # Document cho Admin reset password chức năng
 
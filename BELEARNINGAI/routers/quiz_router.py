@@ -2,10 +2,10 @@
 Quiz Router
 Định nghĩa routes cho quiz endpoints
 Section 2.4.3-2.4.7 (Student) + 3.3 (Instructor)
-10 endpoints
+11 endpoints
 """
 
-from fastapi import APIRouter, Depends, status, Query
+from fastapi import APIRouter, Depends, Header, status, Query
 from typing import Optional
 from middleware.auth import get_current_user
 from controllers.quiz_controller import (
@@ -18,7 +18,8 @@ from controllers.quiz_controller import (
     handle_list_quizzes_with_filters,
     handle_update_quiz,
     handle_delete_quiz,
-    handle_get_class_quiz_results
+    handle_get_class_quiz_results,
+    handle_get_quiz_leaderboard
 )
 from schemas.quiz import (
     QuizDetailResponse,
@@ -34,7 +35,8 @@ from schemas.quiz import (
     QuizUpdateRequest,
     QuizUpdateResponse,
     QuizDeleteResponse,
-    QuizClassResultsResponse
+    QuizClassResultsResponse,
+    QuizLeaderboardResponse
 )
 
 
@@ -48,14 +50,16 @@ router = APIRouter(prefix="", tags=["Quizzes"])
     response_model=QuizDetailResponse,
     status_code=status.HTTP_200_OK,
     summary="Xem chi tiết quiz",
-    description="Hiển thị thông tin quiz: câu hỏi, thời gian, số lần làm, điểm tốt nhất"
+    description="Hiển thị thông tin quiz: câu hỏi, thời gian, số lần làm, điểm tốt nhất. "
+                "Hỗ trợ ETag/If-None-Match (304 khi không đổi)"
 )
 async def get_quiz_detail(
     quiz_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
 ):
     """Section 2.4.3 - Xem chi tiết quiz"""
-    return await handle_get_quiz_detail(quiz_id, current_user)
+    return await handle_get_quiz_detail(quiz_id, current_user, if_none_match)
 
 
 @router.post(
@@ -68,10 +72,15 @@ async def get_quiz_detail(
 async def attempt_quiz(
     quiz_id: str,
     attempt_data: QuizAttemptRequest,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(
+        None,
+        alias="Idempotency-Key",
+        description="Key duy nhất cho mỗi lần nộp; gửi lại cùng key nhận lại kết quả cũ"
+    )
 ):
     """Section 2.4.4 - Làm bài quiz"""
-    return await handle_attempt_quiz(quiz_id, attempt_data, current_user)
+    return await handle_attempt_quiz(quiz_id, attempt_data, current_user, idempotency_key)
 
 
 @router.get(
@@ -206,3 +215,20 @@ async def get_class_quiz_results(
 ):
     """Section 3.3.5 - Thống kê kết quả lớp (Instructor)"""
     return await handle_get_class_quiz_results(quiz_id, class_id, current_user)
+
+
+@router.get(
+    "/quizzes/{quiz_id}/leaderboard",
+    response_model=QuizLeaderboardResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Bảng xếp hạng quiz của lớp",
+    description="Top học viên theo điểm cao nhất (bằng điểm thì ít thời gian hơn) và hạng của user hiện tại"
+)
+async def get_quiz_leaderboard(
+    quiz_id: str,
+    class_id: str = Query(..., description="UUID lớp học"),
+    limit: int = Query(20, ge=1, le=100, description="Số học viên top"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Section 3.3.5 - Bảng xếp hạng lớp"""
+    return await handle_get_quiz_leaderboard(quiz_id, class_id, limit, current_user)
@@ -129,6 +129,7 @@ async def get_search_history(
     description="Thống kê hiệu suất search và user behavior"
 )
 async def get_search_analytics(
+    days: int = Query(30, ge=1, le=90, description="Số ngày gần nhất được thống kê"),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -141,4 +142,4 @@ async def get_search_analytics(
     - No-results queries cần optimize
     - Average search response time
     """
-    return await handle_get_search_analytics(current_user)
+    return await handle_get_search_analytics(current_user, days)
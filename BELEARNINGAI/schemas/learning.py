@@ -110,6 +110,7 @@ class QuizInfoInLesson(BaseModel):
     quiz_id: Optional[str] = Field(None, description="UUID quiz (null nếu has_quiz=false)")
     question_count: Optional[int] = Field(None, description="Số câu hỏi (null nếu has_quiz=false)")
     is_mandatory: Optional[bool] = Field(None, description="Bắt buộc làm quiz để tiếp tục (null nếu has_quiz=false)")
+    is_passed: Optional[bool] = Field(None, description="User đã pass quiz (null nếu has_quiz=false)")
 
 
 class CompletionStatusInLesson(BaseModel):
@@ -155,7 +156,7 @@ class LessonContentResponse(BaseModel):
     
     # Quiz info - FIXED: Nested object theo API_SCHEMA.md (Dict để accept service response)
     has_quiz: bool = Field(False, description="Bài học có quiz kèm theo không")
-    quiz_info: Dict = Field(..., description="Thông tin quiz kèm theo: {quiz_id: str|null, question_count: int|null, is_mandatory: bool|null}")
+    quiz_info: Dict = Field(..., description="Thông tin quiz kèm theo: {quiz_id: str|null, question_count: int|null, is_mandatory: bool|null, is_passed: bool|null}")
     
     # Completion status - FIXED: Nested object theo API_SCHEMA.md (Dict để accept service response)
     completion_status: Dict = Field(..., description="Trạng thái hoàn thành: {is_completed: bool, completion_date: datetime|null, time_spent_minutes: int, video_progress_percent: float|null}")
@@ -9,14 +9,26 @@ from datetime import datetime
 from typing import List, Optional
 
 
+class QuizQuestionView(BaseModel):
+    """Câu hỏi hiển thị cho học viên (không có đáp án/giải thích)"""
+    question_id: str = Field(..., description="UUID")
+    question_text: str
+    type: str = Field(..., description="multiple_choice|fill_in_blank|true_false")
+    options: List[str]
+    points: int
+    is_mandatory: bool
+    order: int
+
+
 class QuizDetailResponse(BaseModel):
     id: str = Field(..., description="UUID quiz")
     title: str
     description: str
     question_count: int
-    time_limit: int = Field(..., description="Minutes")
+    time_limit: Optional[int] = Field(None, description="Minutes, null = không giới hạn")
     pass_threshold: int = Field(..., description="Percentage")
     mandatory_question_count: int
+    questions: List[QuizQuestionView] = Field(default_factory=list)
     user_attempts: int
     best_score: Optional[float] = Field(None, description="0-100")
     last_attempt_at: Optional[datetime] = None
@@ -254,6 +266,7 @@ class DifficultQuestion(BaseModel):
     question_id: str = Field(..., description="UUID")
     question_text: str
     correct_rate: float = Field(..., description="0-100")
+    discrimination: Optional[float] = Field(None, description="Discrimination index (-1..1): nhóm điểm cao trừ nhóm điểm thấp")
     total_answers: int
 
 
@@ -268,6 +281,9 @@ class ClassResultStatistics(BaseModel):
     median_score: float = Field(..., description="0-100")
     highest_score: float = Field(..., description="0-100")
     lowest_score: float = Field(..., description="0-100")
+    percentile_25: float = Field(0.0, description="0-100")
+    percentile_75: float = Field(0.0, description="0-100")
+    percentile_90: float = Field(0.0, description="0-100")
     average_time: int = Field(..., description="Minutes")
 
 
@@ -282,3 +298,12 @@ class QuizClassResultsResponse(BaseModel):
     difficult_questions: List[DifficultQuestion]
 # - QuizListResponse (GET /api/v1/quizzes)
 # - QuizClassResultsResponse (GET /api/v1/quizzes/{id}/class-results)
+# - QuizLeaderboardResponse (GET /api/v1/quizzes/{id}/leaderboard)
+
+
+class QuizLeaderboardResponse(BaseModel):
+    quiz_id: str = Field(..., description="UUID")
+    class_id: str = Field(..., description="UUID")
+    total_ranked: int = Field(..., description="Số học viên đã có kết quả")
+    top: List[StudentRank]
+    my_rank: Optional[StudentRank] = Field(None, description="Hạng của user hiện tại, null nếu chưa nộp bài")
@@ -41,6 +41,8 @@ class SearchResponse(BaseModel):
     results_by_category: List[SearchCategoryGroup] = Field(..., description="Kết quả group theo category")
     suggestions: List[SearchSuggestion] = Field([], description="Gợi ý tìm kiếm")
     search_time_ms: int = Field(..., description="Thời gian tìm kiếm (milliseconds)")
+    timed_out_categories: List[str] = Field([], description="Các category quá thời gian, kết quả chỉ là partial")
+    corrected_query: Optional[str] = Field(None, description="Query đã sửa lỗi chính tả nếu kết quả lấy theo fuzzy match")
     filters_applied: dict = Field(..., description="Các filter đã áp dụng")
 
 
@@ -66,3 +68,4 @@ class SearchAnalytics(BaseModel):
     popular_categories: List[dict] = Field(..., description="Danh mục được tìm nhiều nhất")
     no_results_queries: List[str] = Field(..., description="Từ khóa không có kết quả")
     avg_search_time_ms: float = Field(..., description="Thời gian tìm kiếm trung bình")
+    result_cache_hit_ratio: float = Field(0.0, description="Tỉ lệ hit của search result cache (worker hiện tại)")
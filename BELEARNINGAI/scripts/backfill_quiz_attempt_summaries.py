@@ -0,0 +1,73 @@
+"""
+Dựng lại quiz_attempt_summaries từ quiz_attempts hiện có
+Chạy một lần sau khi deploy collection summary (an toàn khi chạy lại:
+dùng $max nên không bao giờ giảm attempt_count/best_score đã có).
+
+Chạy: python scripts/backfill_quiz_attempt_summaries.py
+"""
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pymongo import UpdateOne
+
+from app.database import close_database, init_database
+from models.models import QuizAttempt, QuizAttemptSummary, generate_uuid
+
+
+BATCH_SIZE = 1000
+
+
+async def main() -> None:
+    await init_database()
+
+    pipeline = [
+        {
+            "$group": {
+                "_id": {"user_id": "$user_id", "quiz_id": "$quiz_id"},
+                "attempt_count": {"$sum": 1},
+                "best_score": {
+                    "$max": {"$cond": [{"$ne": ["$submitted_at", None]}, "$score", None]}
+                },
+                "passed": {"$max": "$passed"},
+                "last_attempt_at": {"$max": "$started_at"}
+            }
+        }
+    ]
+
+    collection = QuizAttemptSummary.get_motor_collection()
+    operations = []
+    written = 0
+
+    async for group in QuizAttempt.get_motor_collection().aggregate(pipeline):
+        operations.append(UpdateOne(
+            {"user_id": group["_id"]["user_id"], "quiz_id": group["_id"]["quiz_id"]},
+            {
+                "$max": {
+                    "attempt_count": group["attempt_count"],
+                    "best_score": group["best_score"],
+                    "passed": bool(group["passed"]),
+                    "last_attempt_at": group["last_attempt_at"],
+                    "updated_at": group["last_attempt_at"]
+                },
+                "$setOnInsert": {"_id": generate_uuid()}
+            },
+            upsert=True
+        ))
+        if len(operations) >= BATCH_SIZE:
+            await collection.bulk_write(operations, ordered=False)
+            written += len(operations)
+            operations = []
+
+    if operations:
+        await collection.bulk_write(operations, ordered=False)
+        written += len(operations)
+
+    print(f"Đã cập nhật {written} summary (user, quiz)")
+    await close_database()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
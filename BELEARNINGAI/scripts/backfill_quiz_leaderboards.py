@@ -0,0 +1,33 @@
+"""
+Dựng lại quiz_leaderboards từ quiz_attempts hiện có
+Chạy một lần sau khi deploy collection bảng xếp hạng (an toàn khi chạy lại:
+mỗi entry được ghi đè bằng attempt tốt nhất tính từ quiz_attempts).
+
+Chạy: python scripts/backfill_quiz_leaderboards.py
+"""
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.database import close_database, init_database
+from models.models import Class
+from services import leaderboard_service
+
+
+async def main() -> None:
+    await init_database()
+
+    classes = 0
+    written = 0
+    async for cls in Class.find(Class.student_ids != []):
+        written += await leaderboard_service.rebuild_entries(cls.id, cls.course_id, cls.student_ids)
+        classes += 1
+
+    print(f"Đã cập nhật {written} entry bảng xếp hạng cho {classes} lớp")
+    await close_database()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
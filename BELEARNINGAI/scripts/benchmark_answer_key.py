@@ -0,0 +1,78 @@
+"""
+Benchmark throughput chấm điểm quiz bằng CompiledAnswerKey.
+So sánh:
+- before: dựng answer key cho mỗi bài nộp (như trước khi cache theo phiên bản quiz)
+- after: dựng answer key một lần, chấm N bài nộp
+Mục tiêu: >= 10.000 bài/giây cho quiz 20 câu.
+
+Chạy: python scripts/benchmark_answer_key.py [số bài nộp] [số câu]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.answer_key import CompiledAnswerKey, summarize_grade
+
+TARGET_ATTEMPTS_PER_SECOND = 10_000
+
+
+def _questions(count: int):
+    return [
+        {
+            "question_id": f"q{i}",
+            "correct_answer": f"{'ABCD'[i % 4]}. Option {i}",
+            "is_mandatory": i % 5 == 0
+        }
+        for i in range(count)
+    ]
+
+
+def _submissions(questions, attempts: int):
+    rng = random.Random(42)
+    return [
+        {question["question_id"]: rng.choice("ABCD") for question in questions}
+        for _ in range(attempts)
+    ]
+
+
+def _measure(name: str, grade_all, attempts: int) -> None:
+    start = time.perf_counter()
+    grades = grade_all()
+    elapsed = time.perf_counter() - start
+
+    assert len(grades) == attempts
+    rate = attempts / elapsed
+    verdict = "đạt" if rate >= TARGET_ATTEMPTS_PER_SECOND else "chưa đạt"
+    print(
+        f"{name:<7} {attempts} bài trong {elapsed:.3f}s -> {rate:,.0f} bài/s "
+        f"({verdict} mục tiêu {TARGET_ATTEMPTS_PER_SECOND:,}/s)"
+    )
+
+
+def main(attempts: int, question_count: int) -> None:
+    questions = _questions(question_count)
+    submissions = _submissions(questions, attempts)
+
+    def grade_rebuilding_key():
+        grades = []
+        for submission in submissions:
+            key = CompiledAnswerKey(questions)
+            grades.append(summarize_grade(key, key.grade(submission)))
+        return grades
+
+    def grade_compiled_once():
+        key = CompiledAnswerKey(questions)
+        return [summarize_grade(key, key.grade(submission)) for submission in submissions]
+
+    print(f"Quiz {question_count} câu")
+    _measure("before", grade_rebuilding_key, attempts)
+    _measure("after", grade_compiled_once, attempts)
+
+
+if __name__ == "__main__":
+    attempts = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    question_count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    main(attempts, question_count)
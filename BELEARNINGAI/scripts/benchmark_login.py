@@ -0,0 +1,53 @@
+"""
+Benchmark throughput xác thực mật khẩu (phần CPU-bound của login).
+So sánh:
+- before: verify_password chạy trực tiếp trong event loop (các login bị serialize)
+- after: verify_password_async chạy trong password pool
+
+Chạy: python scripts/benchmark_login.py [số login đồng thời]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.security import hash_password, verify_password, verify_password_async
+
+
+async def _login_blocking(password: str, password_hash: str) -> bool:
+    # Mô phỏng handler cũ: bcrypt chạy ngay trong coroutine
+    return verify_password(password, password_hash)
+
+
+async def _login_pooled(password: str, password_hash: str) -> bool:
+    return await verify_password_async(password, password_hash)
+
+
+async def _measure(name: str, login, concurrency: int, password: str, password_hash: str) -> None:
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(login(password, password_hash) for _ in range(concurrency))
+    )
+    elapsed = time.perf_counter() - start
+
+    assert all(results)
+    print(
+        f"{name:<8} {concurrency} logins trong {elapsed:.2f}s "
+        f"-> {concurrency / elapsed:.1f} logins/s"
+    )
+
+
+async def main(concurrency: int) -> None:
+    password = "Benchmark@123"
+    password_hash = hash_password(password)
+
+    print(f"CPU cores: {os.cpu_count()}")
+    await _measure("before", _login_blocking, concurrency, password, password_hash)
+    await _measure("after", _login_pooled, concurrency, password, password_hash)
+
+
+if __name__ == "__main__":
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    asyncio.run(main(concurrency))
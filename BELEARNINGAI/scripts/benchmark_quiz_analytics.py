@@ -0,0 +1,110 @@
+"""
+Benchmark thống kê kết quả quiz (services/quiz_analytics_service.py).
+So sánh trên N attempt tổng hợp:
+- before: vòng lặp Python qua từng attempt/câu hỏi (histogram, percentile, độ khó)
+- after: AttemptColumns + score_histogram/score_summary/item_analysis (NumPy)
+
+Chạy: python scripts/benchmark_quiz_analytics.py [số attempt] [số câu]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.quiz_analytics_service import (
+    AttemptAnalyticsProjection,
+    AttemptColumns,
+    item_analysis,
+    score_histogram,
+    score_summary,
+)
+from utils.answer_key import CompiledAnswerKey, answers_by_question
+
+
+def _questions(count: int):
+    return [
+        {"question_id": f"q{i}", "correct_answer": f"{'ABCD'[i % 4]}. Option {i}"}
+        for i in range(count)
+    ]
+
+
+def _attempts(questions, count: int):
+    rng = random.Random(42)
+    attempts = []
+    for index in range(count):
+        answers = [
+            {"question_id": question["question_id"], "selected_option": rng.choice("ABCD")}
+            for question in questions
+        ]
+        score = rng.uniform(0, 100)
+        attempts.append(AttemptAnalyticsProjection(
+            user_id=f"user-{index % (count // 3 or 1)}",
+            score=score,
+            passed=score >= 70,
+            time_spent_seconds=rng.randint(60, 1800),
+            answers=answers
+        ))
+    return attempts
+
+
+def _analyze_loop(attempts, key: CompiledAnswerKey):
+    # Mô phỏng cách cũ: mỗi thống kê duyệt lại toàn bộ attempts
+    scores = sorted(attempt.score for attempt in attempts)
+    buckets = [0] * 10
+    for score in scores:
+        buckets[min(int(score // 10), 9)] += 1
+
+    def percentile(p: float) -> float:
+        position = (len(scores) - 1) * p / 100
+        lower = int(position)
+        upper = min(lower + 1, len(scores) - 1)
+        return scores[lower] + (scores[upper] - scores[lower]) * (position - lower)
+
+    summary = {
+        "average": sum(scores) / len(scores),
+        "median": percentile(50), "p25": percentile(25), "p75": percentile(75), "p90": percentile(90)
+    }
+
+    correct_counts = [0] * key.total
+    for attempt in attempts:
+        answers = answers_by_question(attempt.answers)
+        for index, question_id in enumerate(key.question_ids):
+            if key.is_correct(index, answers.get(question_id)):
+                correct_counts[index] += 1
+    difficulty = [count / len(attempts) for count in correct_counts]
+    return buckets, summary, difficulty
+
+
+def _timed(step: str, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"  {step:<16} {elapsed * 1000:8.2f} ms")
+    return result, elapsed
+
+
+def main(attempt_count: int, question_count: int) -> None:
+    questions = _questions(question_count)
+    key = CompiledAnswerKey(questions)
+    attempts = _attempts(questions, attempt_count)
+    print(f"{attempt_count} attempts x {question_count} câu")
+
+    print("before")
+    _, before = _timed("python loop", _analyze_loop, attempts, key)
+
+    print("after")
+    columns, load = _timed("AttemptColumns", AttemptColumns, attempts, key)
+    _, histogram = _timed("score_histogram", score_histogram, columns.scores)
+    _, summary = _timed("score_summary", score_summary, columns.scores)
+    _, items = _timed("item_analysis", item_analysis, columns)
+    after = load + histogram + summary + items
+
+    print(f"Tổng: before {before * 1000:.2f} ms, after {after * 1000:.2f} ms -> x{before / after:.1f}")
+
+
+if __name__ == "__main__":
+    attempt_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    question_count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    main(attempt_count, question_count)
@@ -0,0 +1,78 @@
+"""
+Benchmark overhead của RateLimitMiddleware (backend in-memory).
+Gọi thẳng ASGI app (không qua HTTP/uvicorn) để chỉ đo phần middleware:
+- baseline: app rỗng trả 200, không middleware
+- guest: qua middleware, bucket theo IP
+- user: qua middleware, bucket theo user (decode access token có cache)
+
+Chạy: python scripts/benchmark_rate_limit.py [số request]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from middleware.rate_limit import RateLimitMiddleware
+from utils.security import create_access_token
+
+
+async def ok_asgi_app(scope, receive, send):
+    """ASGI app luôn trả 200 rỗng (giống tests/conftest.py)."""
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def call_asgi(app, path: str = "/api/v1/courses/search", method: str = "GET", token: str = None) -> dict:
+    """Gọi thẳng một ASGI app, trả message http.response.start (giống tests/conftest.py)."""
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    scope = {"type": "http", "method": method, "path": path, "headers": headers, "client": ("10.0.0.1", 1234)}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages[0]
+
+
+async def _measure(name: str, app, requests: int, token: str = None) -> float:
+    # Warm-up: tạo bucket và cache payload token trước khi đo
+    await call_asgi(app, token=token)
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = await call_asgi(app, token=token)
+    elapsed = time.perf_counter() - start
+
+    assert response["status"] == 200
+    per_request_us = elapsed / requests * 1_000_000
+    print(f"{name:<9} {requests} requests trong {elapsed:.3f}s -> {per_request_us:.2f} µs/request")
+    return per_request_us
+
+
+async def main(requests: int) -> None:
+    # Bucket đủ lớn để không request nào bị 429 trong lúc đo
+    capacity = requests * 10
+    token = create_access_token({
+        "sub": "benchmark-user", "email": "benchmark@example.com", "role": "student", "type": "access"
+    })
+
+    baseline = await _measure("baseline", ok_asgi_app, requests)
+    guest = await _measure(
+        "guest", RateLimitMiddleware(ok_asgi_app, requests_per_minute=capacity), requests
+    )
+    user = await _measure(
+        "user", RateLimitMiddleware(ok_asgi_app, requests_per_minute=capacity), requests, token
+    )
+
+    print(f"Overhead middleware: guest +{guest - baseline:.2f} µs, user +{user - baseline:.2f} µs")
+
+
+if __name__ == "__main__":
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    asyncio.run(main(requests))
@@ -0,0 +1,75 @@
+"""
+Benchmark kiểm tra quyền RBAC (middleware/rbac.py).
+So sánh:
+- before: permission in set của role (cách cũ trước khi biên dịch bitmask)
+- after: has_permission (AND bitmask) và checker cache từ require_permission
+
+Chạy: python scripts/benchmark_rbac.py [số lần kiểm tra]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from middleware.rbac import (
+    ROLE_PERMISSIONS,
+    Permission,
+    Role,
+    has_permission,
+    require_permission,
+)
+
+# Set thường như trước (ROLE_PERMISSIONS cũ là Dict[str, Set[str]])
+LEGACY_ROLE_PERMISSIONS = {role: set(permissions) for role, permissions in ROLE_PERMISSIONS.items()}
+
+# Cả trường hợp có và không có permission
+CHECKS = [
+    (Role.STUDENT, Permission.QUIZ_ATTEMPT),
+    (Role.STUDENT, Permission.QUIZ_CREATE),
+    (Role.INSTRUCTOR, Permission.QUIZ_CREATE),
+    (Role.ADMIN, Permission.ADMIN_USER_LIST),
+]
+
+
+def _legacy_has_permission(user_role: str, permission: str) -> bool:
+    user_permissions = LEGACY_ROLE_PERMISSIONS.get(user_role, set())
+    return permission in user_permissions
+
+
+def _report(name: str, elapsed: float, checks: int) -> None:
+    print(f"{name:<20} {checks} lần trong {elapsed:.3f}s -> {elapsed / checks * 1e9:.0f} ns/lần")
+
+
+def _measure_sync(name: str, check, iterations: int) -> None:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for user_role, permission in CHECKS:
+            check(user_role, permission)
+    _report(name, time.perf_counter() - start, iterations * len(CHECKS))
+
+
+async def _measure_checker(iterations: int) -> None:
+    # Dependency của route: factory cache -> checker dùng chung, await như FastAPI
+    checker = require_permission(Permission.QUIZ_ATTEMPT)
+    current_user = {"user_id": "benchmark-user", "role": Role.STUDENT}
+
+    start = time.perf_counter()
+    for _ in range(iterations * len(CHECKS)):
+        await checker(current_user)
+    _report("require_permission", time.perf_counter() - start, iterations * len(CHECKS))
+
+
+def main(iterations: int) -> None:
+    for user_role, permission in CHECKS:
+        assert has_permission(user_role, permission) == _legacy_has_permission(user_role, permission)
+
+    _measure_sync("before (set)", _legacy_has_permission, iterations)
+    _measure_sync("has_permission", has_permission, iterations)
+    asyncio.run(_measure_checker(iterations))
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 250_000
+    main(iterations)
@@ -0,0 +1,29 @@
+"""
+Chọn ARGON2_TIME_COST cho phần cứng production
+Đo thời gian verify argon2 (ARGON2_MEMORY_COST_KIB, ARGON2_PARALLELISM hiện tại)
+và in time_cost đạt khoảng PASSWORD_HASH_TARGET_MS. Chạy trên máy cùng cấu hình
+với server rồi ghi giá trị vào config (.env) - mọi worker/host dùng chung giá trị đó.
+
+Chạy: python scripts/calibrate_password_hashing.py [--target-ms 100]
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.config import get_settings
+from utils.security import calibrate_argon2_time_cost
+
+
+def main(args: argparse.Namespace) -> None:
+    settings = get_settings()
+    target_ms = args.target_ms or settings.password_hash_target_ms
+    time_cost = calibrate_argon2_time_cost(target_ms)
+    print(f"ARGON2_TIME_COST={time_cost}  # ~{target_ms}ms/verify, hiện tại: {settings.argon2_time_cost}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate argon2 time_cost")
+    parser.add_argument("--target-ms", type=int, default=None)
+    main(parser.parse_args())
@@ -33,6 +33,7 @@ from models.models import (
     AssessmentSession,
     Quiz,
     QuizAttempt,
+    QuizAttemptSummary,
     Progress,
     LessonProgressItem,
     Conversation,
@@ -64,6 +65,7 @@ async def init_db():
             AssessmentSession,
             Quiz,
             QuizAttempt,
+            QuizAttemptSummary,
             Class,
             Conversation,
             Recommendation,
@@ -893,6 +895,7 @@ async def seed_quizzes_and_attempts(user_ids: Dict[str, List[str]], lesson_ids:
     
     quizzes_to_create = []
     attempts_to_create = []
+    summaries_to_create = []
     student_ids = user_ids["student"]
     instructor_ids = user_ids["instructor"]
 
@@ -958,9 +961,19 @@ async def seed_quizzes_and_attempts(user_ids: Dict[str, List[str]], lesson_ids:
                     time_spent_seconds=random.randint(300, 1200)
                 )
                 attempts_to_create.append(attempt)
+                # Summary đi kèm: cấp lượt/điểm cao nhất đọc từ summary, không từ attempts
+                summaries_to_create.append(QuizAttemptSummary(
+                    user_id=student_id,
+                    quiz_id=quiz.id,
+                    attempt_count=attempt.attempt_number,
+                    best_score=score,
+                    passed=passed,
+                    last_attempt_at=attempt.started_at
+                ))
 
     await Quiz.insert_many(quizzes_to_create)
     await QuizAttempt.insert_many(attempts_to_create)
+    await QuizAttemptSummary.insert_many(summaries_to_create)
     
     print(f"✅ Đã tạo thành công {len(quizzes_to_create)} quizzes và {len(attempts_to_create)} quiz attempts.")
 
@@ -0,0 +1,166 @@
+"""
+Load test "bắt đầu giờ thi": N học viên (mặc định 500) cùng mở và nộp một quiz
+Mỗi học viên gửi GET /api/v1/quizzes/{id} rồi POST /api/v1/quizzes/{id}/attempt
+trong cùng một cửa sổ vài giây; in latency p50/p95/p99 từng endpoint để so sánh
+trước/sau khi gộp query đồng thời (single-flight).
+
+Script tự tạo N học viên tạm (ghi danh vào course của quiz), ký access token
+bằng SECRET_KEY của server và xóa dữ liệu tạm khi chạy xong.
+
+Yêu cầu:
+- Server đang chạy, dùng cùng MongoDB và SECRET_KEY với script
+- Tắt rate limit khi đo: RATE_LIMIT_ENABLED=false
+- max_attempts của quiz >= 1 (mỗi học viên nộp một lần)
+
+Chạy: python scripts/load_test_exam_start.py --quiz-id <quiz_id> [--students 500] [--ramp 2]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+
+import httpx
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from beanie.operators import In
+
+from app.database import close_database, init_database
+from models.models import Enrollment, Quiz, QuizAttempt, QuizAttemptSummary, User
+from utils.security import create_access_token, hash_password
+
+
+async def _create_students(course_id: str, count: int) -> list:
+    """Tạo học viên tạm + enrollment, trả về [(user_id, access_token)]."""
+    run_id = uuid.uuid4().hex[:8]
+    hashed_password = hash_password("LoadTest@12345")
+    users = [
+        User(
+            full_name=f"Load Test {i}",
+            email=f"loadtest.{run_id}.{i}@example.com",
+            hashed_password=hashed_password,
+            role="student"
+        )
+        for i in range(count)
+    ]
+    await User.insert_many(users)
+    await Enrollment.insert_many([
+        Enrollment(user_id=user.id, course_id=course_id, status="active")
+        for user in users
+    ])
+    return [
+        (user.id, create_access_token({
+            "sub": user.id,
+            "email": user.email,
+            "role": "student",
+            "type": "access"
+        }))
+        for user in users
+    ]
+
+
+async def _cleanup(quiz_id: str, user_ids: list) -> None:
+    await QuizAttempt.find(QuizAttempt.quiz_id == quiz_id, In(QuizAttempt.user_id, user_ids)).delete_many()
+    await QuizAttemptSummary.find(
+        QuizAttemptSummary.quiz_id == quiz_id, In(QuizAttemptSummary.user_id, user_ids)
+    ).delete_many()
+    await Enrollment.find(In(Enrollment.user_id, user_ids)).delete_many()
+    await User.find(In(User.id, user_ids)).delete_many()
+
+
+async def _student_session(
+    client: httpx.AsyncClient,
+    quiz: Quiz,
+    token: str,
+    delay: float,
+    latencies: dict,
+    errors: list
+) -> None:
+    await asyncio.sleep(delay)
+    headers = {"Authorization": f"Bearer {token}"}
+    answers = [
+        {
+            "question_id": question.get("question_id") or question.get("id"),
+            "selected_option": (question.get("options") or ["A"])[0]
+        }
+        for question in quiz.questions
+    ]
+
+    for name, method, path, kwargs in (
+        ("GET quiz", "GET", f"/api/v1/quizzes/{quiz.id}", {}),
+        ("POST attempt", "POST", f"/api/v1/quizzes/{quiz.id}/attempt", {
+            "json": {"answers": answers, "time_spent_minutes": 1},
+            "headers": {**headers, "Idempotency-Key": uuid.uuid4().hex}
+        })
+    ):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, **{"headers": headers, **kwargs})
+            if response.status_code >= 400:
+                errors.append(f"{name} {response.status_code}")
+                return
+        except httpx.HTTPError as e:
+            errors.append(f"{name} {type(e).__name__}")
+            return
+        latencies[name].append((time.perf_counter() - start) * 1000)
+
+
+def _percentile(sorted_values: list, percent: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(percent / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def main(args: argparse.Namespace) -> None:
+    await init_database()
+    quiz = await Quiz.get(args.quiz_id)
+    if not quiz:
+        print(f"Quiz {args.quiz_id} không tồn tại")
+        return
+
+    students = await _create_students(quiz.course_id, args.students)
+    user_ids = [user_id for user_id, _ in students]
+    print(f"Đã tạo {len(students)} học viên tạm cho course {quiz.course_id}")
+
+    latencies: dict = {"GET quiz": [], "POST attempt": []}
+    errors: list = []
+    limits = httpx.Limits(max_connections=args.max_connections)
+    try:
+        async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60.0) as client:
+            started_at = time.perf_counter()
+            # Học viên vào phòng thi rải đều trong ramp giây
+            await asyncio.gather(*(
+                _student_session(
+                    client, quiz, token, i * args.ramp / len(students), latencies, errors
+                )
+                for i, (_, token) in enumerate(students)
+            ))
+            elapsed = time.perf_counter() - started_at
+    finally:
+        await _cleanup(str(quiz.id), user_ids)
+        await close_database()
+
+    print(f"{len(students)} học viên trong {elapsed:.1f}s (ramp {args.ramp}s)")
+    print(f"Lỗi: {len(errors)} {sorted(set(errors))}")
+    for name, values in latencies.items():
+        if not values:
+            continue
+        values.sort()
+        print(
+            f"{name} ({len(values)}) - p50: {_percentile(values, 50):.1f}ms, "
+            f"p95: {_percentile(values, 95):.1f}ms, "
+            f"p99: {_percentile(values, 99):.1f}ms, "
+            f"mean: {statistics.mean(values):.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test bắt đầu giờ thi (mở + nộp quiz)")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--quiz-id", required=True)
+    parser.add_argument("--students", type=int, default=500, help="Số học viên")
+    parser.add_argument("--ramp", type=float, default=2.0, help="Số giây rải request mở quiz")
+    parser.add_argument("--max-connections", type=int, default=500)
+    asyncio.run(main(parser.parse_args()))
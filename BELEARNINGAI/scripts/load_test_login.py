@@ -0,0 +1,84 @@
+"""
+Load test POST /api/v1/auth/login với burst cố định (mặc định 500 logins/s)
+In latency p50/p95/p99 để so sánh trước/sau khi tối ưu login.
+
+Yêu cầu:
+- Server đang chạy với MongoDB local đã seed (python scripts/init_data.py)
+- Tắt rate limit khi đo: RATE_LIMIT_ENABLED=false
+
+Chạy: python scripts/load_test_login.py [--rate 500] [--duration 10] [--base-url http://localhost:8000]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+DEFAULT_EMAIL = "admin.super@ailab.com.vn"
+DEFAULT_PASSWORD = "Admin@12345"
+
+
+async def _login(client: httpx.AsyncClient, email: str, password: str, latencies: list, errors: list) -> None:
+    start = time.perf_counter()
+    try:
+        response = await client.post(
+            "/api/v1/auth/login",
+            json={"email": email, "password": password, "remember_me": False}
+        )
+        if response.status_code != 200:
+            errors.append(response.status_code)
+            return
+    except httpx.HTTPError as e:
+        errors.append(type(e).__name__)
+        return
+    latencies.append((time.perf_counter() - start) * 1000)
+
+
+def _percentile(sorted_values: list, percent: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(percent / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def main(args: argparse.Namespace) -> None:
+    latencies: list = []
+    errors: list = []
+    limits = httpx.Limits(max_connections=args.max_connections)
+    interval = 1.0 / args.rate
+
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30.0) as client:
+        tasks = []
+        started_at = time.perf_counter()
+        for i in range(args.rate * args.duration):
+            # Giữ tốc độ phát request cố định, không chờ response
+            delay = started_at + i * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(
+                _login(client, args.email, args.password, latencies, errors)
+            ))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started_at
+
+    print(f"Requests: {len(tasks)} trong {elapsed:.1f}s ({len(tasks) / elapsed:.0f} req/s)")
+    print(f"Lỗi: {len(errors)} {sorted(set(map(str, errors)))}")
+    if latencies:
+        latencies.sort()
+        print(
+            f"Latency ms - p50: {_percentile(latencies, 50):.1f}, "
+            f"p95: {_percentile(latencies, 95):.1f}, "
+            f"p99: {_percentile(latencies, 99):.1f}, "
+            f"mean: {statistics.mean(latencies):.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test endpoint login")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--rate", type=int, default=500, help="Số login mỗi giây")
+    parser.add_argument("--duration", type=int, default=10, help="Số giây chạy")
+    parser.add_argument("--max-connections", type=int, default=200)
+    parser.add_argument("--email", default=DEFAULT_EMAIL)
+    parser.add_argument("--password", default=DEFAULT_PASSWORD)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,53 @@
+"""
+Chuyển refresh_tokens sang lưu digest (token_hash)
+Bắt buộc chạy TRƯỚC khi deploy bản RefreshToken có token_hash:
+document cũ không có token_hash nên unique index token_hash_1 không tạo được
+(nhiều document cùng giá trị null) và init_beanie sẽ dừng server khi khởi động.
+Index expires_at_1 cũ khác options (TTL) cũng gây IndexOptionsConflict.
+
+Script dùng motor trực tiếp (không qua init_beanie):
+1. Xóa refresh token cũ chưa có token_hash (mọi user phải đăng nhập lại)
+2. Xóa index token_1 cũ
+3. Xóa index expires_at_1 cũ nếu chưa là TTL expireAfterSeconds=0
+   (init_beanie tạo lại index mới khi server khởi động)
+
+An toàn khi chạy lại. Chạy: python scripts/migrate_refresh_token_index.py
+"""
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from config.config import get_settings
+
+
+async def main() -> int:
+    settings = get_settings()
+    client = AsyncIOMotorClient(settings.mongodb_url)
+    refresh_tokens = client[settings.mongodb_database]["refresh_tokens"]
+
+    try:
+        result = await refresh_tokens.delete_many({"token_hash": {"$exists": False}})
+        print(f"Đã xóa {result.deleted_count} refresh token cũ (chưa có token_hash)")
+
+        indexes = await refresh_tokens.index_information()
+        if "token_1" in indexes:
+            await refresh_tokens.drop_index("token_1")
+            print("Đã xóa index refresh_tokens.token_1 cũ")
+
+        expires_index = indexes.get("expires_at_1")
+        if expires_index and expires_index.get("expireAfterSeconds") != 0:
+            await refresh_tokens.drop_index("expires_at_1")
+            print("Đã xóa index refresh_tokens.expires_at_1 cũ (không phải TTL)")
+
+        print("Xong - init_beanie sẽ tạo token_hash_1 và expires_at_1 khi start server")
+        return 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,59 @@
+"""
+Chuyển index email_1 của users sang unique
+Bắt buộc chạy TRƯỚC khi deploy bản khai báo IndexModel([("email", 1)], unique=True):
+init_beanie không sửa được index cùng tên khác options (IndexOptionsConflict)
+nên server sẽ không khởi động khi users còn index email_1 cũ.
+
+Script dùng motor trực tiếp (không qua init_beanie):
+1. Tìm email trùng - có thì in ra và dừng (cần gộp/xóa tài khoản trùng thủ công)
+2. Xóa index email_1 cũ nếu chưa unique
+3. Tạo lại email_1 unique
+
+An toàn khi chạy lại. Chạy: python scripts/migrate_user_email_index.py
+"""
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from config.config import get_settings
+
+
+async def main() -> int:
+    settings = get_settings()
+    client = AsyncIOMotorClient(settings.mongodb_url)
+    users = client[settings.mongodb_database]["users"]
+
+    try:
+        duplicates = await users.aggregate([
+            {"$group": {"_id": "$email", "count": {"$sum": 1}, "user_ids": {"$push": "$_id"}}},
+            {"$match": {"count": {"$gt": 1}}}
+        ]).to_list(length=None)
+        if duplicates:
+            print(f"Có {len(duplicates)} email trùng - xử lý trước khi tạo unique index:")
+            for item in duplicates:
+                print(f"  {item['_id']}: {item['user_ids']}")
+            return 1
+
+        indexes = await users.index_information()
+        email_index = indexes.get("email_1")
+        if email_index and email_index.get("unique"):
+            print("users.email_1 đã là unique index")
+            return 0
+
+        if email_index:
+            await users.drop_index("email_1")
+            print("Đã xóa index users.email_1 cũ (không unique)")
+
+        await users.create_index([("email", 1)], name="email_1", unique=True)
+        print("Đã tạo unique index users.email_1")
+        return 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -8,7 +8,12 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from fastapi import HTTPException, status
 from models.models import User, Course, Class, Enrollment, Progress
-from utils.security import hash_password, generate_random_password
+from utils.security import hash_password_async, generate_random_password
+from services.auth_service import invalidate_user_access
+from services.search_service import (
+    invalidate_user_course_scope, invalidate_all_course_scopes, bump_search_generation,
+    invalidate_user_search_results
+)
 
 
 # ============================================================================
@@ -289,7 +294,7 @@ async def create_user_admin(user_data: Dict) -> Dict:
         password = generate_random_password()
     
     # Hash password
-    hashed_password = hash_password(password)
+    hashed_password = await hash_password_async(password)
     
     # Create user
     user = User(
@@ -306,6 +311,7 @@ async def create_user_admin(user_data: Dict) -> Dict:
     
     try:
         await user.save()
+        invalidate_user_search_results()
         
         return {
             "user_id": str(user.id),
@@ -372,12 +378,15 @@ async def update_user_admin(user_id: str, update_data: Dict) -> Dict:
     
     # Hash new password if provided
     if "password" in update_data:
-        user.password = hash_password(update_data["password"])
+        user.password = await hash_password_async(update_data["password"])
     
     user.updated_at = datetime.utcnow()
     
     try:
         await user.save()
+        invalidate_user_course_scope(user_id)
+        invalidate_user_access(user_id)
+        invalidate_user_search_results()
         
         return {
             "user_id": str(user.id),
@@ -454,6 +463,9 @@ async def delete_user_admin(user_id: str) -> Dict:
     
     try:
         await user.save()
+        invalidate_user_course_scope(user_id)
+        invalidate_user_access(user_id)
+        invalidate_user_search_results()
         
         return {
             "user_id": str(user.id),
@@ -657,6 +669,8 @@ async def update_course_status_admin(course_id: str, new_status: str, admin_id:
     
     try:
         await course.save()
+        bump_search_generation()
+        invalidate_all_course_scopes()
         
         return {
             "course_id": str(course.id),
@@ -925,6 +939,9 @@ async def change_user_role_admin(user_id: str, new_role: str) -> Dict:
     
     try:
         await user.save()
+        invalidate_user_course_scope(user_id)
+        invalidate_user_access(user_id)
+        invalidate_user_search_results()
         
         return {
             "user_id": str(user.id),
@@ -971,7 +988,7 @@ async def reset_user_password_admin(user_id: str, new_password: str) -> Dict:
         )
     
     # Hash new password
-    user.password = hash_password(new_password)
+    user.password = await hash_password_async(new_password)
     user.updated_at = datetime.utcnow()
     
     try:
@@ -1013,6 +1030,8 @@ async def create_course_admin(course_data: Dict) -> Dict:
     
     try:
         await course.save()
+        bump_search_generation()
+        invalidate_all_course_scopes()
         
         # Get instructor info
         instructor = await User.get(course.instructor_id)
@@ -1063,6 +1082,9 @@ async def update_course_admin(course_id: str, update_data: Dict) -> Dict:
     
     try:
         await course.save()
+        bump_search_generation()
+        if "status" in update_data:
+            invalidate_all_course_scopes()
         
         return {
             "course_id": str(course.id),
@@ -1119,6 +1141,8 @@ async def delete_course_admin(course_id: str) -> Dict:
     
     try:
         await course.delete()
+        bump_search_generation()
+        invalidate_all_course_scopes()
         
         return {
             "message": "Khóa học đã được xóa vĩnh viễn"
@@ -9,6 +9,7 @@ from typing import List, Dict, Optional
 import google.generativeai as genai
 from config.config import get_settings
 from models.models import Course, Lesson
+from utils.request_context import get_document
 
 
 # ============================================================================
@@ -559,7 +560,7 @@ async def chat_with_course_context(
     
     try:
         # Lấy thông tin khóa học từ database
-        course = await Course.get(course_id)
+        course = await get_document(Course, course_id)
         
         if not course:
             logger.warning(f"Course not found: {course_id}")
@@ -1416,7 +1417,9 @@ def _generate_module_quiz_fallback(
         "questions": questions,
         "total_points": total_points,
         "mandatory_count": mandatory_count,
-        "estimated_time_minutes": estimated_time
+        "estimated_time_minutes": estimated_time,
+        # Câu hỏi mẫu - không lưu vào ngân hàng câu hỏi
+        "is_fallback": True
     }
 
 
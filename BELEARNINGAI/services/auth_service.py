@@ -1,55 +1,30 @@
 """
 Auth Service - Xử lý authentication và authorization
-Sử dụng: bcrypt (passlib), JWT (python-jose), MongoDB (Beanie)
+Sử dụng: bcrypt/argon2 (passlib), JWT (PyJWT), MongoDB (Beanie)
 Tuân thủ: CHUCNANG.md Section 2.1 (Login/Register/Token Management)
 """
 
-from datetime import datetime, timedelta
-from typing import Optional
-from passlib.context import CryptContext
-from jose import JWTError, jwt
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+import jwt
+from pydantic import BaseModel, Field
 from config.config import get_settings
 from models.models import User, RefreshToken
+from utils.cache import TTLCache
+# Password hashing dùng chung implementation trong utils.security (context + password pool)
+from utils.security import (
+    build_token_payload,
+    hash_token,
+    hash_password,
+    verify_password,
+    hash_password_async,
+    verify_password_async,
+    verify_and_update_password_async
+)
 
 settings = get_settings()
 
 
-# ============================================================================
-# PASSWORD HASHING với bcrypt
-# ============================================================================
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-def hash_password(password: str) -> str:
-    """
-    Hash password sử dụng bcrypt
-    
-    Args:
-        password: Plain text password
-        
-    Returns:
-        Hashed password string
-    """
-    # Giới hạn độ dài password để tránh lỗi bcrypt (max 72 bytes)
-    password = password[:72]
-    return pwd_context.hash(password)
-
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """
-    Verify password với hashed password
-    
-    Args:
-        plain_password: Plain text password từ user
-        hashed_password: Hashed password trong database
-        
-    Returns:
-        True nếu password khớp, False nếu không
-    """
-    return pwd_context.verify(plain_password, hashed_password)
-
-
 # ============================================================================
 # JWT TOKEN CREATION
 # ============================================================================
@@ -65,14 +40,11 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     Returns:
         JWT token string
     """
-    to_encode = data.copy()
-    
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
-    
-    to_encode.update({"exp": expire, "type": "access"})
+    # iat dùng để thu hồi token khi logout (so với User.tokens_revoked_at)
+    to_encode = build_token_payload(
+        {**data, "type": "access"},
+        expires_delta or timedelta(minutes=settings.access_token_expire_minutes)
+    )
     
     encoded_jwt = jwt.encode(
         to_encode, 
@@ -94,16 +66,12 @@ def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None)
     Returns:
         JWT refresh token string
     """
-    to_encode = data.copy()
-    
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        # Sử dụng giá trị từ settings hoặc mặc định 7 ngày
-        expire_days = getattr(settings, "refresh_token_expire_days", 7)
-        expire = datetime.utcnow() + timedelta(days=expire_days)
-    
-    to_encode.update({"exp": expire, "type": "refresh"})
+    # Sử dụng giá trị từ settings hoặc mặc định 7 ngày
+    expire_days = getattr(settings, "refresh_token_expire_days", 7)
+    to_encode = build_token_payload(
+        {**data, "type": "refresh"},
+        expires_delta or timedelta(days=expire_days)
+    )
     
     encoded_jwt = jwt.encode(
         to_encode, 
@@ -135,7 +103,7 @@ def decode_token(token: str) -> Optional[dict]:
             algorithms=[settings.algorithm]
         )
         return payload
-    except JWTError:
+    except jwt.PyJWTError:
         return None
 
 
@@ -154,16 +122,14 @@ async def validate_refresh_token(token: str) -> Optional[RefreshToken]:
     if not payload or payload.get("type") != "refresh":
         return None
     
-    # Tìm token trong database
-    refresh_token = await RefreshToken.find_one(RefreshToken.token == token)
+    # Tìm token trong database theo digest
+    refresh_token = await RefreshToken.find_one(RefreshToken.token_hash == hash_token(token))
     
     if not refresh_token:
         return None
     
-    # Kiểm tra expiry
+    # Kiểm tra expiry (TTL monitor của MongoDB chạy định kỳ nên có thể còn sót vài phút)
     if refresh_token.expires_at < datetime.utcnow():
-        # Token đã hết hạn, xóa khỏi database
-        await refresh_token.delete()
         return None
     
     return refresh_token
@@ -175,7 +141,7 @@ async def validate_refresh_token(token: str) -> Optional[RefreshToken]:
 
 async def save_refresh_token(user_id: str, token: str, expires_at: datetime) -> RefreshToken:
     """
-    Lưu refresh token vào MongoDB
+    Lưu refresh token vào MongoDB (chỉ lưu digest)
     
     Args:
         user_id: ID của user
@@ -187,7 +153,7 @@ async def save_refresh_token(user_id: str, token: str, expires_at: datetime) ->
     """
     refresh_token = RefreshToken(
         user_id=user_id,
-        token=token,
+        token_hash=hash_token(token),
         expires_at=expires_at
     )
     
@@ -205,13 +171,11 @@ async def delete_refresh_token(token: str) -> bool:
     Returns:
         True nếu xóa thành công, False nếu không tìm thấy
     """
-    refresh_token = await RefreshToken.find_one(RefreshToken.token == token)
-    
-    if refresh_token:
-        await refresh_token.delete()
-        return True
+    result = await RefreshToken.find(
+        RefreshToken.token_hash == hash_token(token)
+    ).delete_many()
     
-    return False
+    return bool(result and result.deleted_count)
 
 
 async def delete_all_user_tokens(user_id: str) -> int:
@@ -224,20 +188,41 @@ async def delete_all_user_tokens(user_id: str) -> int:
     Returns:
         Số lượng tokens đã xóa
     """
-    tokens = await RefreshToken.find(RefreshToken.user_id == user_id).to_list()
-    count = len(tokens)
+    # Một lệnh delete_many thay vì load + xóa từng document
+    result = await RefreshToken.find(RefreshToken.user_id == user_id).delete_many()
     
-    for token in tokens:
-        await token.delete()
-    
-    return count
+    return result.deleted_count if result else 0
 
 
 # ============================================================================
 # USER AUTHENTICATION
 # ============================================================================
 
-async def authenticate_user(email: str, password: str) -> Optional[User]:
+class LoginUserProjection(BaseModel):
+    """Projection chỉ lấy các field cần cho login (không load cả profile/preferences)"""
+    id: str = Field(alias="_id")
+    email: str
+    full_name: str
+    role: str
+    status: str = "active"
+    avatar_url: Optional[str] = None
+    hashed_password: str
+    # Không đọc từ DB - hash mới nếu hash hiện tại theo scheme/cost cũ
+    new_password_hash: Optional[str] = None
+
+    class Settings:
+        projection = {
+            "_id": 1,
+            "email": 1,
+            "full_name": 1,
+            "role": 1,
+            "status": 1,
+            "avatar_url": 1,
+            "hashed_password": 1
+        }
+
+
+async def authenticate_user(email: str, password: str) -> Optional[LoginUserProjection]:
     """
     Authenticate user bằng email và password
     
@@ -246,23 +231,44 @@ async def authenticate_user(email: str, password: str) -> Optional[User]:
         password: Plain text password
         
     Returns:
-        User document nếu authentication thành công, None nếu thất bại
+        Projection các field login nếu authentication thành công, None nếu thất bại.
+        new_password_hash (nếu có) được lưu cùng lúc với last_login_at trong record_login.
     """
-    user = await User.find_one(User.email == email)
+    user = await User.find_one(User.email == email).project(LoginUserProjection)
     
     if not user:
         return None
     
-    if not verify_password(password, user.hashed_password):
+    is_valid, new_hash = await verify_and_update_password_async(
+        password, user.hashed_password
+    )
+    if not is_valid:
         return None
     
     # Kiểm tra status
     if user.status != "active":
         return None
     
+    user.new_password_hash = new_hash
     return user
 
 
+async def record_login(user_id: str, new_password_hash: Optional[str] = None) -> None:
+    """
+    Ghi nhận đăng nhập thành công bằng một lệnh $set atomic
+    (không rewrite toàn bộ document như user.save())
+    
+    Args:
+        user_id: ID của user
+        new_password_hash: Hash nâng cấp (scheme/cost mới) nếu có
+    """
+    fields = {"last_login_at": datetime.utcnow()}
+    if new_password_hash:
+        fields["hashed_password"] = new_password_hash
+    
+    await User.find_one(User.id == user_id).update({"$set": fields})
+
+
 async def get_current_user_from_token(token: str) -> Optional[User]:
     """
     Lấy user từ access token
@@ -288,3 +294,72 @@ async def get_current_user_from_token(token: str) -> Optional[User]:
         return None
     
     return user
+
+
+# ============================================================================
+# USER ACCESS STATE - status/role/thu hồi token cho auth dependency
+# ============================================================================
+
+# TTL ngắn để thay đổi từ worker khác cũng có hiệu lực nhanh; trong cùng
+# worker thì các thao tác đổi status/role/xóa user/logout invalidate ngay
+_USER_ACCESS_TTL_SECONDS = 30
+_user_access_cache = TTLCache(maxsize=50000, ttl=_USER_ACCESS_TTL_SECONDS)
+
+
+class _UserAccessProjection(BaseModel):
+    """Projection chỉ lấy các field cần cho kiểm tra quyền truy cập"""
+    status: str = "active"
+    role: str = "student"
+    tokens_revoked_at: Optional[datetime] = None
+
+    class Settings:
+        projection = {"status": 1, "role": 1, "tokens_revoked_at": 1}
+
+
+async def get_user_access_state(user_id: str) -> Dict:
+    """
+    Lấy trạng thái truy cập hiện tại của user (có cache)
+    
+    Returns:
+        Dict với status, role, tokens_revoked_before (unix timestamp hoặc None).
+        User không tồn tại -> status "deleted".
+    """
+    state = _user_access_cache.get(user_id)
+    if state is not None:
+        return state
+    
+    user = await User.find_one(User.id == user_id).project(_UserAccessProjection)
+    if not user:
+        state = {"status": "deleted", "role": None, "tokens_revoked_before": None}
+    else:
+        revoked_before = None
+        if user.tokens_revoked_at:
+            # MongoDB lưu datetime tới mili giây - cùng độ chính xác với iat
+            revoked_before = user.tokens_revoked_at.replace(tzinfo=timezone.utc).timestamp()
+        state = {
+            "status": user.status,
+            "role": user.role,
+            "tokens_revoked_before": revoked_before
+        }
+    
+    _user_access_cache.set(user_id, state)
+    return state
+
+
+def invalidate_user_access(user_id: str) -> None:
+    """
+    Xóa access state đã cache của user
+    Gọi khi: đổi status, đổi role, xóa user, logout
+    """
+    _user_access_cache.pop(user_id)
+
+
+async def revoke_user_access_tokens(user_id: str) -> None:
+    """
+    Thu hồi mọi access token đã cấp cho user trước thời điểm hiện tại
+    (access token là stateless nên cần mốc thời gian để từ chối)
+    """
+    await User.find_one(User.id == user_id).update(
+        {"$set": {"tokens_revoked_at": datetime.utcnow()}}
+    )
+    invalidate_user_access(user_id)
@@ -9,12 +9,34 @@ from typing import List, Dict, Optional
 import random
 import string
 from models.models import Class, User, Course, Enrollment, Progress, QuizAttempt
+from services.search_service import invalidate_user_course_scope
+from services import leaderboard_service
+from services.enrollment_service import invalidate_course_access
+from utils.request_context import forget_document, get_document
 
 
 # ============================================================================
 # Section 3.1: QUẢN LÝ LỚP HỌC
 # ============================================================================
 
+async def get_class_by_id(class_id: str) -> Optional[Class]:
+    """
+    Lấy class theo ID
+
+    Đọc qua identity map + single-flight: các request đồng thời cùng class
+    dùng chung một query.
+    """
+    return await get_document(Class, class_id)
+
+
+async def get_owned_class(class_id: str, instructor_id: str) -> Optional[Class]:
+    """Lấy class nếu thuộc instructor (None nếu không tồn tại hoặc không phải owner)."""
+    cls = await get_class_by_id(class_id)
+    if not cls or cls.instructor_id != instructor_id:
+        return None
+    return cls
+
+
 async def create_class(
     instructor_id: str,
     name: str,
@@ -49,7 +71,7 @@ async def create_class(
         ValueError: Nếu course_id không tồn tại
     """
     # Validate course exists
-    course = await Course.get(course_id)
+    course = await get_document(Course, course_id)
     if not course:
         raise ValueError("Khóa học không tồn tại")
     
@@ -137,7 +159,7 @@ async def list_my_classes(
     classes_list = []
     for cls in classes:
         # Get course
-        course = await Course.get(cls.course_id)
+        course = await get_document(Course, cls.course_id)
         
         # Calculate student count
         student_count = len(cls.student_ids)
@@ -196,16 +218,13 @@ async def get_class_detail(class_id: str, instructor_id: str) -> Dict:
         ValueError: Nếu class không tồn tại hoặc không phải owner
     """
     # Find class with ownership check
-    cls = await Class.find_one(
-        Class.id == class_id,
-        Class.instructor_id == instructor_id
-    )
+    cls = await get_owned_class(class_id, instructor_id)
     
     if not cls:
         raise ValueError("Lớp học không tồn tại hoặc bạn không có quyền truy cập")
     
     # Get course
-    course = await Course.get(cls.course_id)
+    course = await get_document(Course, cls.course_id)
     
     # Count modules
     module_count = len(course.modules) if course else 0
@@ -311,10 +330,7 @@ async def update_class(
         ValueError: Nếu validation fails
     """
     # Find class
-    cls = await Class.find_one(
-        Class.id == class_id,
-        Class.instructor_id == instructor_id
-    )
+    cls = await get_owned_class(class_id, instructor_id)
     
     if not cls:
         raise ValueError("Lớp học không tồn tại hoặc bạn không có quyền chỉnh sửa")
@@ -375,10 +391,7 @@ async def delete_class(class_id: str, instructor_id: str) -> Dict:
         ValueError: Nếu không đủ điều kiện xóa
     """
     # Find class
-    cls = await Class.find_one(
-        Class.id == class_id,
-        Class.instructor_id == instructor_id
-    )
+    cls = await get_owned_class(class_id, instructor_id)
     
     if not cls:
         raise ValueError("Lớp học không tồn tại hoặc bạn không có quyền xóa")
@@ -390,6 +403,7 @@ async def delete_class(class_id: str, instructor_id: str) -> Dict:
     
     # Delete class
     await cls.delete()
+    forget_document(Class, cls.id)
     
     return {
         "message": "Đã xóa lớp học thành công"
@@ -464,9 +478,14 @@ async def join_class_with_code(user_id: str, invite_code: str) -> Dict:
         enrollment_id = enrollment.id
     else:
         enrollment_id = existing_enrollment.id
+    invalidate_user_course_scope(user_id)
+    invalidate_course_access(user_id, cls.course_id)
+    
+    # Quiz đã làm trước khi vào lớp -> đưa vào bảng xếp hạng của lớp
+    await leaderboard_service.rebuild_entries(cls.id, cls.course_id, [user_id])
     
     # Get course and instructor info
-    course = await Course.get(cls.course_id)
+    course = await get_document(Course, cls.course_id)
     instructor = await User.get(cls.instructor_id)
     
     return {
@@ -508,16 +527,13 @@ async def get_class_students(
         Dict với students list, total, pagination info
     """
     # Find class
-    cls = await Class.find_one(
-        Class.id == class_id,
-        Class.instructor_id == instructor_id
-    )
+    cls = await get_owned_class(class_id, instructor_id)
     
     if not cls:
         raise ValueError("Lớp học không tồn tại hoặc bạn không có quyền truy cập")
     
     # Get course
-    course = await Course.get(cls.course_id)
+    course = await get_document(Course, cls.course_id)
     total_modules = len(course.modules) if course else 0
     
     # Paginate student_ids
@@ -610,10 +626,7 @@ async def get_student_detail(
         Dict với student profile, quiz scores, progress
     """
     # Find class
-    cls = await Class.find_one(
-        Class.id == class_id,
-        Class.instructor_id == instructor_id
-    )
+    cls = await get_owned_class(class_id, instructor_id)
     
     if not cls:
         raise ValueError("Lớp học không tồn tại")
@@ -637,7 +650,7 @@ async def get_student_detail(
     ).sort(-QuizAttempt.created_at).to_list()
     
     # Get course
-    course = await Course.get(cls.course_id)
+    course = await get_document(Course, cls.course_id)
     
     # Format quiz scores
     quiz_scores = []
@@ -728,10 +741,7 @@ async def remove_student(
         Dict với message
     """
     # Find class
-    cls = await Class.find_one(
-        Class.id == class_id,
-        Class.instructor_id == instructor_id
-    )
+    cls = await get_owned_class(class_id, instructor_id)
     
     if not cls:
         raise ValueError("Lớp học không tồn tại")
@@ -743,6 +753,7 @@ async def remove_student(
     cls.student_ids.remove(student_id)
     cls.updated_at = datetime.utcnow()
     await cls.save()
+    await leaderboard_service.remove_class_member(cls.id, student_id)
     
     # Update enrollment status (keep data)
     enrollment = await Enrollment.find_one(
@@ -754,6 +765,8 @@ async def remove_student(
         enrollment.status = "removed"
         enrollment.updated_at = datetime.utcnow()
         await enrollment.save()
+        invalidate_user_course_scope(student_id)
+        invalidate_course_access(student_id, cls.course_id)
     
     return {
         "message": "Đã xóa học viên khỏi lớp"
@@ -781,16 +794,13 @@ async def get_class_progress(class_id: str, instructor_id: str) -> Dict:
         Dict với progress analytics
     """
     # Find class
-    cls = await Class.find_one(
-        Class.id == class_id,
-        Class.instructor_id == instructor_id
-    )
+    cls = await get_owned_class(class_id, instructor_id)
     
     if not cls:
         raise ValueError("Lớp học không tồn tại")
     
     # Get course
-    course = await Course.get(cls.course_id)
+    course = await get_document(Course, cls.course_id)
     
     # Query all students' progress
     progress_list = await Progress.find(
@@ -8,6 +8,8 @@ from datetime import datetime
 from typing import Optional, List
 from models.models import Course, Module, Lesson, Enrollment, EmbeddedModule, EmbeddedLesson
 from beanie.operators import In, RegEx, Or
+from services.search_service import invalidate_all_course_scopes, bump_search_generation
+from utils.request_context import forget_document, get_document
 
 
 # ============================================================================
@@ -47,6 +49,8 @@ async def create_course(
     )
     
     await course.insert()
+    bump_search_generation()
+    invalidate_all_course_scopes()
     return course
 
 
@@ -61,7 +65,7 @@ async def get_course_by_id(course_id: str) -> Optional[Course]:
         Course document hoặc None
     """
     try:
-        course = await Course.get(course_id)
+        course = await get_document(Course, course_id)
         return course
     except Exception:
         return None
@@ -152,6 +156,9 @@ async def update_course(
     course.updated_at = datetime.utcnow()
     
     await course.save()
+    bump_search_generation()
+    if status is not None:
+        invalidate_all_course_scopes()
     return course
 
 
@@ -171,6 +178,9 @@ async def delete_course(course_id: str) -> bool:
         return False
     
     await course.delete()
+    forget_document(Course, course.id)
+    bump_search_generation()
+    invalidate_all_course_scopes()
     return True
 
 
@@ -218,6 +228,7 @@ async def add_module_to_course(
     course.updated_at = datetime.utcnow()
     
     await course.save()
+    bump_search_generation()
     return course
 
 
@@ -261,6 +272,7 @@ async def update_module_in_course(
     
     course.updated_at = datetime.utcnow()
     await course.save()
+    bump_search_generation()
     return course
 
 
@@ -285,6 +297,7 @@ async def delete_module_from_course(course_id: str, module_id: str) -> Optional[
     course.updated_at = datetime.utcnow()
     
     await course.save()
+    bump_search_generation()
     return course
 
 
@@ -344,6 +357,7 @@ async def add_lesson_to_module(
     
     course.updated_at = datetime.utcnow()
     await course.save()
+    bump_search_generation()
     return course
 
 
@@ -394,6 +408,7 @@ async def update_lesson_in_module(
     
     course.updated_at = datetime.utcnow()
     await course.save()
+    bump_search_generation()
     return course
 
 
@@ -431,6 +446,7 @@ async def delete_lesson_from_module(
     
     course.updated_at = datetime.utcnow()
     await course.save()
+    bump_search_generation()
     return course
 
 
@@ -665,7 +681,7 @@ async def list_all_courses_admin(
     
     for course in courses:
         # Get author info
-        author = await User.get(course.owner_id)
+        author = await get_document(User, course.owner_id)
         
         author_info = {
             "user_id": course.owner_id,
@@ -729,7 +745,7 @@ async def get_course_detail_admin(course_id: str) -> dict:
         raise Exception("Khóa học không tồn tại")
     
     # Get author
-    author = await User.get(course.owner_id)
+    author = await get_document(User, course.owner_id)
     
     author_info = {
         "user_id": course.owner_id,
@@ -841,6 +857,8 @@ async def create_course_admin(
     )
     
     await course.insert()
+    bump_search_generation()
+    invalidate_all_course_scopes()
     
     return {
         "course_id": str(course.id),
@@ -923,6 +941,9 @@ async def update_course_admin(
     
     course.updated_at = datetime.utcnow()
     await course.save()
+    bump_search_generation()
+    if status:
+        invalidate_all_course_scopes()
     
     return {
         "course_id": str(course.id),
@@ -1003,6 +1024,9 @@ async def delete_course_admin(course_id: str) -> dict:
     
     # Delete course
     await course.delete()
+    forget_document(Course, course.id)
+    bump_search_generation()
+    invalidate_all_course_scopes()
     
     return {
         "course_id": str(course_id),
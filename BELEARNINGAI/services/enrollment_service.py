@@ -7,7 +7,107 @@ Tuân thủ: CHUCNANG.md Section 2.3.4-2.3.8, 2.4
 from datetime import datetime
 from typing import Optional, List
 from beanie.operators import In
+from pydantic import BaseModel
 from models.models import Enrollment, Progress, Course
+from services.search_service import invalidate_user_course_scope
+from utils.cache import TTLCache
+from utils.request_context import MISSING, get_document, get_request_memo, memo_lookup, memo_store
+
+
+# ============================================================================
+# COURSE ACCESS - kiểm tra quyền học có cache
+# ============================================================================
+
+# Trạng thái enrollment còn quyền truy cập nội dung khóa học
+ACCESS_ENROLLMENT_STATUSES = frozenset({"active", "completed"})
+
+# (user_id, course_id) -> "enrolled" | "owner" | "admin" | None
+# Enroll/hủy/tham gia lớp invalidate ngay; TTL ngắn cho thay đổi từ worker khác
+_COURSE_ACCESS_TTL_SECONDS = 30
+_course_access_cache = TTLCache(maxsize=50000, ttl=_COURSE_ACCESS_TTL_SECONDS)
+_MISSING = object()
+
+
+class _CourseOwnerProjection(BaseModel):
+    """Projection chỉ lấy owner_id của course"""
+    owner_id: Optional[str] = None
+
+    class Settings:
+        projection = {"owner_id": 1}
+
+
+def _enrollment_memo_key(user_id: str, course_id: str) -> tuple:
+    return ("enrollment", user_id, course_id)
+
+
+def invalidate_course_access(user_id: str, course_id: Optional[str] = None) -> None:
+    """
+    Xóa quyền truy cập đã cache (và enrollment đã memo trong request hiện tại)
+    Gọi sau khi enrollment của user được tạo/hủy/đổi trạng thái.
+    
+    Args:
+        user_id: ID của user
+        course_id: ID của course, None = mọi course của user
+    """
+    if course_id is None:
+        _course_access_cache.invalidate_where(lambda key: key[0] == user_id)
+    else:
+        _course_access_cache.pop((user_id, course_id))
+    
+    memo = get_request_memo()
+    if memo is not None:
+        stale_keys = [
+            key for key in memo
+            if isinstance(key, tuple) and key[0] == "enrollment" and key[1] == user_id
+            and (course_id is None or key[2] == course_id)
+        ]
+        for key in stale_keys:
+            del memo[key]
+
+
+async def get_course_access(
+    user_id: str,
+    course_id: str,
+    user_role: Optional[str] = None
+) -> Optional[str]:
+    """
+    Xác định quyền truy cập nội dung course của user
+    
+    Args:
+        user_id: ID của user
+        course_id: ID của course
+        user_role: Role từ token (admin luôn có quyền, không cần query)
+        
+    Returns:
+        "admin", "enrolled", "owner" hoặc None nếu không có quyền
+    """
+    if user_role == "admin":
+        return "admin"
+    
+    key = (user_id, course_id)
+    access = _course_access_cache.get(key, _MISSING)
+    if access is not _MISSING:
+        return access
+    
+    # Enrollment được memo trong request nên service phía sau đọc lại không tốn query
+    enrollment = await get_user_enrollment(user_id, course_id)
+    if enrollment and enrollment.status in ACCESS_ENROLLMENT_STATUSES:
+        access = "enrolled"
+    else:
+        course = await Course.find_one(Course.id == course_id).project(_CourseOwnerProjection)
+        access = "owner" if course and course.owner_id == user_id else None
+    
+    _course_access_cache.set(key, access)
+    return access
+
+
+async def has_course_access(
+    user_id: str,
+    course_id: str,
+    user_role: Optional[str] = None
+) -> bool:
+    """True nếu user đã đăng ký (active/completed), là owner course hoặc admin."""
+    return await get_course_access(user_id, course_id, user_role) is not None
 
 
 # ============================================================================
@@ -55,9 +155,11 @@ async def create_enrollment(user_id: str, course_id: str) -> Enrollment:
         cancelled_enrollment.completed_modules = []
         cancelled_enrollment.last_accessed_at = datetime.utcnow()
         await cancelled_enrollment.save()
+        invalidate_user_course_scope(user_id)
+        invalidate_course_access(user_id, course_id)
         
         # Tăng enrollment_count của course
-        course = await Course.get(course_id)
+        course = await get_document(Course, course_id)
         if course:
             course.enrollment_count += 1
             await course.save()
@@ -72,9 +174,11 @@ async def create_enrollment(user_id: str, course_id: str) -> Enrollment:
     )
     
     await enrollment.insert()
+    invalidate_user_course_scope(user_id)
+    invalidate_course_access(user_id, course_id)
     
     # Tăng enrollment_count của course
-    course = await Course.get(course_id)
+    course = await get_document(Course, course_id)
     if course:
         course.enrollment_count += 1
         await course.save()
@@ -102,6 +206,8 @@ async def get_enrollment_by_id(enrollment_id: str) -> Optional[Enrollment]:
 async def get_user_enrollment(user_id: str, course_id: str) -> Optional[Enrollment]:
     """
     Lấy enrollment của user cho một course cụ thể
+    Trong một request, kết quả được memo: controller và service đọc lại
+    cùng enrollment không tốn thêm query.
     
     Args:
         user_id: ID của user
@@ -110,11 +216,17 @@ async def get_user_enrollment(user_id: str, course_id: str) -> Optional[Enrollme
     Returns:
         Enrollment document hoặc None
     """
+    memo_key = _enrollment_memo_key(user_id, course_id)
+    enrollment = memo_lookup(memo_key)
+    if enrollment is not MISSING:
+        return enrollment
+    
     enrollment = await Enrollment.find_one(
         Enrollment.user_id == user_id,
         Enrollment.course_id == course_id
     )
     
+    memo_store(memo_key, enrollment)
     return enrollment
 
 
@@ -245,7 +357,7 @@ async def mark_lesson_completed(
         enrollment.completed_lessons.append(lesson_id)
     
     # Tính lại progress
-    course = await Course.get(course_id)
+    course = await get_document(Course, course_id)
     if course and hasattr(course, 'modules') and course.modules:
         total_lessons = sum(len(module.lessons) for module in course.modules)
         if total_lessons > 0:
@@ -281,9 +393,11 @@ async def cancel_enrollment(enrollment_id: str) -> Optional[Enrollment]:
     
     enrollment.status = "cancelled"
     await enrollment.save()
+    invalidate_user_course_scope(enrollment.user_id)
+    invalidate_course_access(enrollment.user_id, enrollment.course_id)
     
     # Giảm enrollment_count của course
-    course = await Course.get(enrollment.course_id)
+    course = await get_document(Course, enrollment.course_id)
     if course and course.enrollment_count > 0:
         course.enrollment_count -= 1
         await course.save()
@@ -321,7 +435,7 @@ async def get_or_create_progress(
         return progress
     
     # Tạo progress mới
-    course = await Course.get(course_id)
+    course = await get_document(Course, course_id)
     total_lessons = 0
     if course and hasattr(course, 'modules') and course.modules:
         total_lessons = sum(len(module.lessons) for module in course.modules)
@@ -0,0 +1,186 @@
+"""
+Idempotency Service - Chống xử lý trùng request nộp bài
+Tuân thủ: CHUCNANG.md Section 2.4.4 (nộp bài quiz)
+
+Client gửi header Idempotency-Key cho mỗi lần nộp bài. Lần đầu: giữ chỗ key
+(insert với unique _id), xử lý request rồi lưu response. Gửi lại cùng key
+(retry khi mạng chập chờn, double-click): trả response đã lưu, không chấm
+điểm hay ghi attempt lần nữa. Record tự hết hạn nhờ TTL index.
+"""
+
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from models.models import IDEMPOTENCY_KEY_TTL_HOURS, IdempotencyRecord
+
+logger = logging.getLogger(__name__)
+
+# Độ dài tối đa của Idempotency-Key (UUID, ULID, ... đều ngắn hơn nhiều)
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# Record in_progress quá thời gian này coi như request trước đã chết giữa chừng
+IDEMPOTENCY_LOCK_SECONDS = 60
+
+
+def request_fingerprint(payload: Any) -> str:
+    """SHA-256 của body request (JSON chuẩn hóa thứ tự key)."""
+    content = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _record_id(user_id: str, scope: str, key: str) -> str:
+    return f"{user_id}:{scope}:{key}"
+
+
+# ============================================================================
+# RECORD LIFECYCLE
+# ============================================================================
+
+async def begin_request(
+    user_id: str,
+    scope: str,
+    key: str,
+    request_hash: str
+) -> Optional[Dict]:
+    """
+    Giữ chỗ Idempotency-Key cho request hiện tại
+
+    Returns:
+        None nếu request hiện tại được xử lý, hoặc response đã lưu của lần trước
+
+    Raises:
+        400: Key rỗng hoặc quá dài
+        409: Request cùng key đang được xử lý
+        422: Key đã dùng cho request có body khác
+    """
+    if not key or len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key phải có 1-{MAX_IDEMPOTENCY_KEY_LENGTH} ký tự"
+        )
+
+    record_id = _record_id(user_id, scope, key)
+
+    # Lần thử thứ hai chỉ xảy ra khi TTL xóa record ngay giữa insert và get
+    for _ in range(2):
+        now = datetime.utcnow()
+        try:
+            await IdempotencyRecord(
+                id=record_id,
+                user_id=user_id,
+                scope=scope,
+                request_hash=request_hash,
+                created_at=now,
+                expires_at=now + timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS)
+            ).insert()
+            return None
+        except DuplicateKeyError:
+            pass
+
+        existing = await IdempotencyRecord.get(record_id)
+        if existing is None:
+            continue
+
+        if existing.request_hash != request_hash:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key đã được dùng cho một request khác"
+            )
+
+        if existing.status == "completed":
+            return existing.response
+
+        # Request trước giữ key quá lâu (crash giữa chừng) -> nhận lại key
+        taken_over = await IdempotencyRecord.get_motor_collection().find_one_and_update(
+            {
+                "_id": record_id,
+                "status": "in_progress",
+                "created_at": {"$lt": now - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)}
+            },
+            {"$set": {"created_at": now}},
+            return_document=ReturnDocument.AFTER
+        )
+        if taken_over is not None:
+            return None
+
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Request với Idempotency-Key này đang được xử lý"
+        )
+
+    return None
+
+
+async def complete_request(
+    user_id: str,
+    scope: str,
+    key: str,
+    response: Dict,
+    status_code: int = status.HTTP_200_OK
+) -> None:
+    """Lưu response của request đã xử lý xong."""
+    await IdempotencyRecord.find_one(
+        IdempotencyRecord.id == _record_id(user_id, scope, key)
+    ).update({"$set": {
+        "status": "completed",
+        "status_code": status_code,
+        "response": response
+    }})
+
+
+async def release_request(user_id: str, scope: str, key: str) -> None:
+    """Bỏ giữ chỗ key khi request lỗi (client được phép gửi lại cùng key)."""
+    await IdempotencyRecord.find_one(
+        IdempotencyRecord.id == _record_id(user_id, scope, key)
+    ).delete()
+
+
+# ============================================================================
+# WRAPPER
+# ============================================================================
+
+async def run_idempotent(
+    user_id: str,
+    scope: str,
+    key: str,
+    payload: Any,
+    handler: Callable[[], Awaitable[BaseModel]],
+    status_code: int = status.HTTP_200_OK
+) -> Dict:
+    """
+    Chạy handler tối đa một lần cho mỗi (user, scope, Idempotency-Key)
+
+    Args:
+        user_id: ID user gửi request
+        scope: Endpoint + tài nguyên, ví dụ "quiz_attempt:{quiz_id}"
+        key: Giá trị header Idempotency-Key
+        payload: Body request (so khớp khi key bị dùng lại)
+        handler: Coroutine factory xử lý request, trả response model
+        status_code: HTTP status của response thành công
+
+    Returns:
+        Response dạng JSON dict (mới xử lý hoặc đã lưu từ lần trước)
+    """
+    cached = await begin_request(user_id, scope, key, request_fingerprint(payload))
+    if cached is not None:
+        logger.info(f"[IDEMPOTENCY] Replayed {scope} for user {user_id}")
+        return cached
+
+    try:
+        result = await handler()
+    except Exception:
+        # Lỗi (kể cả HTTPException 4xx) không được lưu -> retry xử lý lại từ đầu
+        await release_request(user_id, scope, key)
+        raise
+
+    response = result.model_dump(mode="json")
+    await complete_request(user_id, scope, key, response, status_code)
+    return response
@@ -0,0 +1,343 @@
+"""
+Leaderboard Service - Bảng xếp hạng quiz theo lớp
+Tuân thủ: CHUCNANG.md Section 3.3.5 (xếp hạng học viên)
+
+Mỗi (quiz, lớp, học viên) có một entry giữ attempt tốt nhất (điểm cao nhất,
+bằng điểm thì ít thời gian hơn), cập nhật atomic ngay khi nộp bài. Entry lưu
+kèm tên/avatar nên:
+- Top-N: một index scan trên (quiz_id, class_id, score, time, user_id)
+- Hạng của một học viên: đếm các entry xếp trên trong cùng index
+Không cần nạp attempts hay đọc users khi xem bảng xếp hạng.
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from beanie.operators import In
+from pydantic import BaseModel, Field
+from pymongo import UpdateOne
+
+from models.models import Class, Quiz, QuizAttempt, QuizLeaderboardEntry, User
+from utils.request_context import get_document
+
+
+def _entry_id(quiz_id: str, class_id: str, user_id: str) -> str:
+    return f"{quiz_id}:{class_id}:{user_id}"
+
+
+class _IdProjection(BaseModel):
+    """Projection chỉ lấy _id"""
+    id: str = Field(alias="_id")
+
+    class Settings:
+        projection = {"_id": 1}
+
+
+class _UserDisplayProjection(BaseModel):
+    """Projection thông tin hiển thị của user"""
+    id: str = Field(alias="_id")
+    full_name: str = "Unknown"
+    avatar_url: Optional[str] = None
+
+    class Settings:
+        projection = {"_id": 1, "full_name": 1, "avatar_url": 1}
+
+
+class _AttemptRankProjection(BaseModel):
+    """Projection các field xếp hạng của attempt"""
+    quiz_id: str
+    user_id: str
+    score: float = 0.0
+    passed: bool = False
+    time_spent_seconds: int = 0
+    submitted_at: datetime
+
+    class Settings:
+        projection = {
+            "quiz_id": 1,
+            "user_id": 1,
+            "score": 1,
+            "passed": 1,
+            "time_spent_seconds": 1,
+            "submitted_at": 1
+        }
+
+
+# ============================================================================
+# CẬP NHẬT KHI NỘP BÀI
+# ============================================================================
+
+def _submission_pipeline(
+    quiz_id: str,
+    class_id: str,
+    user_id: str,
+    display: Dict,
+    best: Dict,
+    now: datetime
+) -> List[Dict]:
+    """
+    Update pipeline: tăng attempt_count, chỉ thay attempt tốt nhất khi bài mới tốt hơn
+
+    Chạy được cả khi entry chưa tồn tại (upsert): field chưa có -> bài mới là tốt nhất.
+    """
+    is_better = {"$or": [
+        {"$eq": [{"$type": "$score"}, "missing"]},
+        {"$gt": [best["score"], "$score"]},
+        {"$and": [
+            {"$eq": [best["score"], "$score"]},
+            {"$lt": [best["time_spent_seconds"], "$time_spent_seconds"]}
+        ]}
+    ]}
+    return [
+        {"$set": {"_is_better": is_better}},
+        {"$set": {
+            "quiz_id": quiz_id,
+            "class_id": class_id,
+            "user_id": user_id,
+            "full_name": {"$literal": display["full_name"]},
+            "avatar_url": {"$literal": display["avatar_url"]},
+            **{
+                field: {"$cond": ["$_is_better", {"$literal": value}, f"${field}"]}
+                for field, value in best.items()
+            },
+            "attempt_count": {"$add": [{"$ifNull": ["$attempt_count", 0]}, 1]},
+            "updated_at": now
+        }},
+        {"$unset": "_is_better"}
+    ]
+
+
+async def record_submission(
+    quiz_id: str,
+    course_id: str,
+    user_id: str,
+    score: float,
+    passed: bool,
+    time_spent_seconds: int,
+    completed_at: datetime
+) -> int:
+    """
+    Cập nhật bảng xếp hạng của mọi lớp (thuộc course của quiz) mà học viên tham gia
+
+    Returns:
+        Số lớp đã cập nhật
+    """
+    classes = await Class.find(
+        Class.course_id == course_id,
+        Class.student_ids == user_id
+    ).project(_IdProjection).to_list()
+    if not classes:
+        return 0
+
+    user = await get_document(User, user_id)
+    display = {
+        "full_name": user.full_name if user else "Unknown",
+        "avatar_url": user.avatar_url if user else None
+    }
+    best = {
+        "score": float(score),
+        "time_spent_seconds": int(time_spent_seconds),
+        "passed": bool(passed),
+        "completed_at": completed_at
+    }
+    now = datetime.utcnow()
+
+    await QuizLeaderboardEntry.get_motor_collection().bulk_write([
+        UpdateOne(
+            {"_id": _entry_id(quiz_id, cls.id, user_id)},
+            _submission_pipeline(quiz_id, cls.id, user_id, display, best, now),
+            upsert=True
+        )
+        for cls in classes
+    ], ordered=False)
+    return len(classes)
+
+
+# ============================================================================
+# TRUY VẤN
+# ============================================================================
+
+async def get_top_entries(quiz_id: str, class_id: str, limit: int = 20) -> List[QuizLeaderboardEntry]:
+    """Top-N của lớp theo thứ tự xếp hạng (đọc thẳng từ index)."""
+    return await QuizLeaderboardEntry.find(
+        QuizLeaderboardEntry.quiz_id == quiz_id,
+        QuizLeaderboardEntry.class_id == class_id
+    ).sort(
+        -QuizLeaderboardEntry.score,
+        +QuizLeaderboardEntry.time_spent_seconds,
+        +QuizLeaderboardEntry.user_id
+    ).limit(limit).to_list()
+
+
+async def count_entries(quiz_id: str, class_id: str) -> int:
+    """Số học viên đã có kết quả trong bảng xếp hạng của lớp."""
+    return await QuizLeaderboardEntry.find(
+        QuizLeaderboardEntry.quiz_id == quiz_id,
+        QuizLeaderboardEntry.class_id == class_id
+    ).count()
+
+
+async def get_user_rank(
+    quiz_id: str,
+    class_id: str,
+    user_id: str
+) -> Optional[Tuple[int, QuizLeaderboardEntry]]:
+    """
+    Hạng của một học viên (cùng thứ tự với get_top_entries)
+
+    Returns:
+        (hạng, entry) hoặc None nếu học viên chưa nộp bài
+    """
+    entry = await QuizLeaderboardEntry.get(_entry_id(quiz_id, class_id, user_id))
+    if not entry:
+        return None
+
+    ahead = await QuizLeaderboardEntry.find({
+        "quiz_id": quiz_id,
+        "class_id": class_id,
+        "$or": [
+            {"score": {"$gt": entry.score}},
+            {"score": entry.score, "time_spent_seconds": {"$lt": entry.time_spent_seconds}},
+            {
+                "score": entry.score,
+                "time_spent_seconds": entry.time_spent_seconds,
+                "user_id": {"$lt": user_id}
+            }
+        ]
+    }).count()
+    return ahead + 1, entry
+
+
+def to_rank_item(entry: QuizLeaderboardEntry, rank: int) -> Dict:
+    """Entry -> dict theo StudentRank schema."""
+    return {
+        "rank": rank,
+        "user_id": entry.user_id,
+        "full_name": entry.full_name,
+        "avatar": entry.avatar_url,
+        "score": round(entry.score, 2),
+        "time_spent": entry.time_spent_seconds // 60,
+        "attempt_count": entry.attempt_count,
+        "status": "pass" if entry.passed else "fail",
+        "completed_at": entry.completed_at
+    }
+
+
+async def get_leaderboard(quiz_id: str, class_id: str, user_id: str, limit: int = 20) -> Dict:
+    """
+    Top-N của lớp kèm hạng của user hiện tại
+
+    Returns:
+        Dict theo QuizLeaderboardResponse schema
+    """
+    top = [
+        to_rank_item(entry, rank)
+        for rank, entry in enumerate(await get_top_entries(quiz_id, class_id, limit), start=1)
+    ]
+
+    my_rank = next((item for item in top if item["user_id"] == user_id), None)
+    if my_rank is None:
+        ranked = await get_user_rank(quiz_id, class_id, user_id)
+        if ranked:
+            my_rank = to_rank_item(ranked[1], ranked[0])
+
+    return {
+        "quiz_id": quiz_id,
+        "class_id": class_id,
+        "total_ranked": await count_entries(quiz_id, class_id),
+        "top": top,
+        "my_rank": my_rank
+    }
+
+
+# ============================================================================
+# ĐỒNG BỘ KHI LỚP / USER THAY ĐỔI
+# ============================================================================
+
+async def rebuild_entries(class_id: str, course_id: str, user_ids: List[str]) -> int:
+    """
+    Dựng lại entries của các học viên trong lớp từ quiz_attempts
+
+    Dùng khi học viên vào lớp (đã làm quiz trước đó) và cho script backfill.
+
+    Returns:
+        Số entry đã ghi
+    """
+    if not user_ids:
+        return 0
+
+    quiz_ids = [
+        quiz.id for quiz in await Quiz.find(Quiz.course_id == course_id).project(_IdProjection).to_list()
+    ]
+    if not quiz_ids:
+        return 0
+
+    attempts = await QuizAttempt.find(
+        In(QuizAttempt.quiz_id, quiz_ids),
+        In(QuizAttempt.user_id, user_ids),
+        QuizAttempt.submitted_at != None
+    ).project(_AttemptRankProjection).to_list()
+
+    best: Dict[Tuple[str, str], _AttemptRankProjection] = {}
+    attempt_counts: Dict[Tuple[str, str], int] = defaultdict(int)
+    for attempt in attempts:
+        key = (attempt.quiz_id, attempt.user_id)
+        attempt_counts[key] += 1
+        current = best.get(key)
+        if current is None or (attempt.score, -attempt.time_spent_seconds) > (
+            current.score, -current.time_spent_seconds
+        ):
+            best[key] = attempt
+
+    if not best:
+        return 0
+
+    users = {
+        user.id: user
+        for user in await User.find(In(User.id, user_ids)).project(_UserDisplayProjection).to_list()
+    }
+    now = datetime.utcnow()
+    operations = []
+    for (quiz_id, user_id), attempt in best.items():
+        user = users.get(user_id)
+        operations.append(UpdateOne(
+            {"_id": _entry_id(quiz_id, class_id, user_id)},
+            {"$set": {
+                "quiz_id": quiz_id,
+                "class_id": class_id,
+                "user_id": user_id,
+                "full_name": user.full_name if user else "Unknown",
+                "avatar_url": user.avatar_url if user else None,
+                "score": attempt.score,
+                "time_spent_seconds": attempt.time_spent_seconds,
+                "passed": attempt.passed,
+                "completed_at": attempt.submitted_at,
+                "attempt_count": attempt_counts[(quiz_id, user_id)],
+                "updated_at": now
+            }},
+            upsert=True
+        ))
+
+    await QuizLeaderboardEntry.get_motor_collection().bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+async def remove_class_member(class_id: str, user_id: str) -> None:
+    """Xóa học viên khỏi bảng xếp hạng của lớp."""
+    await QuizLeaderboardEntry.find(
+        QuizLeaderboardEntry.class_id == class_id,
+        QuizLeaderboardEntry.user_id == user_id
+    ).delete_many()
+
+
+async def remove_quiz(quiz_id: str) -> None:
+    """Xóa bảng xếp hạng của quiz đã bị xóa."""
+    await QuizLeaderboardEntry.find(QuizLeaderboardEntry.quiz_id == quiz_id).delete_many()
+
+
+async def refresh_user_display(user_id: str, full_name: str, avatar_url: Optional[str]) -> None:
+    """Cập nhật tên/avatar đã denormalize khi user sửa profile."""
+    await QuizLeaderboardEntry.find(QuizLeaderboardEntry.user_id == user_id).update_many(
+        {"$set": {"full_name": full_name, "avatar_url": avatar_url}}
+    )
@@ -5,8 +5,11 @@ Tuân thủ: CHUCNANG.md Section 2.4.1-2.4.2, ENDPOINTS.md learning_router
 """
 
 from datetime import datetime
-from typing import Optional, List, Dict
-from models.models import Course, Module, Lesson, Enrollment, Progress, Quiz
+from typing import Optional, List, Dict, Tuple
+from pydantic import BaseModel, Field
+from models.models import Course, Module, Lesson, Enrollment, Progress, Quiz, QuizAttemptSummary
+from utils.cache import TTLCache
+from utils.request_context import get_document
 
 
 # ============================================================================
@@ -31,7 +34,7 @@ async def get_module_detail(
         Dict chứa module detail hoặc None
     """
     # Lấy course
-    course = await Course.get(course_id)
+    course = await get_document(Course, course_id)
     if not course:
         return None
     
@@ -142,6 +145,221 @@ async def get_module_detail(
     return result
 
 
+# ============================================================================
+# LESSON NAVIGATION OUTLINE (cache theo phiên bản course)
+# ============================================================================
+
+# (course_id, course.updated_at) -> CourseOutline; sửa course đổi updated_at nên key cũ tự hết dùng.
+# Quiz thêm/sửa/xóa gọi invalidate_course_outline (không đổi updated_at của course).
+_course_outline_cache = TTLCache(maxsize=1024, ttl=300)
+
+
+class LessonOutlineEntry:
+    """Vị trí của một lesson trong course (module, lesson trước/sau)"""
+
+    __slots__ = ("module_id", "module_title", "title", "previous_id", "next_id", "embedded")
+
+    def __init__(self, module_id: Optional[str], module_title: Optional[str], title: str, embedded: bool):
+        self.module_id = module_id
+        self.module_title = module_title
+        self.title = title
+        self.previous_id: Optional[str] = None
+        self.next_id: Optional[str] = None
+        self.embedded = embedded
+
+
+class CourseOutline:
+    """
+    Outline điều hướng của course
+    
+    Attributes:
+        lessons: lesson_id -> LessonOutlineEntry (prev/next trong cùng module)
+        quizzes: lesson_id -> (quiz_id, số câu hỏi)
+    """
+
+    __slots__ = ("lessons", "quizzes")
+
+    def __init__(self):
+        self.lessons: Dict[str, LessonOutlineEntry] = {}
+        self.quizzes: Dict[str, Tuple[str, int]] = {}
+
+    def add_module(
+        self,
+        module_id: Optional[str],
+        module_title: Optional[str],
+        ordered_lessons: List[Tuple[str, str]],
+        embedded: bool
+    ) -> None:
+        """Thêm các lesson (id, title) đã sắp theo order của một module."""
+        previous = None
+        for lesson_id, title in ordered_lessons:
+            if lesson_id in self.lessons:
+                continue
+            entry = LessonOutlineEntry(module_id, module_title, title, embedded)
+            if previous is not None:
+                entry.previous_id = previous
+                self.lessons[previous].next_id = lesson_id
+            self.lessons[lesson_id] = entry
+            previous = lesson_id
+
+    def title_of(self, lesson_id: Optional[str]) -> Optional[str]:
+        entry = self.lessons.get(lesson_id) if lesson_id else None
+        return entry.title if entry else None
+
+
+class _LessonOutlineProjection(BaseModel):
+    """Projection lesson standalone cho outline (không load content)"""
+    id: str = Field(alias="_id")
+    module_id: str
+    title: str
+    order: int = 0
+
+    class Settings:
+        projection = {"_id": 1, "module_id": 1, "title": 1, "order": 1}
+
+
+class _ModuleTitleProjection(BaseModel):
+    """Projection title của module standalone"""
+    id: str = Field(alias="_id")
+    title: str
+
+    class Settings:
+        projection = {"_id": 1, "title": 1}
+
+
+async def _build_course_outline(course: Course) -> CourseOutline:
+    course_id = str(course.id)
+    outline = CourseOutline()
+    
+    # Lesson embedded trong course.modules
+    for module in course.modules or []:
+        ordered = sorted(module.lessons or [], key=lambda l: l.order)
+        outline.add_module(
+            str(module.id), module.title, [(str(l.id), l.title) for l in ordered], embedded=True
+        )
+    
+    # Lesson standalone (collection lessons) chưa có trong embedded modules
+    standalone = await Lesson.find(Lesson.course_id == course_id).project(_LessonOutlineProjection).to_list()
+    if standalone:
+        module_titles = {
+            m.id: m.title
+            for m in await Module.find(Module.course_id == course_id).project(_ModuleTitleProjection).to_list()
+        }
+        by_module: Dict[str, List[_LessonOutlineProjection]] = {}
+        for lesson in standalone:
+            by_module.setdefault(lesson.module_id, []).append(lesson)
+        for module_id, lessons in by_module.items():
+            lessons.sort(key=lambda l: l.order)
+            outline.add_module(
+                module_id, module_titles.get(module_id), [(l.id, l.title) for l in lessons], embedded=False
+            )
+    
+    # Quiz của từng lesson (quiz tạo trước được ưu tiên)
+    if outline.lessons:
+        quizzes = await Quiz.aggregate([
+            {"$match": {"lesson_id": {"$in": list(outline.lessons)}}},
+            {"$sort": {"created_at": 1}},
+            {"$project": {"lesson_id": 1, "question_count": {"$size": {"$ifNull": ["$questions", []]}}}}
+        ]).to_list()
+        for quiz in quizzes:
+            outline.quizzes.setdefault(quiz["lesson_id"], (str(quiz["_id"]), quiz["question_count"]))
+    
+    return outline
+
+
+async def get_course_outline(course: Course) -> CourseOutline:
+    """Outline điều hướng của course (cache theo course.updated_at)."""
+    key = (str(course.id), course.updated_at)
+    outline = _course_outline_cache.get(key)
+    if outline is None:
+        outline = await _build_course_outline(course)
+        _course_outline_cache.set(key, outline)
+    return outline
+
+
+def invalidate_course_outline(course_id: str) -> None:
+    """Bỏ outline đã cache của course (khi quiz của lesson thay đổi)."""
+    _course_outline_cache.invalidate_where(lambda key: key[0] == course_id)
+
+
+async def _get_lesson_user_status(
+    user_id: str,
+    course_id: str,
+    lesson_id: str,
+    quiz_id: Optional[str]
+) -> Optional[Dict]:
+    """
+    Trạng thái học của user cho một lesson bằng một aggregation
+    (enrollment + tiến độ lesson trong Progress + quiz summary)
+    
+    $lookup chỉ dùng let + $expr (không kết hợp localField/foreignField với
+    pipeline - cú pháp đó cần MongoDB 5.0)
+    
+    Returns:
+        Dict (_id của enrollment, is_completed, lesson_progress, quiz_passed)
+        hoặc None nếu chưa enroll
+    """
+    pipeline: List[Dict] = [
+        {"$match": {"user_id": user_id, "course_id": course_id}},
+        {"$limit": 1},
+        {
+            "$lookup": {
+                "from": Progress.get_collection_name(),
+                "let": {"user_id": "$user_id", "course_id": "$course_id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$and": [
+                        {"$eq": ["$user_id", "$$user_id"]},
+                        {"$eq": ["$course_id", "$$course_id"]}
+                    ]}}},
+                    {
+                        "$project": {
+                            "_id": 0,
+                            "lesson": {
+                                "$first": {
+                                    "$filter": {
+                                        "input": {"$ifNull": ["$lessons_progress", []]},
+                                        "cond": {"$eq": ["$$this.lesson_id", lesson_id]}
+                                    }
+                                }
+                            }
+                        }
+                    }
+                ],
+                "as": "progress"
+            }
+        }
+    ]
+    
+    quiz_passed: object = False
+    if quiz_id:
+        pipeline.append({
+            "$lookup": {
+                "from": QuizAttemptSummary.get_collection_name(),
+                "let": {"user_id": "$user_id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$and": [
+                        {"$eq": ["$user_id", "$$user_id"]},
+                        {"$eq": ["$quiz_id", quiz_id]}
+                    ]}}},
+                    {"$project": {"_id": 0, "passed": 1}}
+                ],
+                "as": "quiz_summary"
+            }
+        })
+        quiz_passed = {"$ifNull": [{"$first": "$quiz_summary.passed"}, False]}
+    
+    pipeline.append({
+        "$project": {
+            "is_completed": {"$in": [lesson_id, {"$ifNull": ["$completed_lessons", []]}]},
+            "lesson_progress": {"$first": "$progress.lesson"},
+            "quiz_passed": quiz_passed
+        }
+    })
+    
+    rows = await Enrollment.aggregate(pipeline).to_list()
+    return rows[0] if rows else None
+
+
 async def get_lesson_content(
     course_id: str,
     lesson_id: str,
@@ -151,6 +369,10 @@ async def get_lesson_content(
     Lấy nội dung chi tiết của lesson
     Section 2.4.2
     
+    Điều hướng (prev/next, quiz của lesson) lấy từ outline đã cache; trạng
+    thái học của user lấy bằng một aggregation. Lesson embedded chỉ cần
+    course (thường đã có trong identity map của request) + một aggregation.
+    
     Args:
         course_id: ID của course
         lesson_id: ID của lesson
@@ -159,114 +381,63 @@ async def get_lesson_content(
     Returns:
         Dict chứa lesson content hoặc None
     """
+    lesson_id = str(lesson_id)
+    
     # Lấy course
-    course = await Course.get(course_id)
+    course = await get_document(Course, course_id)
     if not course:
         return None
     
-    # Tìm lesson và module chứa lesson
-    lesson = None
-    module = None
+    outline = await get_course_outline(course)
+    entry = outline.lessons.get(lesson_id)
+    if entry is None:
+        return None
     
-    # First try to find in embedded modules
-    if hasattr(course, 'modules') and course.modules:
+    # Tìm lesson: embedded trong course.modules hoặc document standalone
+    lesson = None
+    if entry.embedded:
         for m in course.modules:
-            if m.lessons:
-                for l in m.lessons:
-                    if str(l.id) == str(lesson_id):
-                        lesson = l
-                        module = m
-                        break
-            if lesson:
+            if str(m.id) == entry.module_id:
+                lesson = next((l for l in m.lessons if str(l.id) == lesson_id), None)
                 break
-    
-    # If not found, try to find standalone Lesson document
-    if not lesson:
-        from models.models import Lesson as LessonModel, Module as ModuleModel
-        standalone_lesson = await LessonModel.get(lesson_id)
-        if standalone_lesson and str(standalone_lesson.course_id) == str(course_id):
-            lesson = standalone_lesson
-            # Get the module for this lesson
-            if standalone_lesson.module_id:
-                module = await ModuleModel.get(standalone_lesson.module_id)
+    else:
+        lesson = await get_document(Lesson, lesson_id)
     
     if not lesson:
         return None
     
     # Tìm lesson trước và sau
-    previous_lesson_id = None
-    next_lesson_id = None
-    
-    # Handle navigation for embedded lessons
-    if module and hasattr(module, 'lessons') and module.lessons:
-        lessons_in_module = sorted(module.lessons, key=lambda x: x.order)
-        for i, l in enumerate(lessons_in_module):
-            if str(l.id) == str(lesson_id):
-                if i > 0:
-                    previous_lesson_id = str(lessons_in_module[i-1].id)
-                if i < len(lessons_in_module) - 1:
-                    next_lesson_id = str(lessons_in_module[i+1].id)
-                break
-    # Handle navigation for standalone lessons
-    elif module:
-        from models.models import Lesson as LessonModel
-        module_lessons = await LessonModel.find(
-            LessonModel.module_id == str(module.id),
-            LessonModel.course_id == course_id
-        ).sort("order").to_list()
-        
-        for i, l in enumerate(module_lessons):
-            if str(l.id) == str(lesson_id):
-                if i > 0:
-                    previous_lesson_id = str(module_lessons[i-1].id)
-                if i < len(module_lessons) - 1:
-                    next_lesson_id = str(module_lessons[i+1].id)
-                break
+    previous_lesson_id = entry.previous_id
+    next_lesson_id = entry.next_id
+    
+    quiz_id, question_count = outline.quizzes.get(lesson_id, (None, None))
     
     # Tracking info của user
     is_completed = False
-    last_accessed_at = None
     time_spent_seconds = 0
     video_progress_seconds = 0
+    completion_date = None
     quiz_passed = False
     is_next_locked = False
+    enrollment_id = None
     
     if user_id:
-        # Lấy enrollment và progress
-        from services.enrollment_service import get_user_enrollment
-        enrollment = await get_user_enrollment(user_id, course_id)
+        user_status = await _get_lesson_user_status(user_id, course_id, lesson_id, quiz_id)
         
-        if enrollment:
-            is_completed = str(lesson_id) in [str(lid) for lid in enrollment.completed_lessons]
-            last_accessed_at = enrollment.last_accessed_at
-            
-            # Lấy progress detail
-            progress = await Progress.find_one(
-                Progress.user_id == user_id,
-                Progress.course_id == course_id
-            )
-            
-            if progress:
-                # Tìm lesson progress
-                for lp in progress.lessons_progress:
-                    if str(lp.get("lesson_id")) == str(lesson_id):
-                        time_spent_seconds = lp.get("time_spent_seconds", 0)
-                        video_progress_seconds = lp.get("video_progress_seconds", 0)
-                        break
+        if user_status:
+            enrollment_id = user_status["_id"]
+            is_completed = user_status["is_completed"]
+            quiz_passed = user_status["quiz_passed"]
             
-            # Check quiz status
-            quiz = await Quiz.find_one(Quiz.lesson_id == str(lesson_id))
-            if quiz:
-                from services.quiz_service import get_user_quiz_attempts
-                attempts = await get_user_quiz_attempts(user_id, str(quiz.id))
-                if attempts:
-                    # Check if passed any attempt
-                    quiz_passed = any(attempt.passed for attempt in attempts)
+            lesson_progress = user_status.get("lesson_progress")
+            if lesson_progress:
+                time_spent_seconds = (lesson_progress.get("time_spent_minutes") or 0) * 60
+                video_progress_seconds = lesson_progress.get("video_progress_seconds") or 0
+                if is_completed:
+                    completion_date = lesson_progress.get("completion_date")
             
-            # Check if next lesson is locked
+            # Next lesson locked if current not completed
             if next_lesson_id:
-                next_completed = str(next_lesson_id) in [str(lid) for lid in enrollment.completed_lessons]
-                # Next lesson locked if current not completed
                 is_next_locked = not is_completed
     
     # Parse attachments từ resources
@@ -293,13 +464,13 @@ async def get_lesson_content(
             "quality": ["360p", "720p", "1080p"]
         }
     
-    # Lấy quiz info chi tiết
-    quiz = await Quiz.find_one(Quiz.lesson_id == str(lesson_id))
-    has_quiz = quiz is not None
+    # Quiz info từ outline
+    has_quiz = quiz_id is not None
     quiz_info = {
-        "quiz_id": str(quiz.id) if quiz else None,
-        "question_count": len(quiz.questions) if quiz else None,
-        "is_mandatory": True if quiz else None  # Default mandatory
+        "quiz_id": quiz_id,
+        "question_count": question_count,
+        "is_mandatory": True if has_quiz else None,  # Default mandatory
+        "is_passed": bool(quiz_passed) if has_quiz else None
     }
     
     # Tính video_progress_percent nếu có video
@@ -308,60 +479,18 @@ async def get_lesson_content(
         video_progress_percent = (video_progress_seconds / video_info["duration_seconds"] * 100)
     
     # Build navigation object theo API_SCHEMA.md
-    # Get previous lesson title
-    previous_lesson_title = None
-    if previous_lesson_id and module:
-        if hasattr(module, 'lessons'):
-            prev_lesson = next((l for l in module.lessons if str(l.id) == previous_lesson_id), None)
-            if prev_lesson:
-                previous_lesson_title = prev_lesson.title
-        else:
-            from models.models import Lesson as LessonModel
-            prev_lesson_doc = await LessonModel.get(previous_lesson_id)
-            if prev_lesson_doc:
-                previous_lesson_title = prev_lesson_doc.title
-    
-    # Get next lesson title
-    next_lesson_title = None
-    if next_lesson_id and module:
-        if hasattr(module, 'lessons'):
-            nxt_lesson = next((l for l in module.lessons if str(l.id) == next_lesson_id), None)
-            if nxt_lesson:
-                next_lesson_title = nxt_lesson.title
-        else:
-            from models.models import Lesson as LessonModel
-            nxt_lesson_doc = await LessonModel.get(next_lesson_id)
-            if nxt_lesson_doc:
-                next_lesson_title = nxt_lesson_doc.title
-    
     navigation = {
         "previous_lesson": {
             "id": previous_lesson_id,
-            "title": previous_lesson_title
+            "title": outline.title_of(previous_lesson_id)
         },
         "next_lesson": {
             "id": next_lesson_id,
-            "title": next_lesson_title,
+            "title": outline.title_of(next_lesson_id),
             "is_locked": is_next_locked
         }
     }
     
-    # Build completion_status object
-    completion_date = None
-    # Get completion_date from Progress.lessons_progress
-    if user_id and is_completed:
-        progress = await Progress.find_one(
-            Progress.user_id == user_id,
-            Progress.course_id == course_id
-        )
-        if progress and progress.lessons_progress:
-            lesson_progress = next(
-                (lp for lp in progress.lessons_progress if str(lp.lesson_id) == str(lesson_id)),
-                None
-            )
-            if lesson_progress:
-                completion_date = lesson_progress.completion_date
-    
     completion_status = {
         "is_completed": is_completed,
         "completion_date": completion_date,
@@ -391,8 +520,8 @@ async def get_lesson_content(
         "id": str(lesson.id),
         "course_id": course_id,
         "title": getattr(lesson, 'title', ''),
-        "module_id": str(module.id) if module else None,
-        "module_title": getattr(module, 'title', '') if module else None,
+        "module_id": entry.module_id,
+        "module_title": entry.module_title,
         "order": getattr(lesson, 'order', 0),
         "duration_minutes": getattr(lesson, 'duration_minutes', 0),
         "content_type": getattr(lesson, 'content_type', 'text'),
@@ -409,13 +538,11 @@ async def get_lesson_content(
         "updated_at": getattr(lesson, 'updated_at', datetime.utcnow())
     }
     
-    # Update last_accessed_at
-    if user_id:
-        from services.enrollment_service import get_user_enrollment
-        enrollment = await get_user_enrollment(user_id, course_id)
-        if enrollment:
-            enrollment.last_accessed_at = datetime.utcnow()
-            await enrollment.save()
+    # Update last_accessed_at ($set atomic, không rewrite enrollment)
+    if enrollment_id:
+        await Enrollment.find_one(Enrollment.id == enrollment_id).update(
+            {"$set": {"last_accessed_at": datetime.utcnow()}}
+        )
     
     return result
 
@@ -434,7 +561,7 @@ async def get_course_modules_list(
     Returns:
         Dict chứa modules list
     """
-    course = await Course.get(course_id)
+    course = await get_document(Course, course_id)
     if not course:
         return None
     
@@ -540,7 +667,7 @@ async def get_module_outcomes(
     
     logger = logging.getLogger(__name__)
     
-    course = await Course.get(course_id)
+    course = await get_document(Course, course_id)
     if not course:
         return None
     
@@ -643,7 +770,7 @@ async def get_module_resources(
     Returns:
         Dict chứa resources
     """
-    course = await Course.get(course_id)
+    course = await get_document(Course, course_id)
     if not course:
         return None
     
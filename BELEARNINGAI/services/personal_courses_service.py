@@ -9,6 +9,7 @@ from datetime import datetime
 
 from models.models import Course, EmbeddedModule, EmbeddedLesson, generate_uuid
 from services.ai_service import generate_course_from_prompt
+from services.search_service import invalidate_all_course_scopes, bump_search_generation
 
 
 # ============================================================================
@@ -106,6 +107,7 @@ async def create_course_from_ai_prompt(
     
     # Lưu vào DB
     await course.insert()
+    bump_search_generation()
     
     # Return response data matching schema
     return {
@@ -197,6 +199,7 @@ async def create_personal_course_manual(
     
     # Lưu vào DB
     await course.insert()
+    bump_search_generation()
     
     return {
         "course_id": course.id,
@@ -398,6 +401,9 @@ async def update_personal_course(
     
     # Save
     await course.save()
+    bump_search_generation()
+    if update_data.get("status"):
+        invalidate_all_course_scopes()
     
     # Return response
     modules_count = len(course.modules) if course.modules else 0
@@ -451,6 +457,7 @@ async def delete_personal_course(
     
     # Xóa course
     await course.delete()
+    bump_search_generation()
     
     return {
         "course_id": course_id,
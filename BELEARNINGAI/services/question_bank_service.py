@@ -0,0 +1,324 @@
+"""
+Question Bank Service - Ngân hàng câu hỏi cho bài kiểm tra module
+Tuân thủ: CHUCNANG.md Section 4.6 (module assessment)
+
+- Câu hỏi Gemini sinh ra được lưu một lần vào question_bank, gắn tag
+  module/outcome/skill/độ khó (trùng nội dung thì bỏ qua)
+- Bài kiểm tra module được lắp bằng seeded sampling trên danh sách id
+  (projection nhẹ), chỉ load đúng các câu được chọn
+- Ngân hàng còn ít câu -> sinh thêm nền (không chặn request)
+"""
+
+import asyncio
+import hashlib
+import logging
+import random
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from beanie.operators import In
+from pydantic import BaseModel, Field
+from pymongo import UpdateOne
+
+from config.config import get_settings
+from models.models import BankQuestion
+from services.ai_service import generate_module_quiz
+from utils.answer_key import normalize_answer
+
+logger = logging.getLogger(__name__)
+
+# Số câu sinh thêm mỗi lần refill nền (giới hạn của generate_module_quiz: 5-30)
+BANK_REFILL_BATCH_SIZE = 20
+
+# (module_id, difficulty) đang được refill - mỗi cặp chỉ một task nền
+_refills_in_flight: Set[Tuple[str, str]] = set()
+_background_tasks: Set[asyncio.Task] = set()
+
+
+# ============================================================================
+# SAMPLING
+# ============================================================================
+
+def seeded_sample(items: Sequence, count: int, seed: Any = None) -> List:
+    """
+    Chọn ngẫu nhiên count phần tử (không lặp) theo seed
+
+    Cùng seed -> cùng kết quả. Trả về reference tới phần tử gốc, không copy.
+    """
+    return random.Random(seed).sample(items, min(count, len(items)))
+
+
+def question_content_hash(question_text: str, correct_answer: Any) -> str:
+    """Hash nội dung câu hỏi đã chuẩn hóa (dedupe trong một module)."""
+    content = f"{normalize_answer(question_text)}\n{normalize_answer(correct_answer)}"
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class _BankQuestionRef(BaseModel):
+    """Projection chỉ lấy id và tag để chọn câu hỏi"""
+    id: str = Field(alias="_id")
+    outcome_id: Optional[str] = None
+    skill_tag: Optional[str] = None
+
+    class Settings:
+        projection = {"_id": 1, "outcome_id": 1, "skill_tag": 1}
+
+
+def _to_quiz_question(question: BankQuestion, order: int) -> Dict:
+    """BankQuestion -> dict câu hỏi theo cấu trúc Quiz.questions."""
+    return {
+        "question_id": question.id,
+        "question_text": question.question_text,
+        "type": question.type,
+        "options": list(question.options),
+        "correct_answer": question.correct_answer,
+        "explanation": question.explanation,
+        "points": question.points,
+        "is_mandatory": question.is_mandatory,
+        "order": order,
+        "outcome_id": question.outcome_id
+    }
+
+
+# ============================================================================
+# BANK STORAGE
+# ============================================================================
+
+async def add_questions(
+    course_id: str,
+    module_id: str,
+    difficulty: str,
+    questions: List[Dict],
+    skill_tags: Optional[Dict[str, str]] = None
+) -> int:
+    """
+    Lưu câu hỏi vào ngân hàng của module (bỏ qua câu trùng nội dung)
+
+    Args:
+        course_id: ID khóa học
+        module_id: ID module
+        difficulty: easy|medium|hard
+        questions: Câu hỏi theo cấu trúc Quiz.questions
+        skill_tags: outcome_id -> skill_tag (optional)
+
+    Returns:
+        Số câu hỏi mới được thêm
+    """
+    skill_tags = skill_tags or {}
+    operations = []
+
+    for q in questions:
+        question_text = q.get("question_text") or q.get("question")
+        correct_answer = q.get("correct_answer")
+        if not question_text or not correct_answer:
+            continue
+
+        content_hash = question_content_hash(question_text, correct_answer)
+        outcome_id = q.get("outcome_id")
+        bank_question = BankQuestion(
+            course_id=course_id,
+            module_id=module_id,
+            outcome_id=outcome_id,
+            skill_tag=skill_tags.get(outcome_id) if outcome_id else None,
+            difficulty=difficulty,
+            type=q.get("type", "multiple_choice"),
+            question_text=question_text,
+            options=q.get("options") or [],
+            correct_answer=str(correct_answer),
+            explanation=q.get("explanation"),
+            points=max(1, int(q.get("points") or 10)),
+            is_mandatory=bool(q.get("is_mandatory", False)),
+            content_hash=content_hash
+        )
+        operations.append(UpdateOne(
+            {"module_id": module_id, "content_hash": content_hash},
+            {"$setOnInsert": bank_question.model_dump(by_alias=True, exclude={"revision_id"})},
+            upsert=True
+        ))
+
+    if not operations:
+        return 0
+
+    result = await BankQuestion.get_motor_collection().bulk_write(operations, ordered=False)
+    return result.upserted_count
+
+
+async def count_bank_questions(module_id: str, difficulty: str) -> int:
+    """Số câu trong ngân hàng của (module, độ khó)."""
+    return await BankQuestion.find(
+        BankQuestion.module_id == module_id,
+        BankQuestion.difficulty == difficulty
+    ).count()
+
+
+async def assemble_module_questions(
+    module_id: str,
+    count: int,
+    difficulty: str,
+    focus_outcomes: Optional[List[str]] = None,
+    seed: Any = None
+) -> Tuple[Optional[List[Dict]], int]:
+    """
+    Lắp bộ câu hỏi từ ngân hàng của module
+
+    Ưu tiên câu thuộc focus_outcomes (outcome_id hoặc skill_tag) nếu đủ số lượng.
+
+    Returns:
+        (câu hỏi theo cấu trúc Quiz.questions hoặc None nếu ngân hàng chưa đủ,
+         số câu trong ngân hàng của (module, độ khó))
+    """
+    refs = await BankQuestion.find(
+        BankQuestion.module_id == module_id,
+        BankQuestion.difficulty == difficulty
+    ).project(_BankQuestionRef).to_list()
+    bank_size = len(refs)
+
+    if focus_outcomes:
+        focus = set(focus_outcomes)
+        focused = [ref for ref in refs if ref.outcome_id in focus or ref.skill_tag in focus]
+        if len(focused) >= count:
+            refs = focused
+
+    if len(refs) < count:
+        return None, bank_size
+
+    chosen_ids = [ref.id for ref in seeded_sample(refs, count, seed)]
+    by_id = {
+        question.id: question
+        for question in await BankQuestion.find(In(BankQuestion.id, chosen_ids)).to_list()
+    }
+    questions = [
+        _to_quiz_question(by_id[question_id], order)
+        for order, question_id in enumerate(
+            (question_id for question_id in chosen_ids if question_id in by_id), start=1
+        )
+    ]
+    return questions, bank_size
+
+
+# ============================================================================
+# MODULE QUIZ
+# ============================================================================
+
+def _summarize_questions(questions: List[Dict]) -> Dict:
+    """Cùng cấu trúc kết quả với ai_service.generate_module_quiz."""
+    return {
+        "questions": questions,
+        "total_points": sum(q.get("points", 0) for q in questions),
+        "mandatory_count": sum(1 for q in questions if q.get("is_mandatory")),
+        "estimated_time_minutes": len(questions) * 2
+    }
+
+
+def _generate_module_quiz_blocking(kwargs: Dict) -> Dict:
+    # Gemini SDK gọi đồng bộ -> chạy trong thread riêng để không chặn event loop
+    return asyncio.run(generate_module_quiz(**kwargs))
+
+
+async def get_module_quiz(
+    course_id: str,
+    module_id: str,
+    module_title: str,
+    learning_outcomes: List[Dict],
+    module_description: Optional[str] = None,
+    question_count: int = 10,
+    difficulty: str = "medium",
+    focus_outcomes: Optional[List[str]] = None,
+    seed: Any = None
+) -> Dict:
+    """
+    Câu hỏi cho bài kiểm tra module: lấy từ ngân hàng, thiếu thì gọi AI
+
+    Câu hỏi AI sinh ra (không phải fallback) được lưu vào ngân hàng cho các
+    lần sau; ngân hàng dưới target thì sinh thêm nền.
+
+    Returns:
+        Dict giống ai_service.generate_module_quiz (questions, total_points, ...)
+    """
+    questions, bank_size = await assemble_module_questions(
+        module_id, question_count, difficulty, focus_outcomes, seed
+    )
+
+    generation_kwargs = {
+        "module_title": module_title,
+        "learning_outcomes": learning_outcomes,
+        "module_description": module_description,
+        "difficulty": difficulty
+    }
+    skill_tags = {str(o.get("id")): o.get("skill_tag") for o in learning_outcomes if o.get("id")}
+
+    if questions is not None:
+        quiz_data = _summarize_questions(questions)
+    else:
+        quiz_data = await asyncio.to_thread(
+            _generate_module_quiz_blocking,
+            {**generation_kwargs, "question_count": question_count, "focus_outcomes": focus_outcomes}
+        )
+        if not quiz_data.get("is_fallback"):
+            bank_size += await add_questions(
+                course_id, module_id, difficulty, quiz_data["questions"], skill_tags
+            )
+
+    schedule_bank_refill(course_id, module_id, difficulty, bank_size, generation_kwargs, skill_tags)
+    return quiz_data
+
+
+# ============================================================================
+# BACKGROUND REFILL
+# ============================================================================
+
+def schedule_bank_refill(
+    course_id: str,
+    module_id: str,
+    difficulty: str,
+    bank_size: int,
+    generation_kwargs: Dict,
+    skill_tags: Optional[Dict[str, str]] = None
+) -> bool:
+    """
+    Sinh thêm câu hỏi nền nếu ngân hàng (module, độ khó) dưới target
+
+    Returns:
+        True nếu đã lên lịch một task refill
+    """
+    settings = get_settings()
+    if settings.testing or not settings.question_bank_prefetch_enabled:
+        return False
+    if bank_size >= settings.question_bank_target_size:
+        return False
+
+    key = (module_id, difficulty)
+    if key in _refills_in_flight:
+        return False
+
+    _refills_in_flight.add(key)
+    _spawn_background(_refill_bank(course_id, module_id, difficulty, generation_kwargs, skill_tags))
+    return True
+
+
+def _spawn_background(coro) -> None:
+    """Chạy coroutine nền, giữ reference cho tới khi hoàn tất"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _refill_bank(
+    course_id: str,
+    module_id: str,
+    difficulty: str,
+    generation_kwargs: Dict,
+    skill_tags: Optional[Dict[str, str]]
+) -> None:
+    try:
+        quiz_data = await asyncio.to_thread(
+            _generate_module_quiz_blocking,
+            {**generation_kwargs, "question_count": BANK_REFILL_BATCH_SIZE}
+        )
+        if quiz_data.get("is_fallback"):
+            return
+        added = await add_questions(course_id, module_id, difficulty, quiz_data["questions"], skill_tags)
+        logger.info(f"[QUESTION_BANK] Refilled module {module_id} ({difficulty}): +{added} questions")
+    except Exception as e:
+        logger.warning(f"[QUESTION_BANK] Refill failed for module {module_id} ({difficulty}): {e}")
+    finally:
+        _refills_in_flight.discard((module_id, difficulty))
@@ -0,0 +1,233 @@
+"""
+Quiz Analytics Service - Thống kê kết quả quiz dạng vector (NumPy)
+Tuân thủ: CHUCNANG.md Section 3.3.5 (kết quả quiz của lớp)
+
+Attempts được nạp một lần thành các cột NumPy (điểm, thời gian, đậu/rớt,
+ma trận đúng/sai theo câu hỏi); histogram, percentile, độ khó/độ phân biệt
+câu hỏi đều tính bằng phép toán trên mảng thay vì vòng lặp Python.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from utils.answer_key import CompiledAnswerKey, answer_value
+
+
+# Bucket điểm 0-9, 10-19, ..., 90-100 (bucket cuối gồm cả 100)
+SCORE_BIN_EDGES = np.arange(0, 101, 10)
+
+# Tỉ lệ nhóm điểm cao/thấp khi tính discrimination index (Kelley 27%)
+DISCRIMINATION_GROUP_RATIO = 0.27
+
+
+# ============================================================================
+# PROJECTIONS
+# ============================================================================
+
+class AttemptScoreProjection(BaseModel):
+    """Projection các field số của attempt (không load answers)"""
+    user_id: str
+    score: float = 0.0
+    passed: bool = False
+    time_spent_seconds: int = 0
+    submitted_at: Optional[datetime] = None
+
+    class Settings:
+        projection = {
+            "user_id": 1,
+            "score": 1,
+            "passed": 1,
+            "time_spent_seconds": 1,
+            "submitted_at": 1
+        }
+
+
+class AttemptAnalyticsProjection(BaseModel):
+    """Projection attempt kèm answers để phân tích theo câu hỏi"""
+    user_id: str
+    score: float = 0.0
+    passed: bool = False
+    time_spent_seconds: int = 0
+    submitted_at: Optional[datetime] = None
+    answers: List[dict] = Field(default_factory=list)
+
+    class Settings:
+        projection = {
+            "user_id": 1,
+            "score": 1,
+            "passed": 1,
+            "time_spent_seconds": 1,
+            "submitted_at": 1,
+            "answers": 1
+        }
+
+
+# ============================================================================
+# COLUMNAR ATTEMPTS
+# ============================================================================
+
+class AttemptColumns:
+    """
+    Attempts của một quiz dạng cột
+
+    Attributes:
+        user_ids, scores, passed, time_spent_seconds: Mảng NumPy cùng độ dài
+        submitted_at: List datetime (chỉ dùng khi trả kết quả)
+        correct: Ma trận bool (attempts x câu hỏi), None nếu không có answer key
+    """
+
+    __slots__ = ("user_ids", "scores", "passed", "time_spent_seconds", "submitted_at", "correct")
+
+    def __init__(self, attempts: Sequence, answer_key: Optional[CompiledAnswerKey] = None):
+        count = len(attempts)
+        self.user_ids = np.array([attempt.user_id for attempt in attempts], dtype=str)
+        self.scores = np.fromiter((attempt.score for attempt in attempts), dtype=np.float64, count=count)
+        self.passed = np.fromiter((attempt.passed for attempt in attempts), dtype=bool, count=count)
+        self.time_spent_seconds = np.fromiter(
+            (attempt.time_spent_seconds for attempt in attempts), dtype=np.int64, count=count
+        )
+        self.submitted_at = [attempt.submitted_at for attempt in attempts]
+        self.correct = _correctness_matrix(attempts, answer_key) if answer_key is not None else None
+
+    def __len__(self) -> int:
+        return int(self.scores.size)
+
+
+def _correctness_matrix(attempts: Sequence, answer_key: CompiledAnswerKey) -> np.ndarray:
+    """
+    Ma trận đúng/sai (attempts x câu hỏi)
+
+    Các attempt chủ yếu chọn lại cùng vài đáp án, nên kết quả chấm được
+    memo theo (câu hỏi, đáp án) - mỗi cặp chỉ chuẩn hóa/so khớp một lần.
+    """
+    question_index = {
+        question_id: index
+        for index, question_id in enumerate(answer_key.question_ids)
+        if question_id is not None
+    }
+    verdicts: Dict[Tuple[int, str], bool] = {}
+    rows: List[int] = []
+    columns: List[int] = []
+
+    for row, attempt in enumerate(attempts):
+        for answer in attempt.answers:
+            column = question_index.get(answer.get("question_id"))
+            if column is None:
+                continue
+            value = answer_value(answer)
+            if not value:
+                continue
+
+            verdict_key = (column, str(value))
+            verdict = verdicts.get(verdict_key)
+            if verdict is None:
+                verdict = answer_key.is_correct(column, value)
+                verdicts[verdict_key] = verdict
+            if verdict:
+                rows.append(row)
+                columns.append(column)
+
+    matrix = np.zeros((len(attempts), answer_key.total), dtype=bool)
+    matrix[rows, columns] = True
+    return matrix
+
+
+# ============================================================================
+# STATISTICS
+# ============================================================================
+
+def score_summary(scores: np.ndarray) -> Dict[str, float]:
+    """Trung bình, min/max và các percentile của điểm."""
+    if scores.size == 0:
+        return {
+            "average": 0.0, "median": 0.0, "highest": 0.0, "lowest": 0.0,
+            "p25": 0.0, "p75": 0.0, "p90": 0.0
+        }
+
+    p25, median, p75, p90 = np.percentile(scores, [25, 50, 75, 90])
+    return {
+        "average": float(scores.mean()),
+        "median": float(median),
+        "highest": float(scores.max()),
+        "lowest": float(scores.min()),
+        "p25": float(p25),
+        "p75": float(p75),
+        "p90": float(p90)
+    }
+
+
+def score_histogram(scores: np.ndarray) -> List[Dict]:
+    """Phân bố điểm theo bucket 10 điểm."""
+    counts, _ = np.histogram(np.clip(scores, 0, 100), bins=SCORE_BIN_EDGES)
+    total = scores.size
+    percentages = counts / total * 100 if total else np.zeros(counts.size)
+
+    distribution = []
+    for start, count, percentage in zip(SCORE_BIN_EDGES[:-1], counts, percentages):
+        end = int(start) + 10
+        distribution.append({
+            "range": f"{start}-{end - 1}" if end < 100 else f"{start}-100",
+            "count": int(count),
+            "percentage": round(float(percentage), 2)
+        })
+    return distribution
+
+
+def best_attempts_per_user(columns: AttemptColumns) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Attempt tốt nhất của mỗi user (điểm cao nhất, hòa thì thời gian ít hơn)
+
+    Returns:
+        (chỉ số attempt tốt nhất, số attempt của user tương ứng)
+    """
+    if len(columns) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+
+    _, user_index, attempt_counts = np.unique(
+        columns.user_ids, return_inverse=True, return_counts=True
+    )
+    order = np.lexsort((columns.time_spent_seconds, -columns.scores, user_index))
+    sorted_users = user_index[order]
+    first_of_user = np.ones(order.size, dtype=bool)
+    first_of_user[1:] = sorted_users[1:] != sorted_users[:-1]
+
+    best = order[first_of_user]
+    return best, attempt_counts[user_index[best]]
+
+
+def item_analysis(columns: AttemptColumns) -> Dict[str, np.ndarray]:
+    """
+    Phân tích câu hỏi (classical test theory)
+
+    Returns:
+        difficulty: Tỉ lệ trả lời đúng mỗi câu (0-1, thấp = khó)
+        discrimination: Tỉ lệ đúng nhóm 27% điểm cao trừ nhóm 27% điểm thấp (-1..1)
+    """
+    correct = columns.correct
+    if correct is None or correct.shape[0] == 0:
+        question_count = 0 if correct is None else correct.shape[1]
+        return {
+            "difficulty": np.zeros(question_count),
+            "discrimination": np.zeros(question_count)
+        }
+
+    difficulty = correct.mean(axis=0)
+
+    group_size = max(1, int(round(correct.shape[0] * DISCRIMINATION_GROUP_RATIO)))
+    by_score = np.argsort(columns.scores, kind="stable")
+    lower = correct[by_score[:group_size]].mean(axis=0)
+    upper = correct[by_score[-group_size:]].mean(axis=0)
+
+    return {
+        "difficulty": difficulty,
+        "discrimination": upper - lower
+    }
+
+
+def hardest_questions(difficulty: np.ndarray, limit: int) -> np.ndarray:
+    """Chỉ số các câu có tỉ lệ đúng thấp nhất."""
+    return np.argsort(difficulty, kind="stable")[:limit]
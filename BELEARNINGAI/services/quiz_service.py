@@ -5,10 +5,183 @@ Tuân thủ: CHUCNANG.md Section 2.4.3-2.4.7
 """
 
 from datetime import datetime
-from typing import Optional, List, Dict
-import copy
-import random
-from models.models import Quiz, QuizAttempt, Class, User, Lesson, Course, Enrollment
+from typing import Optional, List, Dict, Tuple
+import hashlib
+import json
+import logging
+import re
+from beanie.operators import In
+from pydantic import BaseModel, Field
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from models.models import (
+    Quiz, QuizAttempt, QuizAttemptSummary, Class, Lesson, Course, Enrollment, generate_uuid
+)
+from services import leaderboard_service
+from services.learning_service import invalidate_course_outline
+from services.question_bank_service import seeded_sample
+from services.quiz_analytics_service import (
+    AttemptAnalyticsProjection,
+    AttemptColumns,
+    AttemptScoreProjection,
+    best_attempts_per_user,
+    hardest_questions,
+    item_analysis,
+    score_histogram,
+    score_summary
+)
+from utils.answer_key import CompiledAnswerKey, answers_by_question, summarize_grade
+from utils.cache import TTLCache
+from utils.request_context import forget_document, get_document
+from utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# COMPILED ANSWER KEY
+# ============================================================================
+
+# (quiz_id, updated_at) -> CompiledAnswerKey; sửa quiz đổi updated_at nên key cũ tự hết dùng
+_answer_key_cache = TTLCache(maxsize=2048, ttl=3600)
+
+
+def get_answer_key(quiz: Quiz) -> CompiledAnswerKey:
+    """Answer key của phiên bản quiz hiện tại (biên dịch khi chưa có trong cache)."""
+    cache_key = (str(quiz.id), quiz.updated_at)
+    key = _answer_key_cache.get(cache_key)
+    if key is None:
+        key = CompiledAnswerKey(quiz.questions)
+        _answer_key_cache.set(cache_key, key)
+    return key
+
+
+class _EnrollmentUserProjection(BaseModel):
+    """Projection chỉ lấy user_id của enrollment"""
+    user_id: str
+
+    class Settings:
+        projection = {"user_id": 1}
+
+
+def prime_answer_key(quiz: Quiz) -> None:
+    """Biên dịch answer key ngay khi quiz được lưu, request chấm bài đầu tiên không phải chờ."""
+    get_answer_key(quiz)
+
+
+# ============================================================================
+# STUDENT QUIZ PAYLOAD
+# ============================================================================
+
+# (quiz_id, updated_at) -> StudentQuizPayload; cả lớp mở cùng quiz chỉ build một lần
+_student_payload_cache = TTLCache(maxsize=1024, ttl=3600)
+
+# Đầu giờ thi cả lớp cùng mở quiz: các lần đọc version/build payload đồng thời dùng chung
+_quiz_version_flight = SingleFlight()
+_student_payload_flight = SingleFlight()
+
+
+class QuizVersionProjection(BaseModel):
+    """Projection đủ để kiểm tra quyền và tính ETag (không load questions)"""
+    id: str = Field(alias="_id")
+    course_id: str
+    updated_at: datetime
+
+    class Settings:
+        projection = {"_id": 1, "course_id": 1, "updated_at": 1}
+
+
+class StudentQuizPayload:
+    """
+    Phần chung của chi tiết quiz cho mọi học viên, serialize sẵn thành JSON
+
+    Attributes:
+        updated_at: Phiên bản quiz đã build
+        body: JSON bytes các field chung, bỏ dấu "}" cuối để nối field theo user
+    """
+
+    __slots__ = ("updated_at", "body")
+
+    def __init__(self, updated_at: datetime, body: bytes):
+        self.updated_at = updated_at
+        self.body = body
+
+
+def _student_question_view(question: dict, order: int) -> Dict:
+    """Câu hỏi cho học viên: bỏ correct_answer, explanation."""
+    return {
+        "question_id": str(question.get("question_id") or question.get("id") or ""),
+        "question_text": question.get("question_text") or question.get("question") or "",
+        "type": question.get("type", "multiple_choice"),
+        "options": list(question.get("options") or []),
+        "points": int(question.get("points") or 10),
+        "is_mandatory": bool(question.get("is_mandatory", False)),
+        "order": question.get("order") or order
+    }
+
+
+def build_student_quiz_payload(quiz: Quiz) -> StudentQuizPayload:
+    """Serialize phần chung của QuizDetailResponse (không có field theo user)."""
+    shared = {
+        "id": str(quiz.id),
+        "title": quiz.title,
+        "description": quiz.description,
+        "question_count": len(quiz.questions),
+        "time_limit": quiz.time_limit_minutes,
+        "pass_threshold": int(quiz.passing_score),
+        "mandatory_question_count": get_answer_key(quiz).mandatory_total,
+        "questions": [
+            _student_question_view(question, order)
+            for order, question in enumerate(quiz.questions, start=1)
+        ]
+    }
+    body = json.dumps(shared, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return StudentQuizPayload(quiz.updated_at, body[:-1])
+
+
+async def get_quiz_version(quiz_id: str) -> Optional[QuizVersionProjection]:
+    """course_id + updated_at của quiz (kiểm tra quyền, ETag) không load questions."""
+    return await _quiz_version_flight.do(
+        quiz_id,
+        lambda: Quiz.find_one(Quiz.id == quiz_id).project(QuizVersionProjection)
+    )
+
+
+async def get_student_quiz_payload(quiz_id: str, updated_at: datetime) -> Optional[StudentQuizPayload]:
+    """Payload đã serialize của phiên bản quiz, build khi chưa có trong cache."""
+    payload = _student_payload_cache.get((quiz_id, updated_at))
+    if payload is None:
+        payload = await _student_payload_flight.do(
+            (quiz_id, updated_at), lambda: _build_and_cache_payload(quiz_id)
+        )
+    return payload
+
+
+async def _build_and_cache_payload(quiz_id: str) -> Optional[StudentQuizPayload]:
+    quiz = await get_document(Quiz, quiz_id)
+    if not quiz:
+        return None
+    payload = build_student_quiz_payload(quiz)
+    _student_payload_cache.set((quiz_id, quiz.updated_at), payload)
+    return payload
+
+
+def student_quiz_etag(quiz_id: str, updated_at: datetime, summary: Optional[QuizAttemptSummary]) -> str:
+    """ETag theo phiên bản quiz và summary attempts của user."""
+    version = f"{quiz_id}|{updated_at.isoformat()}|{summary.updated_at.isoformat() if summary else ''}"
+    return f'"{hashlib.sha1(version.encode("utf-8")).hexdigest()[:20]}"'
+
+
+def render_student_quiz(payload: StudentQuizPayload, summary: Optional[QuizAttemptSummary]) -> bytes:
+    """Nối field theo user (lượt làm, điểm cao nhất) vào payload chung."""
+    user_fields = {
+        "user_attempts": summary.attempt_count if summary else 0,
+        "best_score": summary.best_score if summary else None,
+        "last_attempt_at": (
+            summary.last_attempt_at.isoformat() if summary and summary.last_attempt_at else None
+        )
+    }
+    return payload.body + b"," + json.dumps(user_fields, separators=(",", ":")).encode("utf-8")[1:]
 
 
 # ============================================================================
@@ -56,6 +229,8 @@ async def create_quiz(
     )
     
     await quiz.insert()
+    prime_answer_key(quiz)
+    invalidate_course_outline(quiz.course_id)
     return quiz
 
 
@@ -70,7 +245,7 @@ async def get_quiz_by_id(quiz_id: str) -> Optional[Quiz]:
         Quiz document hoặc None
     """
     try:
-        quiz = await Quiz.get(quiz_id)
+        quiz = await get_document(Quiz, quiz_id)
         return quiz
     except Exception:
         return None
@@ -149,6 +324,8 @@ async def update_quiz(
     
     quiz.updated_at = datetime.utcnow()
     await quiz.save()
+    prime_answer_key(quiz)
+    invalidate_course_outline(quiz.course_id)
     return quiz
 
 
@@ -168,6 +345,9 @@ async def delete_quiz(quiz_id: str) -> bool:
         return False
     
     await quiz.delete()
+    forget_document(Quiz, quiz.id)
+    invalidate_course_outline(quiz.course_id)
+    await leaderboard_service.remove_quiz(quiz_id)
     return True
 
 
@@ -178,112 +358,135 @@ async def delete_quiz(quiz_id: str) -> bool:
 async def create_quiz_attempt(
     quiz_id: str,
     user_id: str,
-    answers: Optional[List[Dict]] = None,
-    score: Optional[float] = None,
-    passed: Optional[bool] = None,
+    answers: List[Dict],
+    score: float,
+    passed: bool,
     time_spent_minutes: Optional[int] = None
 ) -> Optional[QuizAttempt]:
     """
-    Tạo và lưu lần thử quiz
+    Nộp bài đã chấm điểm vào attempt đang làm của user
+    
+    Attempt đang làm (live attempt) là attempt đã mở bằng retake, hoặc được mở
+    ngay khi nộp. Bài nộp ghi bằng một update_one có điều kiện "chưa nộp": các
+    request nộp trùng (double-click, client retry) cùng rơi vào một attempt,
+    request đầu ghi kết quả, các request sau nhận lại kết quả đã lưu.
     
     Args:
         quiz_id: ID của quiz
         user_id: ID của user
-        answers: List câu trả lời (optional - nếu đã chấm điểm)
-        score: Điểm số (optional - nếu đã chấm điểm)
-        passed: Kết quả đậu/rớt (optional - nếu đã chấm điểm)
+        answers: List câu trả lời
+        score: Điểm số đã chấm
+        passed: Kết quả đậu/rớt đã chấm
         time_spent_minutes: Thời gian làm bài (phút)
         
     Returns:
-        QuizAttempt document đã tạo hoặc None nếu đã hết lượt thử
+        QuizAttempt đã nộp (của request này hoặc request nộp trùng trước đó),
+        hoặc None nếu quiz không tồn tại / đã hết lượt thử
     """
     quiz = await get_quiz_by_id(quiz_id)
     
     if not quiz:
         return None
     
-    # Kiểm tra số lần đã thử
-    previous_attempts = await get_user_quiz_attempts(user_id, quiz_id)
-    attempt_number = len(previous_attempts) + 1
-    
-    if len(previous_attempts) >= quiz.max_attempts and quiz.max_attempts > 0:
+    live = await open_live_attempt(user_id, quiz_id, quiz.max_attempts)
+    if live is None:
         return None  # Đã hết lượt thử
+    attempt_id, attempt_number = live
     
-    # Tính thông tin chi tiết nếu có answers
-    correct_answers = 0
-    total_questions = len(quiz.questions)
-    mandatory_correct = 0
-    mandatory_total = sum(1 for q in quiz.questions if q.get("is_mandatory", False))
-    
-    if answers and score is not None:
-        # Handle both dict and Pydantic model answers
-        answer_map = {}
-        for ans in answers:
-            if hasattr(ans, 'question_id'):
-                answer_map[ans.question_id] = ans
-            else:
-                answer_map[ans.get("question_id")] = ans
-        
-        for question in quiz.questions:
-            q_id = question.get("question_id") or question.get("id")
-            user_answer_obj = answer_map.get(q_id)
-            
-            # Extract answer from Pydantic model or dict
-            if user_answer_obj:
-                if hasattr(user_answer_obj, 'selected_option'):
-                    user_answer = user_answer_obj.selected_option
-                elif hasattr(user_answer_obj, 'answer'):
-                    user_answer = user_answer_obj.answer
-                else:
-                    user_answer = user_answer_obj.get("answer") or user_answer_obj.get("student_answer")
-            else:
-                user_answer = None
-            
-            correct_answer = question.get("correct_answer")
-            is_mandatory = question.get("is_mandatory", False)
-            
-            if str(user_answer).strip().lower() == str(correct_answer).strip().lower():
-                correct_answers += 1
-                if is_mandatory:
-                    mandatory_correct += 1
-    
-    mandatory_passed = (mandatory_correct == mandatory_total) if mandatory_total > 0 else True
+    # Tính thông tin chi tiết (cùng answer key với grade_quiz_attempt)
+    key = get_answer_key(quiz)
+    grade = summarize_grade(key, key.grade(answers_by_question(answers)))
     
     # Convert AnswerItem objects to dicts if needed
     answers_list = []
-    if answers:
-        for ans in answers:
-            if hasattr(ans, 'model_dump'):
-                answers_list.append(ans.model_dump())
-            elif isinstance(ans, dict):
-                answers_list.append(ans)
-            else:
-                # Handle AnswerItem with direct attributes
-                answers_list.append({
-                    "question_id": getattr(ans, 'question_id', ''),
-                    "selected_option": getattr(ans, 'selected_option', '')
-                })
+    for ans in answers:
+        if hasattr(ans, 'model_dump'):
+            answers_list.append(ans.model_dump())
+        elif isinstance(ans, dict):
+            answers_list.append(ans)
+        else:
+            # Handle AnswerItem with direct attributes
+            answers_list.append({
+                "question_id": getattr(ans, 'question_id', ''),
+                "selected_option": getattr(ans, 'selected_option', '')
+            })
     
     attempt = QuizAttempt(
+        id=attempt_id,
         quiz_id=quiz_id,
         user_id=user_id,
         answers=answers_list,
-        score=score or 0.0,
+        score=score,
         status="Pass" if passed else "Fail",
-        passed=passed or False,
+        passed=passed,
         attempt_number=attempt_number,
-        correct_answers=correct_answers,
-        total_questions=total_questions,
-        mandatory_correct=mandatory_correct,
-        mandatory_total=mandatory_total,
-        mandatory_passed=mandatory_passed,
-        submitted_at=datetime.utcnow() if answers else None,
+        correct_answers=grade["correct_count"],
+        total_questions=grade["total_count"],
+        mandatory_correct=grade["mandatory_correct"],
+        mandatory_total=grade["mandatory_total"],
+        mandatory_passed=grade["mandatory_passed"],
+        submitted_at=datetime.utcnow(),
         time_spent_seconds=(time_spent_minutes * 60) if time_spent_minutes else 0,
         can_retake=attempt_number < quiz.max_attempts
     )
+    changes = attempt.model_dump(include=_SUBMISSION_FIELDS)
+    # Attempt mở ngay khi nộp chưa có document -> upsert với các field còn lại
+    insert_fields = attempt.model_dump(by_alias=True, exclude=_SUBMISSION_FIELDS | {"id", "revision_id"})
     
-    await attempt.insert()
-    return attempt
+    if await _record_submission(quiz, attempt_id, user_id, changes, insert_fields):
+        return attempt
+    
+    # Nộp trùng: trả kết quả đã lưu của attempt
+    return await get_quiz_attempt(attempt_id)
+
+
+# Các field ghi khi nộp bài (phần còn lại của attempt giữ nguyên như lúc mở)
+_SUBMISSION_FIELDS = {
+    "answers", "score", "passed", "status", "correct_answers", "total_questions",
+    "mandatory_correct", "mandatory_total", "mandatory_passed", "can_retake",
+    "submitted_at", "time_spent_seconds"
+}
+
+
+async def _record_submission(
+    quiz: Quiz,
+    attempt_id: str,
+    user_id: str,
+    changes: Dict,
+    insert_fields: Optional[Dict] = None
+) -> bool:
+    """
+    Ghi bài nộp vào attempt bằng update_one có điều kiện submitted_at null
+    (thay vì load-and-save): hai request nộp cùng attempt chỉ một request ghi được
+    
+    Args:
+        insert_fields: Field của attempt chưa có document -> upsert với các field này
+        
+    Returns:
+        True nếu request này ghi được bài nộp, False nếu attempt đã được nộp
+    """
+    update: Dict = {"$set": changes}
+    if insert_fields:
+        update["$setOnInsert"] = insert_fields
+    try:
+        result = await QuizAttempt.get_motor_collection().update_one(
+            {"_id": attempt_id, "submitted_at": None},
+            update,
+            upsert=bool(insert_fields)
+        )
+    except DuplicateKeyError:
+        return False  # Upsert đụng attempt đã nộp
+    if result.matched_count == 0 and result.upserted_id is None:
+        return False
+    
+    await record_attempt_result(
+        user_id, str(quiz.id), changes["score"], changes["passed"], attempt_id
+    )
+    await leaderboard_service.record_submission(
+        str(quiz.id), quiz.course_id, user_id, changes["score"], changes["passed"],
+        changes["time_spent_seconds"], changes["submitted_at"]
+    )
+    return True
 
 
 async def submit_quiz_attempt(
@@ -291,14 +494,17 @@ async def submit_quiz_attempt(
     answers: List[Dict]
 ) -> Optional[QuizAttempt]:
     """
-    Submit câu trả lời quiz và tính điểm
+    Submit câu trả lời quiz cho một attempt đã mở và tính điểm
+    
+    Ghi kết quả qua _record_submission: hai request nộp đồng thời chỉ một
+    request ghi được, request còn lại nhận None.
     
     Args:
         attempt_id: ID của attempt
         answers: List câu trả lời dạng [{"question_id": "q1", "answer": "A"}, ...]
         
     Returns:
-        QuizAttempt document đã đánh giá hoặc None
+        QuizAttempt document đã đánh giá hoặc None (không tồn tại / đã nộp)
     """
     attempt = await get_quiz_attempt(attempt_id)
     
@@ -313,33 +519,33 @@ async def submit_quiz_attempt(
     if not quiz:
         return None
     
-    # Tính điểm
-    correct_count = 0
-    total_count = len(quiz.questions)
-    
-    answer_map = {ans["question_id"]: ans["answer"] for ans in answers}
-    
-    for question in quiz.questions:
-        q_id = question.get("question_id") or question.get("id")
-        user_answer = answer_map.get(q_id)
-        correct_answer = question.get("correct_answer")
-        
-        if user_answer == correct_answer:
-            correct_count += 1
-    
-    score = (correct_count / total_count * 100) if total_count > 0 else 0
+    # Tính điểm (cùng answer key với grade_quiz_attempt)
+    key = get_answer_key(quiz)
+    grade = summarize_grade(key, key.grade(answers_by_question(answers)))
+    total_count = grade["total_count"]
+    score = (grade["correct_count"] / total_count * 100) if total_count > 0 else 0
     passed = score >= quiz.passing_score
     
-    # Lưu kết quả
-    attempt.answers = answers
-    attempt.score = score
-    attempt.passed = passed
-    attempt.submitted_at = datetime.utcnow()
-    attempt.time_spent_seconds = int(
-        (attempt.submitted_at - attempt.started_at).total_seconds()
-    )
+    submitted_at = datetime.utcnow()
+    changes = {
+        "answers": answers,
+        "score": score,
+        "passed": passed,
+        "status": "Pass" if passed else "Fail",
+        "correct_answers": grade["correct_count"],
+        "total_questions": total_count,
+        "mandatory_correct": grade["mandatory_correct"],
+        "mandatory_total": grade["mandatory_total"],
+        "mandatory_passed": grade["mandatory_passed"],
+        "submitted_at": submitted_at,
+        "time_spent_seconds": int((submitted_at - attempt.started_at).total_seconds())
+    }
     
-    await attempt.save()
+    if not await _record_submission(quiz, attempt_id, attempt.user_id, changes):
+        return None  # Request đồng thời khác đã nộp attempt này
+    
+    for field, value in changes.items():
+        setattr(attempt, field, value)
     return attempt
 
 
@@ -390,29 +596,203 @@ async def get_user_quiz_attempts(
     return attempts
 
 
-async def get_best_quiz_score(user_id: str, quiz_id: str) -> Optional[float]:
+# ============================================================================
+# ATTEMPT SUMMARY - một document cho mỗi (user, quiz)
+# ============================================================================
+
+async def get_attempt_summary(user_id: str, quiz_id: str) -> Optional[QuizAttemptSummary]:
     """
-    Lấy điểm cao nhất của user cho quiz
+    Lấy summary attempts của user cho quiz (point lookup trên unique index)
+    
+    Returns:
+        QuizAttemptSummary hoặc None nếu user chưa làm quiz
+    """
+    return await QuizAttemptSummary.find_one(
+        QuizAttemptSummary.user_id == user_id,
+        QuizAttemptSummary.quiz_id == quiz_id
+    )
+
+
+async def get_attempt_count(user_id: str, quiz_id: str) -> int:
+    """Số attempt user đã tạo cho quiz."""
+    summary = await get_attempt_summary(user_id, quiz_id)
+    return summary.attempt_count if summary else 0
+
+
+async def _seed_attempt_summary(user_id: str, quiz_id: str) -> bool:
+    """
+    Tạo summary cho (user, quiz) chưa có, dựng từ các attempt đã tồn tại
+    
+    User làm quiz trước khi có collection summary vẫn giữ đúng số lượt đã dùng,
+    best_score và passed - không phụ thuộc việc đã chạy script backfill.
+    
+    Returns:
+        False nếu summary đã tồn tại từ trước, True nếu vừa được tạo (bởi request này
+        hoặc request đồng thời)
+    """
+    collection = QuizAttemptSummary.get_motor_collection()
+    if await collection.find_one({"user_id": user_id, "quiz_id": quiz_id}, {"_id": 1}):
+        return False
+    
+    rows = await QuizAttempt.aggregate([
+        {"$match": {"user_id": user_id, "quiz_id": quiz_id}},
+        {
+            "$group": {
+                "_id": None,
+                "attempt_count": {"$sum": 1},
+                "best_score": {
+                    "$max": {"$cond": [{"$ne": ["$submitted_at", None]}, "$score", None]}
+                },
+                "passed": {"$max": "$passed"},
+                "last_attempt_at": {"$max": "$started_at"}
+            }
+        }
+    ]).to_list()
+    existing = rows[0] if rows else {}
+    
+    try:
+        await collection.insert_one({
+            "_id": generate_uuid(),
+            "user_id": user_id,
+            "quiz_id": quiz_id,
+            "attempt_count": existing.get("attempt_count", 0),
+            "best_score": existing.get("best_score"),
+            "passed": bool(existing.get("passed")),
+            "last_attempt_at": existing.get("last_attempt_at"),
+            "updated_at": datetime.utcnow()
+        })
+    except DuplicateKeyError:
+        # Request đồng thời đã tạo summary
+        pass
+    return True
+
+
+async def reserve_attempt_number(
+    user_id: str,
+    quiz_id: str,
+    max_attempts: int = 0,
+    live_attempt_id: Optional[str] = None
+) -> Optional[int]:
+    """
+    Cấp attempt_number tiếp theo bằng một lệnh $inc atomic
+    
+    Các request đồng thời luôn nhận số khác nhau; điều kiện
+    attempt_count < max_attempts nằm trong filter nên không thể vượt lượt.
+    Không cấp số khi user còn attempt đang làm chưa nộp - nhờ vậy
+    attempt_count luôn là số của attempt đang làm.
+    Summary chưa có được dựng từ attempts hiện có trước khi cấp số.
     
     Args:
         user_id: ID của user
         quiz_id: ID của quiz
+        max_attempts: Số lần làm tối đa (0 = không giới hạn)
+        live_attempt_id: Ghi nhận attempt này là attempt đang làm
         
     Returns:
-        Điểm cao nhất hoặc None nếu chưa làm
+        attempt_number mới, hoặc None nếu đã hết lượt / còn attempt đang làm
     """
-    attempts = await get_user_quiz_attempts(user_id, quiz_id)
+    now = datetime.utcnow()
+    query: Dict = {"user_id": user_id, "quiz_id": quiz_id, "live_attempt_id": None}
+    if max_attempts > 0:
+        query["attempt_count"] = {"$lt": max_attempts}
+    
+    fields = {"last_attempt_at": now, "updated_at": now}
+    if live_attempt_id:
+        fields["live_attempt_id"] = live_attempt_id
+    update = {"$inc": {"attempt_count": 1}, "$set": fields}
+    collection = QuizAttemptSummary.get_motor_collection()
+    
+    # Đường nhanh: summary đã có -> một lệnh. Không khớp thì hoặc đã hết lượt /
+    # còn attempt đang làm, hoặc chưa có summary -> dựng summary rồi thử lại một lần
+    for _ in range(2):
+        summary = await collection.find_one_and_update(
+            query,
+            update,
+            return_document=ReturnDocument.AFTER
+        )
+        if summary:
+            return summary["attempt_count"]
+        if not await _seed_attempt_summary(user_id, quiz_id):
+            return None
     
-    if not attempts:
-        return None
+    return None
+
+
+async def open_live_attempt(
+    user_id: str,
+    quiz_id: str,
+    max_attempts: int = 0
+) -> Optional[Tuple[str, int]]:
+    """
+    Lấy attempt đang làm của user, mở attempt mới nếu chưa có
     
-    # Lấy attempt có submitted_at (đã submit)
-    submitted = [a for a in attempts if a.submitted_at]
+    Mở attempt là một find_one_and_update trên summary: các request đồng thời
+    (nộp trùng) cùng nhận một attempt thay vì mỗi request một attempt.
+    Attempt đang làm vẫn nộp được khi đã dùng hết lượt (lượt đã tính lúc mở).
     
-    if not submitted:
-        return None
+    Returns:
+        (attempt_id, attempt_number), hoặc None nếu đã hết lượt
+    """
+    attempt_id = generate_uuid()
+    attempt_number = await reserve_attempt_number(
+        user_id, quiz_id, max_attempts, live_attempt_id=attempt_id
+    )
+    if attempt_number is not None:
+        return attempt_id, attempt_number
     
-    return max(a.score for a in submitted)
+    summary = await get_attempt_summary(user_id, quiz_id)
+    if summary and summary.live_attempt_id:
+        return summary.live_attempt_id, summary.attempt_count
+    return None
+
+
+async def record_attempt_result(
+    user_id: str,
+    quiz_id: str,
+    score: float,
+    passed: bool,
+    attempt_id: Optional[str] = None
+) -> None:
+    """
+    Cập nhật best_score/passed khi attempt được nộp ($max atomic)
+    
+    Args:
+        user_id: ID của user
+        quiz_id: ID của quiz
+        score: Điểm attempt vừa nộp
+        passed: Attempt vừa nộp có pass không
+        attempt_id: Attempt vừa nộp - nếu là attempt đang làm thì đóng lại
+            để lần nộp sau mở attempt mới
+    """
+    update: Dict = {
+        "$max": {"best_score": score},
+        "$set": {"updated_at": datetime.utcnow()}
+    }
+    if passed:
+        update["$set"]["passed"] = True
+    
+    collection = QuizAttemptSummary.get_motor_collection()
+    await collection.update_one({"user_id": user_id, "quiz_id": quiz_id}, update)
+    if attempt_id:
+        await collection.update_one(
+            {"user_id": user_id, "quiz_id": quiz_id, "live_attempt_id": attempt_id},
+            {"$set": {"live_attempt_id": None}}
+        )
+
+
+async def get_best_quiz_score(user_id: str, quiz_id: str) -> Optional[float]:
+    """
+    Lấy điểm cao nhất của user cho quiz
+    
+    Args:
+        user_id: ID của user
+        quiz_id: ID của quiz
+        
+    Returns:
+        Điểm cao nhất hoặc None nếu chưa làm
+    """
+    summary = await get_attempt_summary(user_id, quiz_id)
+    return summary.best_score if summary else None
 
 
 async def grade_quiz_attempt(quiz: Quiz, answers: List[Dict]) -> tuple[float, bool]:
@@ -430,99 +810,22 @@ async def grade_quiz_attempt(quiz: Quiz, answers: List[Dict]) -> tuple[float, bo
     Returns:
         tuple (score: float, passed: bool)
     """
-    print(f"\n🔍 DEBUG: Starting grade_quiz_attempt")
-    print(f"📊 Total questions in quiz: {len(quiz.questions)}")
-    print(f"📝 Total answers from user: {len(answers)}")
-    
-    correct_count = 0
-    total_count = len(quiz.questions)
-    mandatory_correct = 0
-    mandatory_total = sum(1 for q in quiz.questions if q.get("is_mandatory", False))
+    key = get_answer_key(quiz)
+    correct_mask = key.grade(answers_by_question(answers))
+    grade = summarize_grade(key, correct_mask)
     
-    # Convert AnswerItem objects to dict for processing
-    answer_map = {}
-    for ans in answers:
-        if hasattr(ans, 'question_id'):
-            # AnswerItem object - access as attributes
-            answer_map[ans.question_id] = ans.selected_option
-            print(f"  📌 User answer: question_id={ans.question_id}, selected_option={ans.selected_option}")
-        else:
-            # Already a dict
-            q_id = ans["question_id"]
-            answer = ans.get("answer") or ans.get("student_answer") or ans.get("selected_option")
-            answer_map[q_id] = answer
-            print(f"  📌 User answer: question_id={q_id}, answer={answer}")
-    
-    print(f"\n🔍 Checking each question:")
-    for idx, question in enumerate(quiz.questions):
-        q_id = question.get("question_id") or question.get("id")
-        user_answer = answer_map.get(q_id)
-        correct_answer = question.get("correct_answer")
-        is_mandatory = question.get("is_mandatory", False)
-        
-        print(f"\n  Question {idx + 1}:")
-        print(f"    question_id: {q_id}")
-        print(f"    user_answer: {user_answer}")
-        print(f"    correct_answer: {correct_answer}")
-        print(f"    is_mandatory: {is_mandatory}")
-        
-        if user_answer is None:
-            print(f"    ❌ No answer found for this question_id!")
-            continue
-        
-        if correct_answer is None:
-            print(f"    ❌ No correct_answer in DB!")
-            continue
-        
-        # Normalize for comparison
-        user_ans_normalized = str(user_answer).strip().lower()
-        correct_ans_normalized = str(correct_answer).strip().lower()
-        
-        print(f"    Comparing: '{user_ans_normalized}' vs '{correct_ans_normalized}'")
-        
-        # FLEXIBLE MATCHING:
-        # 1. Exact match (case-insensitive)
-        # 2. User answer is just option letter (A, B, C, D) and correct answer starts with it
-        # 3. Correct answer contains user answer
-        is_correct = False
-        
-        if user_ans_normalized == correct_ans_normalized:
-            # Exact match
-            is_correct = True
-            print(f"    ✅ CORRECT (exact match)!")
-        elif len(user_answer.strip()) == 1 and correct_ans_normalized.startswith(user_ans_normalized):
-            # User submitted just "A" and correct answer is "a. python -m venv myenv"
-            is_correct = True
-            print(f"    ✅ CORRECT (option letter match)!")
-        elif user_ans_normalized.startswith(correct_ans_normalized):
-            # User submitted "A. python -m venv myenv" and correct answer is "A"
-            is_correct = True
-            print(f"    ✅ CORRECT (user answer starts with correct)!")
-        elif correct_ans_normalized.startswith(user_ans_normalized + "."):
-            # User submitted "A" and correct answer is "A. ..."
-            is_correct = True
-            print(f"    ✅ CORRECT (correct answer starts with user + dot)!")
-        else:
-            print(f"    ❌ WRONG!")
-        
-        if is_correct:
-            correct_count += 1
-            if is_mandatory:
-                mandatory_correct += 1
-    
-    score = (correct_count / total_count * 100) if total_count > 0 else 0
+    total_count = grade["total_count"]
+    score = (grade["correct_count"] / total_count * 100) if total_count > 0 else 0
     
     # Pass condition: score >= passing_score AND all mandatory questions correct
-    mandatory_pass = (mandatory_correct == mandatory_total) if mandatory_total > 0 else True
-    passed = (score >= quiz.passing_score) and mandatory_pass
+    passed = (score >= quiz.passing_score) and grade["mandatory_passed"]
     
-    print(f"\n📊 GRADING RESULT:")
-    print(f"  Correct: {correct_count}/{total_count}")
-    print(f"  Score: {score}%")
-    print(f"  Passing score: {quiz.passing_score}%")
-    print(f"  Mandatory: {mandatory_correct}/{mandatory_total}")
-    print(f"  Mandatory pass: {mandatory_pass}")
-    print(f"  Final result: {'PASS' if passed else 'FAIL'}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Graded quiz %s: correct=%d/%d score=%.1f mandatory=%d/%d passed=%s",
+            quiz.id, grade["correct_count"], total_count, score,
+            grade["mandatory_correct"], grade["mandatory_total"], passed
+        )
     
     return score, passed
 
@@ -535,14 +838,15 @@ async def build_quiz_results(quiz: Quiz, attempt: QuizAttempt) -> Dict:
         Dict với structure QuizResultsResponse
     """
     answer_map = {ans.get("question_id"): ans for ans in attempt.answers}
+    key = get_answer_key(quiz)
     
     question_results = []
     correct_count = 0
     mandatory_correct = 0
     mandatory_total = 0
     
-    for question in quiz.questions:
-        q_id = question.get("question_id") or question.get("id")
+    for index, question in enumerate(quiz.questions):
+        q_id = key.question_ids[index]
         user_answer_obj = answer_map.get(q_id, {})
         
         # Get user answer from multiple possible fields
@@ -556,20 +860,8 @@ async def build_quiz_results(quiz: Quiz, attempt: QuizAttempt) -> Dict:
         correct_answer = question.get("correct_answer", "")
         is_mandatory = question.get("is_mandatory", False)
         
-        # Use flexible matching logic (same as grade_quiz_attempt)
-        is_correct = False
-        if user_answer and correct_answer:
-            user_ans_normalized = str(user_answer).strip().lower()
-            correct_ans_normalized = str(correct_answer).strip().lower()
-            
-            if user_ans_normalized == correct_ans_normalized:
-                is_correct = True
-            elif len(str(user_answer).strip()) == 1 and correct_ans_normalized.startswith(user_ans_normalized):
-                is_correct = True
-            elif user_ans_normalized.startswith(correct_ans_normalized):
-                is_correct = True
-            elif correct_ans_normalized.startswith(user_ans_normalized + "."):
-                is_correct = True
+        # Cùng quy tắc khớp với grade_quiz_attempt (answer key biên dịch sẵn)
+        is_correct = key.is_correct(index, user_answer)
         
         if is_correct:
             correct_count += 1
@@ -607,49 +899,26 @@ async def build_quiz_results(quiz: Quiz, attempt: QuizAttempt) -> Dict:
         "mandatory_passed": (mandatory_correct == mandatory_total) if mandatory_total > 0 else True,
         "time_spent_seconds": attempt.time_spent_seconds,
         "submitted_at": attempt.submitted_at,
-        "can_retake": len(await get_user_quiz_attempts(attempt.user_id, quiz.id)) < quiz.max_attempts,
+        "can_retake": await get_attempt_count(attempt.user_id, str(quiz.id)) < quiz.max_attempts,
         "question_results": question_results
     }
 
 
-async def generate_retake_quiz(original_quiz: Quiz) -> Quiz:
+def build_retake_questions(quiz: Quiz, seed: str) -> List[Dict]:
     """
-    Generate quiz mới với câu hỏi tương tự (dùng AI)
+    Bộ câu hỏi cho lần làm lại: thứ tự xáo trộn theo seed (attempt id)
+    
+    Không copy/insert quiz mới: câu hỏi giữ nguyên question_id nên bài làm
+    lại được chấm bằng answer key của quiz gốc; cùng seed -> cùng thứ tự.
     
     Args:
-        original_quiz: Quiz gốc
+        quiz: Quiz gốc
+        seed: Seed xáo trộn (thường là id của attempt mới)
         
     Returns:
-        Quiz mới đã tạo
+        List câu hỏi (reference tới quiz.questions, không được sửa)
     """
-    # TODO: Integrate with AI service to generate similar questions
-    # For now, duplicate quiz with shuffled questions
-    
-    new_questions = copy.deepcopy(original_quiz.questions)
-    random.shuffle(new_questions)
-    
-    # Update question IDs
-    for i, q in enumerate(new_questions):
-        q["question_id"] = f"q{i+1}"
-        q["id"] = f"q{i+1}"
-        q["order"] = i + 1
-    
-    new_quiz = Quiz(
-        lesson_id=original_quiz.lesson_id,
-        course_id=original_quiz.course_id,
-        created_by=original_quiz.created_by,
-        title=f"{original_quiz.title} (Retake)",
-        description=f"Retake version of: {original_quiz.description}",
-        questions=new_questions,
-        time_limit_minutes=original_quiz.time_limit_minutes,
-        passing_score=original_quiz.passing_score,
-        max_attempts=original_quiz.max_attempts,
-        question_count=len(new_questions),
-        total_points=sum(q.get("points", 1) for q in new_questions)
-    )
-    
-    await new_quiz.insert()
-    return new_quiz
+    return seeded_sample(quiz.questions, len(quiz.questions), seed)
 
 
 # ============================================================================
@@ -669,7 +938,7 @@ async def get_quiz_stats(quiz_id: str) -> Dict:
     attempts = await QuizAttempt.find(
         QuizAttempt.quiz_id == quiz_id,
         QuizAttempt.submitted_at != None
-    ).to_list()
+    ).project(AttemptScoreProjection).to_list()
     
     if not attempts:
         return {
@@ -679,17 +948,13 @@ async def get_quiz_stats(quiz_id: str) -> Dict:
             "avg_time_seconds": 0
         }
     
-    total = len(attempts)
-    avg_score = sum(a.score for a in attempts) / total
-    passed = sum(1 for a in attempts if a.passed)
-    pass_rate = (passed / total * 100)
-    avg_time = sum(a.time_spent_seconds for a in attempts) / total
+    columns = AttemptColumns(attempts)
     
     return {
-        "total_attempts": total,
-        "average_score": avg_score,
-        "pass_rate": pass_rate,
-        "avg_time_seconds": int(avg_time)
+        "total_attempts": len(columns),
+        "average_score": float(columns.scores.mean()),
+        "pass_rate": float(columns.passed.mean() * 100),
+        "avg_time_seconds": int(columns.time_spent_seconds.mean())
     }
 
 
@@ -697,6 +962,151 @@ async def get_quiz_stats(quiz_id: str) -> Dict:
 # INSTRUCTOR FEATURES (Section 3.3)
 # ============================================================================
 
+# Sort theo field của quiz: sort + phân trang trước, chỉ tính stats cho trang hiện tại
+QUIZ_LIST_DOCUMENT_SORTS = {
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+    "title": "title",
+    "question_count": "questions_count"
+}
+
+# Sort theo stats của attempts: phải tính stats cho mọi quiz khớp filter trước khi sort
+QUIZ_LIST_STATS_SORTS = {
+    "pass_rate": "pass_rate",
+    "average_score": "average_score",
+    "completed_count": "completed_count",
+    "total_students": "total_students"
+}
+
+
+def _quiz_attempt_stats_stages() -> List[Dict]:
+    """$lookup + $group tính stats attempts đã nộp của từng quiz."""
+    return [
+        {
+            "$lookup": {
+                "from": QuizAttempt.get_collection_name(),
+                "localField": "_id",
+                "foreignField": "quiz_id",
+                "pipeline": [
+                    {"$match": {"submitted_at": {"$ne": None}}},
+                    {
+                        "$group": {
+                            "_id": None,
+                            "students": {"$addToSet": "$user_id"},
+                            "completed_count": {"$sum": 1},
+                            "pass_count": {"$sum": {"$cond": ["$passed", 1, 0]}},
+                            "average_score": {"$avg": "$score"}
+                        }
+                    }
+                ],
+                "as": "attempt_stats"
+            }
+        },
+        {"$unwind": {"path": "$attempt_stats", "preserveNullAndEmptyArrays": True}},
+        {
+            "$addFields": {
+                "total_students": {"$size": {"$ifNull": ["$attempt_stats.students", []]}},
+                "completed_count": {"$ifNull": ["$attempt_stats.completed_count", 0]},
+                "pass_count": {"$ifNull": ["$attempt_stats.pass_count", 0]},
+                "average_score": {"$ifNull": ["$attempt_stats.average_score", 0]}
+            }
+        },
+        {
+            "$addFields": {
+                "pass_rate": {
+                    "$cond": [
+                        {"$gt": ["$completed_count", 0]},
+                        {"$multiply": [{"$divide": ["$pass_count", "$completed_count"]}, 100]},
+                        0
+                    ]
+                }
+            }
+        }
+    ]
+
+
+def _title_lookup_stage(collection_name: str, local_field: str, as_field: str) -> Dict:
+    """$lookup chỉ lấy title của document liên quan (lesson/course)."""
+    return {
+        "$lookup": {
+            "from": collection_name,
+            "localField": local_field,
+            "foreignField": "_id",
+            "pipeline": [{"$project": {"_id": 0, "title": 1}}],
+            "as": as_field
+        }
+    }
+
+
+def _quiz_list_pipeline(
+    match: Dict,
+    sort_by: str,
+    sort_order: str,
+    skip: int,
+    limit: int
+) -> List[Dict]:
+    """
+    Pipeline danh sách quiz của instructor
+
+    $facet trả về total (đếm trước phân trang) và một trang quiz kèm stats
+    attempts, lesson title, course title - toàn bộ trong một query.
+    """
+    direction = 1 if sort_order == "asc" else -1
+    stats_sort = sort_by in QUIZ_LIST_STATS_SORTS
+    sort_field = QUIZ_LIST_STATS_SORTS.get(sort_by) or QUIZ_LIST_DOCUMENT_SORTS.get(sort_by, "created_at")
+
+    page_stages: List[Dict] = []
+    if stats_sort:
+        page_stages.extend(_quiz_attempt_stats_stages())
+    elif sort_field == "questions_count":
+        # Quiz không lưu số câu hỏi - tính từ mảng questions trước khi sort
+        page_stages.append(
+            {"$addFields": {"questions_count": {"$size": {"$ifNull": ["$questions", []]}}}}
+        )
+    # _id làm tie-breaker để phân trang ổn định khi giá trị sort trùng nhau
+    page_stages.extend([
+        {"$sort": {sort_field: direction, "_id": direction}},
+        {"$skip": skip},
+        {"$limit": limit}
+    ])
+    if not stats_sort:
+        page_stages.extend(_quiz_attempt_stats_stages())
+    page_stages.extend([
+        _title_lookup_stage(Lesson.get_collection_name(), "lesson_id", "lesson"),
+        _title_lookup_stage(Course.get_collection_name(), "course_id", "course"),
+        {
+            "$project": {
+                "title": 1,
+                "description": 1,
+                "lesson_id": 1,
+                "course_id": 1,
+                "questions_count": {"$size": {"$ifNull": ["$questions", []]}},
+                "time_limit_minutes": 1,
+                "passing_score": 1,
+                "total_students": 1,
+                "completed_count": 1,
+                "pass_count": 1,
+                "pass_rate": 1,
+                "average_score": 1,
+                "created_at": 1,
+                "updated_at": 1,
+                "lesson_title": {"$first": "$lesson.title"},
+                "course_title": {"$first": "$course.title"}
+            }
+        }
+    ])
+
+    return [
+        {"$match": match},
+        {
+            "$facet": {
+                "total": [{"$count": "count"}],
+                "data": page_stages
+            }
+        }
+    ]
+
+
 async def list_quizzes_with_filters(
     instructor_id: str,
     course_id: Optional[str] = None,
@@ -712,9 +1122,10 @@ async def list_quizzes_with_filters(
     
     Business logic:
     - Filter by instructor (created_by), course_id, class_id
-    - Search by title
+    - Search by title/description (substring, không phân biệt hoa thường)
     - Sort by created_at, title, question_count, pass_rate
-    - Calculate stats for each quiz
+    - Stats attempts tính bằng aggregation ($lookup + $group) cho trang hiện tại
+    - Số query cố định: một aggregation (+ một query tên lớp nếu lọc theo class)
     
     Args:
         instructor_id: ID của instructor
@@ -729,98 +1140,53 @@ async def list_quizzes_with_filters(
     Returns:
         Dict với data (list QuizListItem), total, skip, limit, has_next
     """
-    # Build query
-    query_conditions = [Quiz.created_by == instructor_id]
-    
+    match: Dict = {"created_by": instructor_id}
     if course_id:
-        query_conditions.append(Quiz.course_id == course_id)
-    
-    if search:
-        # MongoDB text search - cần tạo text index trước
-        # Tạm thời filter sau khi query
-        pass
-    
-    # Get quizzes
-    query = Quiz.find(*query_conditions)
-    
-    # Sort
-    if sort_order == "desc":
-        query = query.sort(f"-{sort_by}")
-    else:
-        query = query.sort(f"+{sort_by}")
-    
-    # Count total trước khi skip/limit
-    total = await query.count()
-    
-    # Pagination
-    quizzes = await query.skip(skip).limit(limit).to_list()
-    
-    # Search filter sau query (nếu có)
-    if search:
-        search_lower = search.lower()
-        quizzes = [
-            q for q in quizzes
-            if search_lower in q.title.lower() or
-            (q.description and search_lower in q.description.lower())
-        ]
-        total = len(quizzes)
-    
-    # Build response với stats
-    quiz_items = []
-    
-    for quiz in quizzes:
-        # Lấy lesson info
-        lesson = await Lesson.get(quiz.lesson_id) if quiz.lesson_id else None
-        lesson_title = lesson.title if lesson else "N/A"
-        
-        # Lấy course info
-        course = await Course.get(quiz.course_id) if quiz.course_id else None
-        course_title = course.title if course else "N/A"
-        
-        # Class info (nếu class_id filter)
-        class_name = None
-        if class_id:
-            class_obj = await Class.get(class_id)
-            class_name = class_obj.name if class_obj else None
-        
-        # Tính stats
-        attempts = await QuizAttempt.find(
-            QuizAttempt.quiz_id == str(quiz.id),
-            QuizAttempt.submitted_at != None
-        ).to_list()
-        
-        total_students = len(set(a.user_id for a in attempts))
-        completed_count = len(attempts)
-        pass_count = sum(1 for a in attempts if a.passed)
-        pass_rate = (pass_count / completed_count * 100) if completed_count > 0 else 0
-        avg_score = (sum(a.score for a in attempts) / completed_count) if completed_count > 0 else 0
-        
-        # Determine status
-        status = "active"
-        
-        quiz_items.append({
-            "quiz_id": str(quiz.id),
-            "title": quiz.title,
-            "description": quiz.description,
-            "lesson_id": quiz.lesson_id,
-            "lesson_title": lesson_title,
-            "course_id": quiz.course_id,
-            "course_title": course_title,
+        match["course_id"] = course_id
+    if search and search.strip():
+        # Substring không phân biệt hoa thường trong title/description (như "pyth"
+        # khớp "Python"); filter trước khi đếm/phân trang, chỉ quét quiz của instructor
+        search_regex = {"$regex": re.escape(search.strip()), "$options": "i"}
+        match["$or"] = [{"title": search_regex}, {"description": search_regex}]
+
+    result = await Quiz.aggregate(
+        _quiz_list_pipeline(match, sort_by, sort_order, skip, limit)
+    ).to_list()
+    facet = result[0] if result else {"total": [], "data": []}
+    total = facet["total"][0]["count"] if facet["total"] else 0
+
+    # Class info (nếu class_id filter)
+    class_name = None
+    if class_id:
+        class_obj = await get_document(Class, class_id)
+        class_name = class_obj.name if class_obj else None
+
+    quiz_items = [
+        {
+            "quiz_id": str(row["_id"]),
+            "title": row["title"],
+            "description": row.get("description"),
+            "lesson_id": row.get("lesson_id"),
+            "lesson_title": row.get("lesson_title") or "N/A",
+            "course_id": row.get("course_id"),
+            "course_title": row.get("course_title") or "N/A",
             "class_id": class_id,
             "class_name": class_name,
-            "status": status,
-            "question_count": len(quiz.questions),
-            "time_limit": quiz.time_limit_minutes or 0,
-            "pass_threshold": int(quiz.passing_score),
-            "total_students": total_students,
-            "completed_count": completed_count,
-            "pass_count": pass_count,
-            "pass_rate": round(pass_rate, 2),
-            "average_score": round(avg_score, 2),
-            "created_at": quiz.created_at,
-            "updated_at": quiz.updated_at
-        })
-    
+            "status": "active",
+            "question_count": row["questions_count"],
+            "time_limit": row.get("time_limit_minutes") or 0,
+            "pass_threshold": int(row.get("passing_score") or 0),
+            "total_students": row["total_students"],
+            "completed_count": row["completed_count"],
+            "pass_count": row["pass_count"],
+            "pass_rate": round(row["pass_rate"], 2),
+            "average_score": round(row["average_score"], 2),
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"]
+        }
+        for row in facet["data"]
+    ]
+
     has_next = (skip + limit) < total
     
     return {
@@ -914,6 +1280,8 @@ async def update_quiz_instructor(
     
     quiz.updated_at = datetime.utcnow()
     await quiz.save()
+    prime_answer_key(quiz)
+    invalidate_course_outline(quiz.course_id)
     
     return {
         "quiz_id": str(quiz.id),
@@ -966,6 +1334,8 @@ async def delete_quiz_instructor(quiz_id: str, instructor_id: str) -> Dict:
     
     # Delete quiz
     await quiz.delete()
+    forget_document(Quiz, quiz.id)
+    invalidate_course_outline(quiz.course_id)
     
     return {
         "quiz_id": str(quiz_id),
@@ -1001,36 +1371,32 @@ async def get_class_quiz_results(quiz_id: str, class_id: str) -> Dict:
     enrollments = await Enrollment.find(
         Enrollment.course_id == quiz.course_id,
         Enrollment.status == "active"
-    ).to_list()
+    ).project(_EnrollmentUserProjection).to_list()
     
-    student_ids = [e.user_id for e in enrollments]
+    student_ids = list({e.user_id for e in enrollments})
     
-    # Get quiz attempts from these students
+    # Chỉ lấy attempts của học viên trong lớp (lọc ở DB), nạp thành cột NumPy
     attempts = await QuizAttempt.find(
         QuizAttempt.quiz_id == quiz_id,
-        QuizAttempt.submitted_at != None
-    ).to_list()
+        QuizAttempt.submitted_at != None,
+        In(QuizAttempt.user_id, student_ids)
+    ).project(AttemptAnalyticsProjection).to_list()
     
-    # Filter only students in class
-    class_attempts = [a for a in attempts if a.user_id in student_ids]
+    columns = AttemptColumns(attempts, get_answer_key(quiz))
+    best, attempt_counts = best_attempts_per_user(columns)
     
-    # Statistics
+    # Statistics - completed/pass/fail tính theo học viên (attempt tốt nhất),
+    # phân bố điểm tính trên mọi attempt
     total_students = len(student_ids)
-    completed_count = len(class_attempts)
+    completed_count = int(best.size)
     completion_rate = (completed_count / total_students * 100) if total_students > 0 else 0
     
-    pass_count = sum(1 for a in class_attempts if a.passed)
+    pass_count = int(columns.passed[best].sum())
     fail_count = completed_count - pass_count
     pass_rate = (pass_count / completed_count * 100) if completed_count > 0 else 0
     
-    scores = [a.score for a in class_attempts]
-    avg_score = sum(scores) / len(scores) if scores else 0
-    median_score = sorted(scores)[len(scores) // 2] if scores else 0
-    highest_score = max(scores) if scores else 0
-    lowest_score = min(scores) if scores else 0
-    
-    times = [a.time_spent_seconds / 60 for a in class_attempts]  # Convert to minutes
-    avg_time = sum(times) / len(times) if times else 0
+    summary = score_summary(columns.scores)
+    avg_time = float(columns.time_spent_seconds.mean()) / 60 if len(columns) else 0  # Minutes
     
     statistics = {
         "total_students": total_students,
@@ -1039,106 +1405,45 @@ async def get_class_quiz_results(quiz_id: str, class_id: str) -> Dict:
         "pass_count": pass_count,
         "fail_count": fail_count,
         "pass_rate": round(pass_rate, 2),
-        "average_score": round(avg_score, 2),
-        "median_score": round(median_score, 2),
-        "highest_score": round(highest_score, 2),
-        "lowest_score": round(lowest_score, 2),
+        "average_score": round(summary["average"], 2),
+        "median_score": round(summary["median"], 2),
+        "highest_score": round(summary["highest"], 2),
+        "lowest_score": round(summary["lowest"], 2),
+        "percentile_25": round(summary["p25"], 2),
+        "percentile_75": round(summary["p75"], 2),
+        "percentile_90": round(summary["p90"], 2),
         "average_time": int(avg_time)
     }
     
-    # Score distribution (histogram)
-    # Ranges: 0-10, 11-20, ..., 91-100
-    score_distribution = []
-    ranges = [(i, i + 10) for i in range(0, 100, 10)]
+    # Score distribution (histogram): 0-9, 10-19, ..., 90-100
+    score_distribution = score_histogram(columns.scores)
     
-    for start, end in ranges:
-        count = sum(1 for s in scores if start <= s < end)
-        percentage = (count / len(scores) * 100) if scores else 0
-        
-        score_distribution.append({
-            "range": f"{start}-{end-1}" if end < 100 else f"{start}-100",
-            "count": count,
-            "percentage": round(percentage, 2)
-        })
-    
-    # Student ranking
-    # Get best attempt per student
-    student_best_attempts = {}
-    for attempt in class_attempts:
-        uid = attempt.user_id
-        if uid not in student_best_attempts or attempt.score > student_best_attempts[uid].score:
-            student_best_attempts[uid] = attempt
-    
-    # Sort by score descending
-    ranked_attempts = sorted(
-        student_best_attempts.values(),
-        key=lambda a: (-a.score, a.time_spent_seconds)
-    )
-    
-    student_ranking = []
-    for rank, attempt in enumerate(ranked_attempts[:20], start=1):  # Top 20
-        user = await User.get(attempt.user_id)
-        
-        # Count attempts
-        user_attempts = [a for a in class_attempts if a.user_id == attempt.user_id]
-        
-        student_ranking.append({
-            "rank": rank,
-            "user_id": attempt.user_id,
-            "full_name": user.full_name if user else "Unknown",
-            "avatar": user.avatar_url if user else None,
-            "score": round(attempt.score, 2),
-            "time_spent": int(attempt.time_spent_seconds / 60),
-            "attempt_count": len(user_attempts),
-            "status": "pass" if attempt.passed else "fail",
-            "completed_at": attempt.submitted_at
-        })
-    
-    # Difficult questions (lowest correct rate)
-    # Analyze answers across all attempts
-    question_stats = {}
+    # Student ranking - top 20 từ bảng xếp hạng của lớp (cập nhật khi nộp bài)
+    student_ranking = [
+        leaderboard_service.to_rank_item(entry, rank)
+        for rank, entry in enumerate(
+            await leaderboard_service.get_top_entries(quiz_id, class_id, 20), start=1
+        )
+    ]
     
-    for attempt in class_attempts:
-        answer_map = {ans["question_id"]: ans["answer"] for ans in attempt.answers}
-        
-        for question in quiz.questions:
-            q_id = question.get("question_id") or question.get("id") or question.get("order")
-            
-            if q_id not in question_stats:
-                question_stats[q_id] = {
-                    "question_text": question.get("question_text", ""),
-                    "correct_count": 0,
-                    "total_count": 0
-                }
-            
-            user_answer = answer_map.get(q_id)
-            correct_answer = question.get("correct_answer")
-            
-            question_stats[q_id]["total_count"] += 1
-            if user_answer == correct_answer:
-                question_stats[q_id]["correct_count"] += 1
-    
-    # Calculate correct rate and find hardest questions
+    # Difficult questions (lowest correct rate) + discrimination index
+    items = item_analysis(columns)
     difficult_questions = []
-    
-    for q_id, stats in question_stats.items():
-        total = stats["total_count"]
-        correct = stats["correct_count"]
-        correct_rate = (correct / total * 100) if total > 0 else 0
-        
-        difficult_questions.append({
-            "question_id": q_id,
-            "question_text": stats["question_text"],
-            "correct_rate": round(correct_rate, 2),
-            "total_answers": total
-        })
-    
-    # Sort by correct_rate ascending (hardest first)
-    difficult_questions.sort(key=lambda q: q["correct_rate"])
-    difficult_questions = difficult_questions[:3]  # Top 3 hardest
+    if len(columns):
+        for index in hardest_questions(items["difficulty"], 3).tolist():
+            question = quiz.questions[index]
+            difficult_questions.append({
+                "question_id": str(
+                    question.get("question_id") or question.get("id") or question.get("order")
+                ),
+                "question_text": question.get("question_text", ""),
+                "correct_rate": round(float(items["difficulty"][index]) * 100, 2),
+                "discrimination": round(float(items["discrimination"][index]), 3),
+                "total_answers": len(columns)
+            })
     
     # Get class name
-    class_obj = await Class.get(class_id)
+    class_obj = await get_document(Class, class_id)
     class_name = class_obj.name if class_obj else f"Class {class_id}"
     
     return {
@@ -1153,12 +1458,24 @@ async def get_class_quiz_results(quiz_id: str, class_id: str) -> Dict:
     }
 
 
-async def create_new_attempt(user_id: str, quiz_id: str) -> QuizAttempt:
-    """Tạo attempt mới cho retake quiz"""
-    existing_attempts = await get_user_quiz_attempts(user_id, quiz_id)
-    attempt_number = len(existing_attempts) + 1
+async def create_new_attempt(user_id: str, quiz_id: str, max_attempts: int = 0) -> Optional[QuizAttempt]:
+    """
+    Mở attempt cho retake quiz (attempt đang làm - bài nộp sau ghi vào attempt này)
+    
+    Returns:
+        QuizAttempt đang làm (attempt đã mở trước đó nếu chưa nộp), hoặc None nếu hết lượt
+    """
+    live = await open_live_attempt(user_id, quiz_id, max_attempts)
+    if live is None:
+        return None
+    attempt_id, attempt_number = live
+    
+    existing = await get_quiz_attempt(attempt_id)
+    if existing:
+        return existing
     
     new_attempt = QuizAttempt(
+        id=attempt_id,
         quiz_id=quiz_id,
         user_id=user_id,
         attempt_number=attempt_number,
@@ -1166,6 +1483,10 @@ async def create_new_attempt(user_id: str, quiz_id: str) -> QuizAttempt:
         score=0.0,
         status="in_progress"
     )
-    await new_attempt.insert()
+    try:
+        await new_attempt.insert()
+    except DuplicateKeyError:
+        # Request đồng thời đã tạo (hoặc đã nộp) attempt này
+        return await get_quiz_attempt(attempt_id)
     return new_attempt
 
@@ -4,14 +4,106 @@ Sử dụng: Beanie ODM, MongoDB text search
 Tuân thủ: CHUCNANG.md Section 5.1
 """
 
+import asyncio
+import hashlib
+import logging
 import time
 import re
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
 from fastapi import HTTPException, status
-from models.models import Course, User, Class, Module, Lesson
+from pydantic import BaseModel, Field
+from models.models import Course, User, Class, Module, Lesson, Enrollment, SearchEvent
+from utils.cache import TTLCache
+from utils.fuzzy import TrigramIndex
 from utils.utils import normalize_search_query, calculate_relevance_score
 
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# ACCESS SCOPE CACHE
+# ============================================================================
+
+# Scope truy cập (tập course_id) theo (role, user_id), dùng chung giữa các
+# sub-search của một request và giữa các request trong thời gian TTL ngắn
+_COURSE_SCOPE_TTL_SECONDS = 60
+_course_scope_cache = TTLCache(maxsize=4096, ttl=_COURSE_SCOPE_TTL_SECONDS)
+
+
+class _IdProjection(BaseModel):
+    """Projection chỉ lấy _id - tránh load toàn bộ document khi tính scope"""
+    id: str = Field(alias="_id")
+
+    class Settings:
+        projection = {"_id": 1}
+
+
+def invalidate_user_course_scope(user_id: str) -> None:
+    """
+    Xóa scope đã cache của một user
+    Gọi khi: enroll, hủy enroll, join lớp, đổi role
+    """
+    _course_scope_cache.invalidate_where(lambda key: key[1] == user_id)
+
+
+def invalidate_all_course_scopes() -> None:
+    """
+    Xóa scope của tất cả users
+    Gọi khi: course publish/unpublish, tạo hoặc xóa course
+    (tập published courses thay đổi ảnh hưởng mọi user)
+    """
+    _course_scope_cache.clear()
+
+
+# ============================================================================
+# SEARCH RESULT CACHE
+# ============================================================================
+
+# Kết quả search (trước phân trang) cho các category dùng chung được giữa
+# các user cùng role + cùng scope. Key chứa generation hiện tại - mỗi lần
+# ghi course/module/lesson thì tăng generation nên không bao giờ trả kết quả cũ.
+# Category users có cache và generation riêng: ghi user không làm mất kết quả
+# course/module/lesson và không build lại fuzzy index.
+# Category classes phụ thuộc từng user nên không cache.
+_SEARCH_RESULT_TTL_SECONDS = 120
+_search_result_cache = TTLCache(maxsize=512, ttl=_SEARCH_RESULT_TTL_SECONDS)
+_search_generation = 0
+_user_search_cache = TTLCache(maxsize=256, ttl=_SEARCH_RESULT_TTL_SECONDS)
+_user_search_generation = 0
+
+
+def bump_search_generation() -> None:
+    """
+    Đánh dấu nội dung course/module/lesson đã thay đổi
+    Gọi sau mọi thao tác ghi course (kể cả modules/lessons embedded)
+    """
+    global _search_generation
+    _search_generation += 1
+    _search_result_cache.clear()
+
+
+def invalidate_user_search_results() -> None:
+    """
+    Đánh dấu dữ liệu user đã thay đổi (category users)
+    Gọi khi: tạo/xóa user, đổi tên/email/status/role
+    """
+    global _user_search_generation
+    _user_search_generation += 1
+    _user_search_cache.clear()
+
+
+def get_search_cache_stats() -> Dict:
+    """Thống kê result cache của worker hiện tại (cho analytics/monitoring)"""
+    return {
+        "hit_ratio": round(_search_result_cache.hit_ratio, 4),
+        "hits": _search_result_cache.hits,
+        "misses": _search_result_cache.misses,
+        "size": len(_search_result_cache),
+        "generation": _search_generation,
+        "user_generation": _user_search_generation
+    }
+
 
 # ============================================================================
 # Section 5.1: UNIVERSAL SEARCH & ADVANCED FILTERING
@@ -36,7 +128,7 @@ async def universal_search(
     3. Calculate relevance score for each result
     4. Group results by category
     5. Generate search suggestions (autocomplete, typo correction)
-    6. Save search history for logged-in users
+    6. Ghi search event (nguồn cho history và analytics)
     
     Args:
         query: Từ khóa tìm kiếm
@@ -55,67 +147,62 @@ async def universal_search(
     
     # Normalize search query
     normalized_query = normalize_search_query(query)
-    search_regex = re.compile(normalized_query, re.IGNORECASE)
     
-    # Initialize results storage
-    results_by_category = []
-    total_results = 0
+    # Scope truy cập tính một lần, dùng chung cho modules và lessons
+    accessible_course_ids, scope_digest = await _get_course_scope(current_user)
     
-    # 1. Search Courses
-    course_results = await _search_courses(
-        search_regex, current_user, category_filter, 
-        level_filter, instructor_filter, rating_filter
+    filters = (category_filter, level_filter, instructor_filter, rating_filter)
+    category_outcomes, suggestions = await _run_category_searches(
+        query, normalized_query, current_user, filters,
+        accessible_course_ids, scope_digest
+    )
+    results_by_category, timed_out_categories, total_results = _collect_category_results(
+        category_outcomes
     )
-    if course_results['items']:
-        results_by_category.append(course_results)
-        total_results += course_results['count']
     
-    # 2. Search Users (if has permission)
-    if _can_search_users(current_user):
-        user_results = await _search_users(search_regex, current_user)
-        if user_results['items']:
-            results_by_category.append(user_results)
-            total_results += user_results['count']
-    
-    # 3. Search Classes  
-    class_results = await _search_classes(search_regex, current_user)
-    if class_results['items']:
-        results_by_category.append(class_results)
-        total_results += class_results['count']
-    
-    # 4. Search Modules
-    module_results = await _search_modules(search_regex, current_user)
-    if module_results['items']:
-        results_by_category.append(module_results)
-        total_results += module_results['count']
-    
-    # 5. Search Lessons
-    lesson_results = await _search_lessons(search_regex, current_user)
-    if lesson_results['items']:
-        results_by_category.append(lesson_results)
-        total_results += lesson_results['count']
+    # Fuzzy recall: không có kết quả -> thử lại với query đã sửa lỗi chính tả
+    corrected_query = None
+    if total_results == 0 and not timed_out_categories:
+        fuzzy_index = await _get_fuzzy_index()
+        corrected_query = fuzzy_index.correct(normalized_query)
+        if corrected_query:
+            category_outcomes, _ = await _run_category_searches(
+                corrected_query, corrected_query, current_user, filters,
+                accessible_course_ids, scope_digest
+            )
+            results_by_category, timed_out_categories, total_results = _collect_category_results(
+                category_outcomes
+            )
+    
+    # Đếm kết quả theo category trước khi phân trang (cho search event)
+    category_counts = {
+        group["category"]: group["count"] for group in results_by_category
+    }
     
     # Apply pagination across all categories
     paginated_results = _apply_pagination(results_by_category, page, limit)
     
-    # Generate search suggestions
-    suggestions = await _generate_suggestions(query, normalized_query)
-    
-    # Save search history for logged-in users
-    if current_user.get("user_id"):
-        await _save_search_history(
-            current_user["user_id"], query, total_results
-        )
-    
     # Calculate search time
     search_time_ms = int((time.time() - start_time) * 1000)
     
+    # Ghi search event (fire-and-forget, flush theo batch)
+    _record_search_event(
+        user_id=current_user.get("user_id"),
+        query=query,
+        normalized_query=normalized_query,
+        category_counts=category_counts,
+        total_results=total_results,
+        latency_ms=search_time_ms
+    )
+    
     return {
         "query": query,
         "total_results": total_results,
         "results_by_category": paginated_results,
         "suggestions": suggestions,
         "search_time_ms": search_time_ms,
+        "timed_out_categories": timed_out_categories,
+        "corrected_query": corrected_query if total_results > 0 else None,
         "filters_applied": {
             "category": category_filter,
             "level": level_filter,
@@ -125,6 +212,123 @@ async def universal_search(
     }
 
 
+# Ngân sách thời gian cho mỗi category - quá hạn thì trả partial results
+_CATEGORY_TIMEOUT_SECONDS = 3.0
+_TIMED_OUT = object()
+_CATEGORY_ORDER = ("courses", "users", "classes", "modules", "lessons")
+
+
+async def _run_with_timeout(coro, timeout: float = _CATEGORY_TIMEOUT_SECONDS):
+    """
+    Chạy một sub-search với timeout, trả _TIMED_OUT nếu quá hạn
+    Lỗi khác vẫn được raise như cũ.
+    """
+    try:
+        return await asyncio.wait_for(coro, timeout=timeout)
+    except asyncio.TimeoutError:
+        return _TIMED_OUT
+
+
+async def _run_category_searches(
+    query: str,
+    normalized_query: str,
+    current_user: Dict,
+    filters: Tuple,
+    accessible_course_ids: List[str],
+    scope_digest: str
+) -> Tuple[Dict, List[Dict]]:
+    """
+    Chạy đồng thời các sub-search cho một query
+    
+    Courses/modules/lessons/suggestions chỉ phụ thuộc query, filters,
+    role và scope -> lấy từ result cache nếu có. Users chỉ phụ thuộc query
+    và role -> cache riêng. Classes phụ thuộc từng user nên luôn query trực tiếp.
+    
+    Returns:
+        (outcome theo category - dict kết quả hoặc _TIMED_OUT, suggestions)
+    """
+    category_filter, level_filter, instructor_filter, rating_filter = filters
+    search_regex = re.compile(normalized_query, re.IGNORECASE)
+    role = current_user.get("role") or "guest"
+    
+    cache_key = (_search_generation, normalized_query, filters, role, scope_digest)
+    cached_results = _search_result_cache.get(cache_key)
+    
+    searches = {"classes": _search_classes(search_regex, current_user)}
+    
+    user_cache_key = (_user_search_generation, normalized_query, role)
+    cached_users = None
+    if _can_search_users(current_user):
+        cached_users = _user_search_cache.get(user_cache_key)
+        if cached_users is None:
+            searches["users"] = _search_users(search_regex, current_user)
+    
+    if cached_results is None:
+        searches["courses"] = _search_courses(
+            search_regex, current_user, category_filter,
+            level_filter, instructor_filter, rating_filter
+        )
+        searches["modules"] = _search_modules(
+            search_regex, current_user, accessible_course_ids
+        )
+        searches["lessons"] = _search_lessons(
+            search_regex, current_user, accessible_course_ids
+        )
+        searches["suggestions"] = _generate_suggestions(query, normalized_query)
+    
+    outcomes = dict(zip(searches, await asyncio.gather(
+        *(_run_with_timeout(search) for search in searches.values())
+    )))
+    
+    users_outcome = outcomes.pop("users", cached_users)
+    if cached_users is None and users_outcome is not None and users_outcome is not _TIMED_OUT:
+        _user_search_cache.set(user_cache_key, users_outcome)
+    
+    if cached_results is None:
+        suggestions = outcomes.pop("suggestions")
+        cached_results = {
+            "categories": {
+                category: outcome for category, outcome in outcomes.items()
+                if category != "classes"
+            },
+            # Suggestions không bắt buộc - timeout thì trả rỗng
+            "suggestions": [] if suggestions is _TIMED_OUT else suggestions
+        }
+        # Chỉ cache kết quả đầy đủ (không có category timeout)
+        if suggestions is not _TIMED_OUT and all(
+            outcome is not _TIMED_OUT for outcome in cached_results["categories"].values()
+        ):
+            _search_result_cache.set(cache_key, cached_results)
+    
+    category_outcomes = {**cached_results["categories"], "classes": outcomes["classes"]}
+    if users_outcome is not None:
+        category_outcomes["users"] = users_outcome
+    return category_outcomes, cached_results["suggestions"]
+
+
+def _collect_category_results(category_outcomes: Dict) -> Tuple[List[Dict], List[str], int]:
+    """
+    Gom kết quả theo thứ tự category, category quá thời gian bị bỏ qua (partial)
+    
+    Returns:
+        (results_by_category, timed_out_categories, total_results)
+    """
+    results_by_category = []
+    timed_out_categories = []
+    total_results = 0
+    for category in _CATEGORY_ORDER:
+        outcome = category_outcomes.get(category)
+        if outcome is None:
+            continue
+        if outcome is _TIMED_OUT:
+            timed_out_categories.append(category)
+        elif outcome['items']:
+            results_by_category.append(outcome)
+            total_results += outcome['count']
+    
+    return results_by_category, timed_out_categories, total_results
+
+
 async def _search_courses(
     search_regex: re.Pattern,
     current_user: Dict,
@@ -370,7 +574,11 @@ async def _search_classes(search_regex: re.Pattern, current_user: Dict) -> Dict:
     }
 
 
-async def _search_modules(search_regex: re.Pattern, current_user: Dict) -> Dict:
+async def _search_modules(
+    search_regex: re.Pattern,
+    current_user: Dict,
+    accessible_course_ids: Optional[List[str]] = None
+) -> Dict:
     """
     Tìm kiếm modules trong courses
     
@@ -379,8 +587,9 @@ async def _search_modules(search_regex: re.Pattern, current_user: Dict) -> Dict:
     2. Only return modules from accessible courses
     3. Include course context in results
     """
-    # Get accessible courses for user
-    accessible_course_ids = await _get_accessible_course_ids(current_user)
+    # Get accessible courses for user (nếu caller chưa tính sẵn)
+    if accessible_course_ids is None:
+        accessible_course_ids = await _get_accessible_course_ids(current_user)
     
     if not accessible_course_ids:
         return {"category": "modules", "count": 0, "items": []}
@@ -439,7 +648,11 @@ async def _search_modules(search_regex: re.Pattern, current_user: Dict) -> Dict:
     }
 
 
-async def _search_lessons(search_regex: re.Pattern, current_user: Dict) -> Dict:
+async def _search_lessons(
+    search_regex: re.Pattern,
+    current_user: Dict,
+    accessible_course_ids: Optional[List[str]] = None
+) -> Dict:
     """
     Tìm kiếm lessons trong modules
     
@@ -448,8 +661,9 @@ async def _search_lessons(search_regex: re.Pattern, current_user: Dict) -> Dict:
     2. Only return lessons from accessible courses
     3. Include module/course context
     """
-    # Get accessible courses for user
-    accessible_course_ids = await _get_accessible_course_ids(current_user)
+    # Get accessible courses for user (nếu caller chưa tính sẵn)
+    if accessible_course_ids is None:
+        accessible_course_ids = await _get_accessible_course_ids(current_user)
     
     if not accessible_course_ids:
         return {"category": "lessons", "count": 0, "items": []}
@@ -528,44 +742,68 @@ async def _get_accessible_course_ids(current_user: Dict) -> List[str]:
     """
     Lấy danh sách course IDs mà user có quyền truy cập
     """
+    accessible_course_ids, _ = await _get_course_scope(current_user)
+    return accessible_course_ids
+
+
+async def _get_course_scope(current_user: Dict) -> Tuple[List[str], str]:
+    """
+    Lấy scope truy cập (course IDs) kèm digest của scope
+    
+    Kết quả được cache theo (role, user_id) trong TTL ngắn và bị
+    invalidate khi enroll/hủy enroll/join lớp, publish/unpublish course,
+    đổi role. Chỉ query _id (projection) thay vì load cả document.
+    Digest dùng làm một phần key của result cache: các user có cùng
+    tập course truy cập dùng chung kết quả search.
+    """
     user_role = current_user.get("role")
     user_id = current_user.get("user_id")
     
+    cache_key = (user_role or "guest", user_id)
+    cached_scope = _course_scope_cache.get(cache_key)
+    if cached_scope is not None:
+        course_ids, scope_digest = cached_scope
+        return list(course_ids), scope_digest
+    
+    course_ids = await _load_accessible_course_ids(user_role, user_id)
+    scope_digest = hashlib.sha1(
+        "\n".join(sorted(course_ids)).encode("utf-8")
+    ).hexdigest()
+    
+    _course_scope_cache.set(cache_key, (frozenset(course_ids), scope_digest))
+    return list(course_ids), scope_digest
+
+
+async def _load_accessible_course_ids(user_role: Optional[str], user_id: Optional[str]) -> set:
+    """
+    Query scope truy cập từ database (id-only projection)
+    """
     if user_role == "admin":
         # Admin có quyền truy cập tất cả courses
-        courses = await Course.find().to_list()
-        return [str(course.id) for course in courses]
+        courses = await Course.find().project(_IdProjection).to_list()
+        return {course.id for course in courses}
     
-    elif user_role == "instructor":
-        # Instructor truy cập courses họ tạo + published courses
-        instructor_courses = await Course.find(Course.instructor_id == user_id).to_list()
-        published_courses = await Course.find(Course.status == "published").to_list()
-        
-        all_courses = instructor_courses + published_courses
-        # Remove duplicates
-        unique_course_ids = list(set(str(course.id) for course in all_courses))
-        return unique_course_ids
+    # Published courses - mọi role đều truy cập được
+    published_courses = await Course.find(
+        Course.status == "published"
+    ).project(_IdProjection).to_list()
+    course_ids = {course.id for course in published_courses}
+    
+    if user_role == "instructor":
+        # Instructor truy cập thêm courses họ dạy
+        instructor_courses = await Course.find(
+            Course.instructor_id == user_id
+        ).project(_IdProjection).to_list()
+        course_ids.update(course.id for course in instructor_courses)
     
     elif user_role == "student":
-        # Student chỉ truy cập published courses và enrolled courses
-        from models.models import Enrollment
-        
-        # Get enrolled courses
-        enrollments = await Enrollment.find(Enrollment.user_id == user_id).to_list()
-        enrolled_course_ids = [enrollment.course_id for enrollment in enrollments]
-        
-        # Get published courses
-        published_courses = await Course.find(Course.status == "published").to_list()
-        published_course_ids = [str(course.id) for course in published_courses]
-        
-        # Combine and remove duplicates
-        all_course_ids = list(set(enrolled_course_ids + published_course_ids))
-        return all_course_ids
+        # Student truy cập thêm enrolled courses
+        enrollments = await Enrollment.find(
+            Enrollment.user_id == user_id
+        ).to_list()
+        course_ids.update(enrollment.course_id for enrollment in enrollments)
     
-    else:
-        # Guest users - only published courses
-        published_courses = await Course.find(Course.status == "published").to_list()
-        return [str(course.id) for course in published_courses]
+    return course_ids
 
 
 def _can_search_users(current_user: Dict) -> bool:
@@ -594,17 +832,15 @@ async def _generate_suggestions(original_query: str, normalized_query: str) -> L
             "score": 90.0
         })
     
-    # 2. Typo correction suggestions (simplified)
-    if len(original_query) > 3:
-        # Basic typo suggestions - trong production có thể dùng library như difflib
-        common_terms = ["python", "javascript", "react", "nodejs", "database", "api", "frontend", "backend"]
-        for term in common_terms:
-            if _similar_strings(original_query.lower(), term, threshold=0.7):
-                suggestions.append({
-                    "query": term,
-                    "type": "typo_correction",
-                    "score": 80.0
-                })
+    # 2. Typo correction - trigram index trên titles courses/modules/lessons
+    fuzzy_index = await _get_fuzzy_index()
+    corrected_query = fuzzy_index.correct(normalize_search_query(original_query))
+    if corrected_query:
+        suggestions.append({
+            "query": corrected_query,
+            "type": "typo_correction",
+            "score": 80.0
+        })
     
     # 3. Popular searches (mock data - trong production lấy từ analytics)
     popular_searches = ["Python cơ bản", "React JS", "Database design", "API development", "Frontend basics"]
@@ -627,34 +863,69 @@ async def _generate_suggestions(original_query: str, normalized_query: str) -> L
     return unique_suggestions[:5]  # Limit 5 suggestions
 
 
-def _similar_strings(s1: str, s2: str, threshold: float = 0.7) -> bool:
+# ============================================================================
+# FUZZY INDEX - trigram index cho typo correction
+# ============================================================================
+
+_fuzzy_index: Optional[TrigramIndex] = None
+_fuzzy_index_generation = -1
+_fuzzy_index_lock = asyncio.Lock()
+
+
+class _CatalogTitlesProjection(BaseModel):
+    """Projection chỉ lấy titles của course và modules/lessons embedded"""
+    title: str = ""
+    modules: List[Dict] = Field(default_factory=list)
+
+    class Settings:
+        projection = {"title": 1, "modules.title": 1, "modules.lessons.title": 1}
+
+
+async def _get_fuzzy_index() -> TrigramIndex:
     """
-    Kiểm tra 2 strings có similar không (simplified similarity check)
+    Trigram index trên titles (đã fold) của published courses, modules, lessons
+    Build lại lazily khi search generation thay đổi (có ghi course)
     """
-    if len(s1) == 0 or len(s2) == 0:
-        return False
+    global _fuzzy_index, _fuzzy_index_generation
     
-    # Simple character-based similarity
-    common_chars = len(set(s1.lower()) & set(s2.lower()))
-    total_chars = len(set(s1.lower()) | set(s2.lower()))
+    if _fuzzy_index is not None and _fuzzy_index_generation == _search_generation:
+        return _fuzzy_index
     
-    similarity = common_chars / total_chars if total_chars > 0 else 0
-    return similarity >= threshold
+    async with _fuzzy_index_lock:
+        # Request khác có thể đã build xong trong lúc chờ lock
+        if _fuzzy_index is not None and _fuzzy_index_generation == _search_generation:
+            return _fuzzy_index
+        
+        generation = _search_generation
+        courses = await Course.find(
+            Course.status == "published"
+        ).project(_CatalogTitlesProjection).to_list()
+        
+        index = TrigramIndex()
+        for course in courses:
+            index.add_text(normalize_search_query(course.title))
+            for module in course.modules:
+                index.add_text(normalize_search_query(module.get("title", "")))
+                for lesson in module.get("lessons", []):
+                    index.add_text(normalize_search_query(lesson.get("title", "")))
+        
+        _fuzzy_index, _fuzzy_index_generation = index, generation
+        return index
 
 
 def _apply_pagination(results_by_category: List[Dict], page: int, limit: int) -> List[Dict]:
     """
     Apply pagination across all categories
+    Không sửa các item gốc (có thể đang nằm trong result cache)
     """
     # Flatten all results với category info
     all_results = []
     for category_group in results_by_category:
         for item in category_group["items"]:
-            item["category"] = category_group["category"]
-            all_results.append(item)
+            all_results.append((category_group["category"], item))
     
     # Sort by relevance score across all categories
-    all_results.sort(key=lambda x: x["relevance_score"], reverse=True)
+    all_results.sort(key=lambda x: x[1]["relevance_score"], reverse=True)
     
     # Apply pagination
     start_idx = (page - 1) * limit
@@ -663,8 +934,7 @@ def _apply_pagination(results_by_category: List[Dict], page: int, limit: int) ->
     
     # Group back by category
     paginated_by_category = {}
-    for item in paginated_items:
-        category = item.pop("category")  # Remove category from item
+    for category, item in paginated_items:
         if category not in paginated_by_category:
             paginated_by_category[category] = {
                 "category": category,
@@ -677,83 +947,190 @@ def _apply_pagination(results_by_category: List[Dict], page: int, limit: int) ->
     return list(paginated_by_category.values())
 
 
-async def _save_search_history(user_id: str, query: str, results_count: int) -> None:
+# ============================================================================
+# SEARCH EVENTS - append-only, ghi theo batch
+# ============================================================================
+
+_SEARCH_EVENT_BATCH_SIZE = 50
+_SEARCH_EVENT_FLUSH_DELAY_SECONDS = 2.0
+
+_pending_search_events: List[SearchEvent] = []
+_search_event_flush_scheduled = False
+# Giữ reference tới background tasks để không bị GC khi đang chạy
+_background_tasks: set = set()
+
+
+def _record_search_event(
+    user_id: Optional[str],
+    query: str,
+    normalized_query: str,
+    category_counts: Dict[str, int],
+    total_results: int,
+    latency_ms: int
+) -> None:
+    """
+    Đưa search event vào buffer, không chờ ghi database
+    
+    Buffer được flush khi đủ _SEARCH_EVENT_BATCH_SIZE events hoặc sau
+    _SEARCH_EVENT_FLUSH_DELAY_SECONDS kể từ event đầu tiên của batch.
+    """
+    global _search_event_flush_scheduled
+    
+    _pending_search_events.append(SearchEvent(
+        user_id=user_id,
+        query=query,
+        normalized_query=normalized_query,
+        results_by_category=category_counts,
+        total_results=total_results,
+        zero_results=total_results == 0,
+        latency_ms=latency_ms
+    ))
+    
+    if len(_pending_search_events) >= _SEARCH_EVENT_BATCH_SIZE:
+        _spawn_background(flush_search_events())
+    elif not _search_event_flush_scheduled:
+        _search_event_flush_scheduled = True
+        _spawn_background(_delayed_flush_search_events())
+
+
+def _spawn_background(coro) -> None:
+    """Chạy coroutine nền, giữ reference cho tới khi hoàn tất"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _delayed_flush_search_events() -> None:
+    global _search_event_flush_scheduled
+    
+    await asyncio.sleep(_SEARCH_EVENT_FLUSH_DELAY_SECONDS)
+    _search_event_flush_scheduled = False
+    await flush_search_events()
+
+
+async def flush_search_events() -> None:
     """
-    Lưu lịch sử tìm kiếm của user (simplified - có thể dùng separate collection)
+    Ghi toàn bộ search events đang chờ bằng một lệnh insert_many
+    Gọi thêm khi shutdown để không mất events trong buffer.
+    Lỗi ghi chỉ được log - không ảnh hưởng search request.
     """
+    if not _pending_search_events:
+        return
+    
+    batch = list(_pending_search_events)
+    _pending_search_events.clear()
+    
     try:
-        # Trong production, có thể tạo separate SearchHistory collection
-        # Ở đây simplified bằng cách update user document
-        user = await User.get(user_id)
-        if user:
-            # Initialize search_history if not exists
-            if not hasattr(user, 'search_history'):
-                user.search_history = []
-            
-            # Add new search to history
-            search_entry = {
-                "query": query,
-                "timestamp": datetime.utcnow(),
-                "results_count": results_count
-            }
-            
-            # Keep only last 50 searches
-            user.search_history.append(search_entry)
-            if len(user.search_history) > 50:
-                user.search_history = user.search_history[-50:]
-            
-            await user.save()
+        await SearchEvent.insert_many(batch)
     except Exception as e:
-        # Log error nhưng không fail search request
-        print(f"Error saving search history: {e}")
+        logger.warning(f"[SEARCH] Failed to write {len(batch)} search events: {e}")
 
 
 async def get_search_history(user_id: str) -> Dict:
     """
     Lấy lịch sử tìm kiếm của user
-    """
-    user = await User.get(user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User không tồn tại"
-        )
     
-    search_history = getattr(user, 'search_history', [])
+    - search_history: 20 lần tìm gần nhất của user
+    - popular_searches: từ khóa được tìm nhiều nhất toàn hệ thống 7 ngày qua
+    """
+    # Đảm bảo các search vừa thực hiện đã được ghi
+    await flush_search_events()
+    
+    recent_events = await SearchEvent.find(
+        SearchEvent.user_id == user_id
+    ).sort(-SearchEvent.created_at).limit(20).to_list()
+    
+    search_history = [
+        {
+            "query": event.query,
+            "timestamp": event.created_at,
+            "results_count": event.total_results
+        }
+        for event in recent_events
+    ]
     
-    # Get popular searches (mock - trong production từ analytics)
-    popular_searches = [
-        "Python programming", "Web development", "Data science", 
-        "Machine learning", "JavaScript basics"
+    popular_pipeline = [
+        {"$match": {
+            "created_at": {"$gte": datetime.utcnow() - timedelta(days=7)},
+            "zero_results": False
+        }},
+        # $last lấy cách viết của lần tìm mới nhất
+        {"$sort": {"created_at": 1}},
+        {"$group": {
+            "_id": "$normalized_query",
+            "query": {"$last": "$query"},
+            "count": {"$sum": 1}
+        }},
+        {"$sort": {"count": -1}},
+        {"$limit": 5}
     ]
+    popular = await SearchEvent.aggregate(popular_pipeline).to_list()
     
     return {
         "user_id": user_id,
-        "search_history": search_history[-20:],  # Last 20 searches
-        "popular_searches": popular_searches
+        "search_history": search_history,
+        "popular_searches": [item["query"] for item in popular]
     }
 
 
-async def get_search_analytics() -> Dict:
+# Khoảng thời gian mặc định của search analytics
+SEARCH_ANALYTICS_WINDOW_DAYS = 30
+
+
+async def get_search_analytics(window_days: int = SEARCH_ANALYTICS_WINDOW_DAYS) -> Dict:
     """
-    Lấy search analytics cho admin (simplified)
+    Lấy search analytics cho admin
+    Tính bằng một aggregation ($facet) trên search_events trong window_days ngày gần nhất
+    (dùng index created_at thay vì quét cả collection)
     """
-    # Trong production, tính toán từ dedicated analytics collection
-    # Ở đây return mock data structure
+    await flush_search_events()
+    
+    pipeline = [
+        {"$match": {"created_at": {"$gte": datetime.utcnow() - timedelta(days=window_days)}}},
+        {"$facet": {
+            "summary": [
+                {"$group": {
+                    "_id": None,
+                    "total_searches": {"$sum": 1},
+                    "avg_results": {"$avg": "$total_results"},
+                    "avg_latency_ms": {"$avg": "$latency_ms"}
+                }}
+            ],
+            # Số lần search có kết quả trong từng category
+            "categories": [
+                {"$project": {"counts": {"$objectToArray": "$results_by_category"}}},
+                {"$unwind": "$counts"},
+                {"$match": {"counts.v": {"$gt": 0}}},
+                {"$group": {"_id": "$counts.k", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1}}
+            ],
+            "no_results": [
+                {"$match": {"zero_results": True}},
+                {"$sort": {"created_at": 1}},
+                {"$group": {
+                    "_id": "$normalized_query",
+                    "query": {"$last": "$query"},
+                    "count": {"$sum": 1}
+                }},
+                {"$sort": {"count": -1}},
+                {"$limit": 10}
+            ]
+        }}
+    ]
+    
+    result = await SearchEvent.aggregate(pipeline).to_list()
+    facets = result[0] if result else {}
+    summary = facets.get("summary") or [{}]
+    summary = summary[0]
     
     return {
-        "total_searches": 1500,
-        "avg_results_per_search": 8.5,
+        "total_searches": summary.get("total_searches", 0),
+        "avg_results_per_search": round(summary.get("avg_results") or 0.0, 2),
         "popular_categories": [
-            {"category": "courses", "count": 800},
-            {"category": "modules", "count": 450},
-            {"category": "lessons", "count": 200},
-            {"category": "users", "count": 50}
+            {"category": item["_id"], "count": item["count"]}
+            for item in facets.get("categories", [])
         ],
-        "no_results_queries": [
-            "advanced quantum computing",
-            "deep space programming",
-            "alien technology basics"
-        ],
-        "avg_search_time_ms": 125.5
-    }
\ No newline at end of file
+        "no_results_queries": [item["query"] for item in facets.get("no_results", [])],
+        "avg_search_time_ms": round(summary.get("avg_latency_ms") or 0.0, 2),
+        "result_cache_hit_ratio": get_search_cache_stats()["hit_ratio"]
+    }
@@ -7,7 +7,11 @@ Tuân thủ: CHUCNANG.md Section 2.1, 4.1 (User Management)
 from datetime import datetime
 from typing import Optional, List
 from models.models import User
-from services.auth_service import hash_password
+from utils.security import hash_password_async
+from services.auth_service import invalidate_user_access
+from services.search_service import invalidate_user_search_results
+from services.search_service import invalidate_user_course_scope
+from services import leaderboard_service
 from beanie import PydanticObjectId
 
 
@@ -42,7 +46,7 @@ async def create_user(
         raise ValueError(f"Email {email} đã được sử dụng")
     
     # Hash password
-    hashed_pwd = hash_password(password)
+    hashed_pwd = await hash_password_async(password)
     
     # Tạo user mới
     user = User(
@@ -54,6 +58,7 @@ async def create_user(
     )
     
     await user.insert()
+    invalidate_user_search_results()
     return user
 
 
@@ -199,6 +204,10 @@ async def update_user_profile(
     user.updated_at = datetime.utcnow()
     
     await user.save()
+    if full_name is not None:
+        invalidate_user_search_results()
+    if full_name is not None or avatar_url is not None:
+        await leaderboard_service.refresh_user_display(user_id, user.full_name, user.avatar_url)
     return user
 
 
@@ -222,6 +231,8 @@ async def update_user_status(user_id: str, status: str) -> Optional[User]:
     user.updated_at = datetime.utcnow()
     
     await user.save()
+    invalidate_user_access(user_id)
+    invalidate_user_search_results()
     return user
 
 
@@ -242,7 +253,7 @@ async def change_user_password(user_id: str, new_password: str) -> Optional[User
         return None
     
     # Hash password mới
-    user.hashed_password = hash_password(new_password)
+    user.hashed_password = await hash_password_async(new_password)
     user.updated_at = datetime.utcnow()
     
     await user.save()
@@ -269,6 +280,8 @@ async def delete_user(user_id: str) -> bool:
         return False
     
     await user.delete()
+    invalidate_user_access(user_id)
+    invalidate_user_search_results()
     return True
 
 
@@ -669,7 +682,7 @@ async def create_user_admin(
         raise Exception(f"Email {email} đã được sử dụng")
     
     # Hash password (required for all roles)
-    hashed_pwd = hash_password(password)
+    hashed_pwd = await hash_password_async(password)
     
     # Create user with status=active for all roles
     user = User(
@@ -682,6 +695,7 @@ async def create_user_admin(
         avatar_url=avatar
     )
     await user.insert()
+    invalidate_user_search_results()
     
     return {
         "user_id": str(user.id),
@@ -749,6 +763,10 @@ async def update_user_admin(
     
     user.updated_at = datetime.utcnow()
     await user.save()
+    invalidate_user_access(user_id)
+    invalidate_user_search_results()
+    if full_name or avatar is not None:
+        await leaderboard_service.refresh_user_display(user_id, user.full_name, user.avatar_url)
     
     return {
         "user_id": str(user.id),
@@ -828,6 +846,8 @@ async def delete_user_admin(user_id: str) -> dict:
     
     # Delete user
     await user.delete()
+    invalidate_user_access(user_id)
+    invalidate_user_search_results()
     
     return {
         "user_id": str(user_id),
@@ -909,6 +929,9 @@ async def change_user_role_admin(user_id: str, new_role: str) -> dict:
     user.role = new_role
     user.updated_at = datetime.utcnow()
     await user.save()
+    invalidate_user_access(user_id)
+    invalidate_user_search_results()
+    invalidate_user_course_scope(user_id)
     
     return {
         "user_id": str(user.id),
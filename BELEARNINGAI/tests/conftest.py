@@ -15,6 +15,9 @@ import random
 import sys
 import os
 
+# Chế độ test: tắt rate limit (test suite gửi nhiều request liên tục từ một client)
+os.environ.setdefault("TESTING", "true")
+
 # Thêm đường dẫn gốc vào sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
@@ -22,9 +25,9 @@ from app.main import app
 from config.config import get_settings
 from models.models import (
     User, Course, Module, Lesson, Enrollment, Progress,
-    AssessmentSession, Quiz, QuizAttempt, Class, Conversation,
-    Recommendation, RefreshToken, PasswordResetTokenDocument,
-    EmbeddedModule, EmbeddedLesson
+    AssessmentSession, Quiz, QuizAttempt, QuizAttemptSummary, QuizLeaderboardEntry, BankQuestion,
+    IdempotencyRecord, Class, Conversation, Recommendation, RefreshToken, PasswordResetTokenDocument,
+    SearchEvent, EmbeddedModule, EmbeddedLesson
 )
 from utils.security import hash_password, create_access_token
 
@@ -52,8 +55,8 @@ async def test_db():
         document_models=[
             User, RefreshToken, PasswordResetTokenDocument,
             Course, Module, Lesson, Enrollment, Progress,
-            AssessmentSession, Quiz, QuizAttempt, Class,
-            Conversation, Recommendation
+            AssessmentSession, Quiz, QuizAttempt, QuizAttemptSummary, QuizLeaderboardEntry,
+            BankQuestion, IdempotencyRecord, Class, Conversation, Recommendation, SearchEvent
         ]
     )
     
@@ -362,6 +365,28 @@ def assert_response_schema(response_data: dict, required_fields: list):
         assert field in response_data, f"Missing required field: {field}"
 
 
+async def ok_asgi_app(scope, receive, send):
+    """ASGI app luôn trả 200 rỗng - dùng để test middleware riêng lẻ."""
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def call_asgi(app, path: str = "/api/v1/courses/search", method: str = "GET", token: str = None) -> dict:
+    """Gọi thẳng một ASGI app (không qua HTTP), trả message http.response.start."""
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    scope = {"type": "http", "method": method, "path": path, "headers": headers, "client": ("10.0.0.1", 1234)}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages[0]
+
+
 async def get_real_token(client, test_users, user_key: str = "student1") -> str:
     """
     Login và lấy token thật từ backend.
@@ -12,11 +12,25 @@ Endpoints:
 Sử dụng test_variables để lưu trữ và tái sử dụng tokens, user IDs.
 """
 import pytest
+from fastapi.security import HTTPAuthorizationCredentials
 from httpx import AsyncClient
-from tests.conftest import get_auth_headers, assert_response_schema
+
+from middleware.auth import get_current_user
+from middleware.rate_limit import RateLimitMiddleware
+from utils.security import create_access_token, decode_token, decode_token_cached
+from tests.conftest import get_auth_headers, assert_response_schema, call_asgi, ok_asgi_app
 from tests.test_variables import TestVariables
 
 
+def _make_access_token(user_id: str = "test-user") -> str:
+    return create_access_token({
+        "sub": user_id,
+        "email": "token@example.com",
+        "role": "student",
+        "type": "access"
+    })
+
+
 class TestAuthRegistration:
     """Test cases cho đăng ký tài khoản."""
     
@@ -274,3 +288,308 @@ class TestUserProfile:
         
         # Nếu token không hợp lệ, sẽ trả về 401, nếu validation error sẽ là 422
         assert response.status_code in [400, 401, 422]
+
+
+class TestPasswordPool:
+    """Băm/verify mật khẩu chạy trong pool riêng, quá tải thì trả 503."""
+    
+    @pytest.mark.asyncio
+    async def test_jobs_run_off_event_loop(self):
+        """Job chạy trên thread password-hash, không phải thread của event loop."""
+        import threading
+        
+        from utils import security
+        
+        thread_name = await security._run_password_job(lambda: threading.current_thread().name)
+        assert thread_name.startswith("password-hash")
+        assert security._password_pending == 0
+        
+        password_hash = await security.hash_password_async("Password@123")
+        assert await security.verify_password_async("Password@123", password_hash)
+    
+    @pytest.mark.asyncio
+    async def test_queue_full_sheds_load_with_503(self):
+        """Hàng đợi đầy -> 503 + Retry-After ngay; giải phóng thì nhận job lại."""
+        import asyncio
+        import threading
+        
+        from fastapi import HTTPException
+        from utils import security
+        
+        release = threading.Event()
+        limit = security._settings.password_hash_queue_limit
+        blocked = [
+            asyncio.create_task(security._run_password_job(release.wait, 5))
+            for _ in range(limit)
+        ]
+        await asyncio.sleep(0)
+        assert security._password_pending == limit
+        
+        try:
+            with pytest.raises(HTTPException) as exc_info:
+                await security.hash_password_async("Password@123")
+            assert exc_info.value.status_code == 503
+            assert exc_info.value.headers["Retry-After"] == "1"
+        finally:
+            release.set()
+            await asyncio.gather(*blocked)
+        
+        assert security._password_pending == 0
+        assert await security.hash_password_async("Password@123")
+
+
+class TestPasswordHashing:
+    """Test registry băm mật khẩu: rehash khi scheme/cost khác cấu hình."""
+    
+    def test_current_hash_not_rehashed(self):
+        """Hash theo cấu hình hiện tại không cần băm lại."""
+        from utils.security import hash_password, verify_and_update_password
+        
+        password_hash = hash_password("Password@123")
+        
+        assert verify_and_update_password("Password@123", password_hash) == (True, None)
+        assert verify_and_update_password("Wrong@123", password_hash) == (False, None)
+    
+    def test_legacy_scheme_and_changed_cost_rehashed(self):
+        """Hash scheme cũ hoặc cost khác cấu hình (cao hay thấp hơn) được băm lại."""
+        from passlib.context import CryptContext
+        from utils import security
+        
+        scheme = security._default_password_scheme()
+        options = security._PASSWORD_HASHERS[scheme]()
+        legacy_scheme = "bcrypt" if scheme != "bcrypt" else "argon2"
+        
+        legacy_hash = CryptContext(schemes=[legacy_scheme]).hash("Password@123")
+        higher_cost_hash = CryptContext(
+            schemes=[scheme],
+            **{f"{scheme}__{key}": value for key, value in options.items() if key != "rounds"},
+            **{f"{scheme}__rounds": options["rounds"] + 1}
+        ).hash("Password@123")
+        
+        for password_hash in (legacy_hash, higher_cost_hash):
+            assert security.password_hash_needs_update(password_hash)
+            is_valid, new_hash = security.verify_and_update_password("Password@123", password_hash)
+            assert is_valid
+            assert new_hash and not security.password_hash_needs_update(new_hash)
+
+
+class TestVerifiedJwtCache:
+    """Payload JWT đã verify được cache tới exp, token sai vẫn bị từ chối."""
+
+    @pytest.mark.asyncio
+    async def test_cached_payload_matches_full_decode(self):
+        """Payload từ cache giống hệt payload verify đầy đủ."""
+        token = _make_access_token()
+
+        assert decode_token_cached(token) == decode_token(token)
+        # Lần 2 lấy từ cache
+        assert decode_token_cached(token) == decode_token(token)
+
+    @pytest.mark.asyncio
+    async def test_invalid_token_not_cached(self):
+        """Token bị sửa vẫn bị từ chối, kể cả sau khi token gốc đã được cache."""
+        token = _make_access_token()
+        decode_token_cached(token)
+
+        tampered = token[:-2] + ("AA" if not token.endswith("AA") else "BB")
+        with pytest.raises(Exception):
+            decode_token_cached(tampered)
+
+    @pytest.mark.asyncio
+    async def test_auth_dependency_served_from_cache(self, test_users):
+        """Sau request đầu, get_current_user không verify lại JWT và không đọc DB."""
+        from services import auth_service
+        from utils import security
+
+        student = test_users["student1"]
+        token = _make_access_token(student["id"])
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+        await get_current_user(credentials)  # warm cache
+        token_hits = security._verified_token_cache.hits
+        token_misses = security._verified_token_cache.misses
+        state_hits = auth_service._user_access_cache.hits
+
+        for _ in range(10):
+            user = await get_current_user(credentials)
+
+        assert user["user_id"] == student["id"]
+        assert security._verified_token_cache.hits == token_hits + 10
+        assert security._verified_token_cache.misses == token_misses
+        assert auth_service._user_access_cache.hits == state_hits + 10
+
+
+class TestUserAccessRevocation:
+    """Kiểm tra user bị khóa/logout bị từ chối ngay dù token còn hạn."""
+
+    @pytest.mark.asyncio
+    async def test_suspended_user_rejected(self, test_users):
+        from fastapi import HTTPException
+        from services.user_service import update_user_status
+
+        student = test_users["student2"]
+        credentials = HTTPAuthorizationCredentials(
+            scheme="Bearer", credentials=_make_access_token(student["id"])
+        )
+        await get_current_user(credentials)
+
+        await update_user_status(student["id"], "suspended")
+
+        with pytest.raises(HTTPException) as exc_info:
+            await get_current_user(credentials)
+        assert exc_info.value.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_logout_revokes_only_tokens_issued_before(self, test_users):
+        import asyncio
+
+        from fastapi import HTTPException
+        from services.auth_service import revoke_user_access_tokens
+
+        student = test_users["student3"]
+        old_credentials = HTTPAuthorizationCredentials(
+            scheme="Bearer", credentials=_make_access_token(student["id"])
+        )
+        await get_current_user(old_credentials)
+
+        await asyncio.sleep(0.01)
+        await revoke_user_access_tokens(student["id"])
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await get_current_user(old_credentials)
+        assert exc_info.value.status_code == 401
+
+        # Token cấp sau logout (kể cả trong cùng giây) vẫn dùng được
+        new_credentials = HTTPAuthorizationCredentials(
+            scheme="Bearer", credentials=_make_access_token(student["id"])
+        )
+        user = await get_current_user(new_credentials)
+        assert user["user_id"] == student["id"]
+
+    def test_token_without_iat_uses_exp_minus_lifetime(self):
+        import time
+
+        from middleware.auth import _ACCESS_TOKEN_LIFETIME_SECONDS, _is_token_revoked
+
+        revoked_before = time.time()
+        state = {"tokens_revoked_before": revoked_before}
+
+        # Cấp sau logout: exp còn gần trọn thời hạn
+        fresh = {"exp": revoked_before + _ACCESS_TOKEN_LIFETIME_SECONDS + 5}
+        assert not _is_token_revoked(fresh, state)
+        # Cấp trước logout
+        stale = {"exp": revoked_before + _ACCESS_TOKEN_LIFETIME_SECONDS - 5}
+        assert _is_token_revoked(stale, state)
+        # Cùng thời điểm với logout -> bị thu hồi
+        assert _is_token_revoked({"iat": revoked_before}, state)
+        assert not _is_token_revoked({"iat": 0}, {"tokens_revoked_before": None})
+
+
+class TestRateLimitMiddleware:
+    """Token bucket theo user/IP - chi phí theo route và phản hồi 429."""
+
+    @pytest.mark.asyncio
+    async def test_over_limit_returns_429_with_retry_after(self):
+        app = RateLimitMiddleware(ok_asgi_app, requests_per_minute=60)
+
+        # Route AI (from-prompt) tốn 20 token -> 3 request hết bucket 60
+        for _ in range(3):
+            start = await call_asgi(app, "/api/v1/courses/from-prompt", "POST")
+            assert start["status"] == 200
+
+        start = await call_asgi(app, "/api/v1/courses/from-prompt", "POST")
+        assert start["status"] == 429
+        assert int(dict(start["headers"])[b"retry-after"]) >= 1
+
+        # Bucket tách theo user: user đăng nhập không bị ảnh hưởng bởi IP đã hết token
+        start = await call_asgi(app, token=_make_access_token("rate-limit-user"))
+        assert start["status"] == 200
+
+    @pytest.mark.asyncio
+    async def test_route_cost_clamped_to_capacity(self):
+        # Bucket 10 < cost 20 của from-prompt: vẫn gọi được một lần mỗi bucket đầy
+        app = RateLimitMiddleware(ok_asgi_app, requests_per_minute=10)
+
+        start = await call_asgi(app, "/api/v1/courses/from-prompt", "POST")
+        assert start["status"] == 200
+        start = await call_asgi(app, "/api/v1/courses/from-prompt", "POST")
+        assert start["status"] == 429
+
+        start = await call_asgi(app, "/api/v1/courses/c1/modules/m1/assessments/generate", "POST",
+                                 token=_make_access_token("rate-limit-assessment"))
+        assert start["status"] == 200
+        start = await call_asgi(app, "/api/v1/courses/c1/modules/m1/assessments/generate", "POST",
+                                 token=_make_access_token("rate-limit-assessment"))
+        assert start["status"] == 429
+
+    @pytest.mark.asyncio
+    async def test_ip_bucket_shared_by_authenticated_users(self):
+        # Mỗi user còn token, nhưng tổng request từ IP vượt bucket IP -> 429
+        app = RateLimitMiddleware(ok_asgi_app, requests_per_minute=5, ip_requests_per_minute=8)
+
+        statuses = []
+        for i in range(4):
+            token = _make_access_token(f"rate-limit-nat-{i}")
+            for _ in range(3):
+                statuses.append((await call_asgi(app, token=token))["status"])
+
+        assert statuses.count(200) == 8
+        assert statuses.count(429) == 4
+
+
+class TestRefreshTokenStorage:
+    """Refresh token chỉ lưu digest và được thu hồi hàng loạt."""
+
+    @pytest.mark.asyncio
+    async def test_digest_storage_and_bulk_revocation(self, test_users):
+        from datetime import datetime, timedelta
+
+        from models.models import RefreshToken
+        from services import auth_service
+        from utils.security import hash_token
+
+        user_id = test_users["student3"]["id"]
+        expires_at = datetime.utcnow() + timedelta(days=1)
+        raw_tokens = [
+            auth_service.create_refresh_token({"sub": user_id, "n": i})
+            for i in range(5)
+        ]
+        for raw in raw_tokens:
+            await auth_service.save_refresh_token(user_id, raw, expires_at)
+
+        stored = await RefreshToken.find_one(RefreshToken.token_hash == hash_token(raw_tokens[0]))
+        assert stored is not None
+        assert raw_tokens[0] not in stored.model_dump().values()
+        assert await auth_service.validate_refresh_token(raw_tokens[0]) is not None
+
+        assert await auth_service.delete_all_user_tokens(user_id) >= 5
+        assert await auth_service.validate_refresh_token(raw_tokens[0]) is None
+
+
+class TestRbacBitmask:
+    """Kiểm tra quyền bằng bitmask biên dịch sẵn thay vì dựng set mỗi request."""
+
+    def test_bitmask_matches_permission_sets(self):
+        from middleware.rbac import PERMISSION_BITS, ROLE_PERMISSIONS, has_permission
+
+        for role, permissions in ROLE_PERMISSIONS.items():
+            for permission in PERMISSION_BITS:
+                assert has_permission(role, permission) == (permission in permissions)
+        assert not has_permission("guest", "search:global")
+
+    @pytest.mark.asyncio
+    async def test_permission_dependency(self):
+        """Dependency dựng một lần cho mỗi permission; role thiếu quyền nhận 403."""
+        from fastapi import HTTPException
+        from middleware.rbac import Permission, require_permission
+
+        checker = require_permission(Permission.QUIZ_CREATE)
+        assert checker is require_permission(Permission.QUIZ_CREATE)
+
+        instructor = {"user_id": "rbac-instructor", "role": "instructor"}
+        assert await checker(instructor) is instructor
+
+        with pytest.raises(HTTPException) as exc_info:
+            await checker({"user_id": "rbac-student", "role": "student"})
+        assert exc_info.value.status_code == 403
@@ -14,7 +14,7 @@ Endpoints:
 """
 import pytest
 from httpx import AsyncClient
-from tests.conftest import get_auth_headers, assert_response_schema
+from tests.conftest import get_auth_headers, assert_response_schema, call_asgi, ok_asgi_app
 
 
 class TestCourseSearch:
@@ -319,3 +319,126 @@ class TestUnenrollment:
         response = await client.delete(f"/api/v1/enrollments/{enrollment_id}", headers=headers)
         
         assert response.status_code == 403
+
+
+class TestEnrollmentAccessCache:
+    """Kiểm tra quyền học dùng cache, invalidate đúng khi enroll/hủy."""
+
+    @pytest.mark.asyncio
+    async def test_access_follows_enroll_and_cancel(self, test_users, test_course):
+        from middleware.rbac import check_enrollment_access
+        from services import enrollment_service
+        from utils.request_context import request_scope
+
+        course_id = test_course["course_id"]
+        student_id = test_users["student4"]["id"]
+
+        assert not await check_enrollment_access(course_id, student_id, "student")
+        # Owner và admin luôn có quyền
+        assert await check_enrollment_access(course_id, test_users["admin"]["id"], "instructor")
+        assert await check_enrollment_access(course_id, test_users["instructor1"]["id"], "admin")
+
+        enrollment = await enrollment_service.create_enrollment(student_id, course_id)
+        assert await check_enrollment_access(course_id, student_id, "student")
+
+        with request_scope():
+            first = await enrollment_service.get_user_enrollment(student_id, course_id)
+            # Đọc lại trong cùng request lấy từ memo
+            assert await enrollment_service.get_user_enrollment(student_id, course_id) is first
+
+            await enrollment_service.cancel_enrollment(str(enrollment.id))
+            assert not await check_enrollment_access(course_id, student_id, "student")
+            refreshed = await enrollment_service.get_user_enrollment(student_id, course_id)
+            assert refreshed.status == "cancelled"
+
+
+class TestRequestIdentityMap:
+    """Identity map theo request và header debug X-Queries-Saved."""
+
+    @pytest.mark.asyncio
+    async def test_repeated_get_hits_identity_map(self, test_course):
+        from models.models import Course
+        from services import course_service, learning_service
+        from utils.request_context import get_document, request_scope
+
+        course_id = test_course["course_id"]
+        with request_scope() as context:
+            course = await course_service.get_course_by_id(course_id)
+            assert await get_document(Course, course_id) is course
+            # learning_service đọc lại course -> lấy từ identity map
+            await learning_service.get_course_modules_list(course_id=course_id, user_id=None)
+            assert context.queries_saved >= 2
+
+        # Ngoài request không memo
+        assert await get_document(Course, course_id) is not course
+
+    @pytest.mark.asyncio
+    async def test_debug_header_reports_queries_saved(self):
+        from middleware.request_context import RequestContextMiddleware
+        from utils.request_context import memo_lookup, memo_store
+
+        async def app(scope, receive, send):
+            memo_store("key", 1)
+            memo_lookup("key")
+            memo_lookup("key")
+            await ok_asgi_app(scope, receive, send)
+
+        start = await call_asgi(RequestContextMiddleware(app, debug_header=True))
+        assert dict(start["headers"])[b"x-queries-saved"] == b"2"
+
+
+class TestSingleFlightReads:
+    """Đầu giờ thi: các request đồng thời đọc cùng Course/Quiz dùng chung một query."""
+
+    @pytest.mark.asyncio
+    async def test_single_flight_shares_result_and_errors(self):
+        import asyncio
+
+        from utils.single_flight import SingleFlight
+
+        flight = SingleFlight()
+        calls = 0
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return calls
+
+        assert set(await asyncio.gather(*(flight.do("quiz", load) for _ in range(100)))) == {1}
+        assert calls == 1
+        assert flight.shared == 99
+        assert len(flight) == 0
+
+        # Gọi lại sau khi xong -> query mới (không cache)
+        assert await flight.do("quiz", load) == 2
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("db down")
+
+        results = await asyncio.gather(*(flight.do("quiz", fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert len(flight) == 0
+
+    @pytest.mark.asyncio
+    async def test_exam_start_reads_one_query_per_document(self, test_db, test_course):
+        import asyncio
+
+        from models.models import Course
+        from utils import request_context
+        from utils.request_context import get_document, request_scope
+
+        course_id = test_course["course_id"]
+
+        async def open_course():
+            with request_scope():
+                return await get_document(Course, course_id)
+
+        shared_before = request_context._document_flight.shared
+        courses = await asyncio.gather(*(open_course() for _ in range(500)))
+
+        assert request_context._document_flight.shared - shared_before == 499
+        assert all(course.id == course_id for course in courses)
+        # Mỗi request nhận instance riêng (sửa trong request này không lộ sang request khác)
+        assert len({id(course) for course in courses}) == 500
@@ -459,3 +459,182 @@ class TestCourseProgress:
         # Response schema sẽ phụ thuộc vào implementation cụ thể
         # Thường bao gồm: overall progress, module progress, lesson completion, quiz scores
         assert "progress_percent" in data or "overall_progress" in data
+
+
+class TestCompiledAnswerKey:
+    """Chấm điểm bằng answer key biên dịch sẵn."""
+
+    def _questions(self, count: int = 20):
+        return [
+            {
+                "question_id": f"q{i}",
+                "correct_answer": f"{'ABCD'[i % 4]}. Option {i}",
+                "is_mandatory": i % 5 == 0
+            }
+            for i in range(count)
+        ]
+
+    def test_matching_rules(self):
+        from utils.answer_key import CompiledAnswerKey, summarize_grade
+
+        key = CompiledAnswerKey([
+            {"question_id": "q1", "correct_answer": "A. python -m venv myenv", "is_mandatory": True},
+            {"question_id": "q2", "correct_answer": "B"},
+            {"question_id": "q3", "correct_answer": None},
+        ])
+        assert key.is_correct(0, "a")
+        assert key.is_correct(0, " A. Python -m venv myenv ")
+        assert not key.is_correct(0, "b")
+        assert key.is_correct(1, "B. something")
+        assert not key.is_correct(2, "anything")
+
+        mask = key.grade({"q1": "A", "q2": "C", "q3": "x"})
+        grade = summarize_grade(key, mask)
+        assert grade["correct_count"] == 1
+        assert grade["mandatory_passed"]
+
+    def test_key_reused_across_submissions(self):
+        """Một answer key chấm nhiều bài nộp; bitmask câu bắt buộc đúng từng bài."""
+        from utils.answer_key import CompiledAnswerKey, summarize_grade
+
+        questions = self._questions()
+        key = CompiledAnswerKey(questions)
+        submissions = [
+            {q["question_id"]: "ABCD"[(i + n) % 4] for i, q in enumerate(questions)}
+            for n in range(4)
+        ]
+
+        grades = [summarize_grade(key, key.grade(submission)) for submission in submissions]
+        # n = 0 chọn đúng mọi câu, n khác lệch mọi câu
+        assert [grade["correct_count"] for grade in grades] == [20, 0, 0, 0]
+        assert [grade["mandatory_passed"] for grade in grades] == [True, False, False, False]
+
+        partial = dict(submissions[1], q0="A", q5="B", q10="C", q15="D")
+        grade = summarize_grade(key, key.grade(partial))
+        assert grade["correct_count"] == 4
+        assert grade["mandatory_passed"]
+
+
+class TestQuestionBank:
+    """Lắp bài kiểm tra từ ngân hàng câu hỏi bằng seeded sampling."""
+
+    def _questions(self, count: int):
+        return [
+            {
+                "question_text": f"Câu hỏi {i}",
+                "type": "multiple_choice",
+                "options": ["A. Đúng", "B. Sai"],
+                "correct_answer": "A. Đúng",
+                "points": 10,
+                "outcome_id": f"outcome-{i % 3}"
+            }
+            for i in range(count)
+        ]
+
+    @pytest.mark.asyncio
+    async def test_assemble_from_bank(self, test_db):
+        from services.question_bank_service import add_questions, assemble_module_questions
+
+        added = await add_questions("course-1", "module-1", "medium", self._questions(30))
+        assert added == 30
+        # Thêm lại cùng nội dung -> bỏ qua
+        assert await add_questions("course-1", "module-1", "medium", self._questions(30)) == 0
+
+        questions, bank_size = await assemble_module_questions("module-1", 10, "medium", seed="quiz-a")
+
+        assert bank_size == 30
+        assert [q["order"] for q in questions] == list(range(1, 11))
+        assert len({q["question_id"] for q in questions}) == 10
+
+        # Cùng seed -> cùng bộ câu hỏi
+        again, _ = await assemble_module_questions("module-1", 10, "medium", seed="quiz-a")
+        assert [q["question_id"] for q in again] == [q["question_id"] for q in questions]
+
+        focused, _ = await assemble_module_questions(
+            "module-1", 10, "medium", focus_outcomes=["outcome-0"], seed="quiz-b"
+        )
+        assert all(q["outcome_id"] == "outcome-0" for q in focused)
+
+        # Ngân hàng chưa đủ -> None (gọi AI)
+        missing, _ = await assemble_module_questions("module-1", 10, "hard")
+        assert missing is None
+
+    def test_retake_order_is_seeded_without_copy(self):
+        from models.models import Quiz
+        from services.quiz_service import build_retake_questions
+
+        quiz = Quiz(
+            lesson_id="lesson",
+            course_id="course",
+            title="Quiz",
+            description="Quiz",
+            questions=[{"question_id": f"q{i}", "question_text": f"Q{i}"} for i in range(20)],
+            created_by="instructor"
+        )
+        first = build_retake_questions(quiz, "attempt-1")
+        assert [q["question_id"] for q in first] == [
+            q["question_id"] for q in build_retake_questions(quiz, "attempt-1")
+        ]
+        assert sorted(q["question_id"] for q in first) == sorted(q["question_id"] for q in quiz.questions)
+        assert all(any(q is original for original in quiz.questions) for q in first)
+
+
+class TestLessonNavigationOutline:
+    """Mở lesson: outline course được cache, trạng thái user lấy bằng một aggregation."""
+
+    @pytest.mark.asyncio
+    async def test_lesson_content_from_outline(self, test_users, test_course, test_enrollment):
+        from models.models import Enrollment, Progress, Quiz
+        from services import learning_service
+        from services.quiz_service import record_attempt_result, reserve_attempt_number
+
+        course_id = test_course["course_id"]
+        student_id = test_users["student1"]["id"]
+        first, second = test_course["modules"][0].lessons
+
+        quiz = Quiz(
+            lesson_id=first.id,
+            course_id=course_id,
+            title="Quiz lesson 1",
+            description="Quiz",
+            questions=[{"question_id": "q1", "correct_answer": "A"}],
+            created_by=test_users["admin"]["id"]
+        )
+        await quiz.insert()
+        learning_service.invalidate_course_outline(course_id)
+
+        await reserve_attempt_number(student_id, str(quiz.id))
+        await record_attempt_result(student_id, str(quiz.id), 90.0, True)
+        await Progress(
+            user_id=student_id,
+            course_id=course_id,
+            enrollment_id=test_enrollment["enrollment_id"],
+            lessons_progress=[{
+                "lesson_id": first.id,
+                "lesson_title": first.title,
+                "status": "in-progress",
+                "time_spent_minutes": 12
+            }]
+        ).insert()
+
+        result = await learning_service.get_lesson_content(course_id, first.id, student_id)
+        assert result["navigation"]["previous_lesson"]["id"] is None
+        assert result["navigation"]["next_lesson"] == {
+            "id": second.id, "title": second.title, "is_locked": True
+        }
+        assert result["quiz_info"] == {
+            "quiz_id": str(quiz.id), "question_count": 1, "is_mandatory": True, "is_passed": True
+        }
+        assert result["completion_status"]["time_spent_minutes"] == 12
+        assert result["module_title"] == test_course["modules"][0].title
+
+        enrollment = await Enrollment.get(test_enrollment["enrollment_id"])
+        assert enrollment.last_accessed_at is not None
+
+        # Lần mở sau dùng outline đã cache, không dựng lại
+        hits = learning_service._course_outline_cache.hits
+        misses = learning_service._course_outline_cache.misses
+        for _ in range(5):
+            await learning_service.get_lesson_content(course_id, second.id, student_id)
+        assert learning_service._course_outline_cache.hits == hits + 5
+        assert learning_service._course_outline_cache.misses == misses
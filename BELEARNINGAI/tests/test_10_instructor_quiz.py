@@ -355,3 +355,427 @@ class TestQuizClassResults:
         )
         
         assert response.status_code == 403
+
+
+class TestQuizAnalytics:
+    """Thống kê kết quả quiz dạng cột NumPy."""
+
+    def _attempt(self, user_id: str, score: float, time_spent: int, answers=None):
+        from services.quiz_analytics_service import AttemptAnalyticsProjection
+
+        return AttemptAnalyticsProjection(
+            user_id=user_id,
+            score=score,
+            passed=score >= 70,
+            time_spent_seconds=time_spent,
+            answers=answers or []
+        )
+
+    def test_best_attempt_and_histogram(self):
+        from services.quiz_analytics_service import (
+            AttemptColumns, best_attempts_per_user, score_histogram
+        )
+
+        attempts = [
+            self._attempt("u1", 60, 100),
+            self._attempt("u1", 90, 300),
+            self._attempt("u1", 90, 200),
+            self._attempt("u2", 100, 50),
+        ]
+        columns = AttemptColumns(attempts)
+        best, counts = best_attempts_per_user(columns)
+
+        assert dict(zip(columns.user_ids[best], best)) == {"u1": 2, "u2": 3}
+        assert dict(zip(columns.user_ids[best], counts)) == {"u1": 3, "u2": 1}
+
+        histogram = score_histogram(columns.scores)
+        assert histogram[-1] == {"range": "90-100", "count": 3, "percentage": 75.0}
+
+    def test_class_report_over_many_attempts(self):
+        from services.quiz_analytics_service import (
+            AttemptColumns, best_attempts_per_user, item_analysis,
+            score_histogram, score_summary
+        )
+        from utils.answer_key import CompiledAnswerKey
+
+        key = CompiledAnswerKey([
+            {"question_id": f"q{i}", "correct_answer": f"{'ABCD'[i % 4]}. Option {i}"}
+            for i in range(20)
+        ])
+        attempts = [
+            self._attempt(
+                f"student{n % 1000}",
+                float(n % 101),
+                60 + n % 600,
+                [{"question_id": f"q{i}", "selected_option": "ABCD"[(i * n) % 4]} for i in range(20)]
+            )
+            for n in range(5000)
+        ]
+
+        columns = AttemptColumns(attempts, key)
+        best, counts = best_attempts_per_user(columns)
+        summary = score_summary(columns.scores)
+        histogram = score_histogram(columns.scores)
+        analysis = item_analysis(columns)
+
+        assert best.size == 1000
+        assert counts.sum() == 5000
+        assert columns.correct.shape == (5000, 20)
+        assert sum(bucket["count"] for bucket in histogram) == 5000
+        assert (summary["lowest"], summary["highest"]) == (0.0, 100.0)
+        # Câu 0: mọi attempt chọn "A" -> luôn đúng
+        assert analysis["difficulty"][0] == 1.0
+
+
+class TestQuizListAggregation:
+    """Danh sách quiz instructor: stats attempts, search và total từ một aggregation."""
+
+    @pytest.mark.asyncio
+    async def test_stats_search_and_total(self, test_db, test_course):
+        import uuid
+
+        from models.models import Quiz, QuizAttempt
+        from services.quiz_service import list_quizzes_with_filters
+
+        instructor_id = f"bench-instructor-{uuid.uuid4()}"
+        quizzes = [
+            Quiz(
+                lesson_id="missing-lesson",
+                course_id=test_course["course_id"],
+                title=title,
+                description="Quiz benchmark",
+                questions=[{"question_id": "q1", "correct_answer": "A"}],
+                created_by=instructor_id
+            )
+            for title in ("Python cơ bản", "Python nâng cao", "Cấu trúc dữ liệu")
+        ]
+        quizzes[2].questions.append({"question_id": "q2", "correct_answer": "B"})
+        for quiz in quizzes:
+            await quiz.insert()
+
+        first_quiz_id = str(quizzes[0].id)
+        for user_id, score in (("u1", 40.0), ("u1", 90.0), ("u2", 80.0)):
+            await QuizAttempt(
+                quiz_id=first_quiz_id,
+                user_id=user_id,
+                score=score,
+                passed=score >= 70,
+                submitted_at=datetime.utcnow()
+            ).insert()
+
+        try:
+            result = await list_quizzes_with_filters(instructor_id, sort_by="pass_rate", limit=2)
+            assert result["total"] == 3
+            assert result["has_next"]
+            top = result["data"][0]
+            assert top["quiz_id"] == first_quiz_id
+            assert top["total_students"] == 2
+            assert top["completed_count"] == 3
+            assert top["pass_count"] == 2
+            assert top["pass_rate"] == pytest.approx(66.67)
+            assert top["average_score"] == pytest.approx(70.0)
+            assert top["lesson_title"] == "N/A"
+            assert top["question_count"] == 1
+
+            # Search lọc trước khi đếm -> total đúng
+            searched = await list_quizzes_with_filters(instructor_id, search="python", limit=1)
+            assert searched["total"] == 2
+            assert len(searched["data"]) == 1
+            # Khớp substring không phân biệt hoa thường, ký tự regex được escape
+            assert (await list_quizzes_with_filters(instructor_id, search="pyth"))["total"] == 2
+            assert (await list_quizzes_with_filters(instructor_id, search="BENCHMARK"))["total"] == 3
+            assert (await list_quizzes_with_filters(instructor_id, search="python.*"))["total"] == 0
+
+            by_questions = await list_quizzes_with_filters(instructor_id, sort_by="question_count", limit=1)
+            assert by_questions["data"][0]["title"] == "Cấu trúc dữ liệu"
+            assert by_questions["data"][0]["question_count"] == 2
+        finally:
+            await QuizAttempt.find(QuizAttempt.quiz_id == first_quiz_id).delete_many()
+            await Quiz.find(Quiz.created_by == instructor_id).delete_many()
+
+
+class TestQuizAttemptSummary:
+    """Summary attempts theo (user, quiz): point lookup và cấp lượt không race."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_reservations_respect_max_attempts(self, test_db):
+        import asyncio
+
+        from services.quiz_service import (
+            get_attempt_summary, get_best_quiz_score, record_attempt_result, reserve_attempt_number
+        )
+
+        numbers = await asyncio.gather(
+            *(reserve_attempt_number("race-user", "race-quiz", max_attempts=3) for _ in range(10))
+        )
+        assert sorted(n for n in numbers if n is not None) == [1, 2, 3]
+        assert numbers.count(None) == 7
+
+        await record_attempt_result("race-user", "race-quiz", 60.0, False)
+        await record_attempt_result("race-user", "race-quiz", 85.0, True)
+        await record_attempt_result("race-user", "race-quiz", 70.0, False)
+
+        summary = await get_attempt_summary("race-user", "race-quiz")
+        assert summary.attempt_count == 3
+        assert summary.passed
+        assert await get_best_quiz_score("race-user", "race-quiz") == 85.0
+
+    @pytest.mark.asyncio
+    async def test_summary_seeded_from_existing_attempts(self, test_db):
+        from models.models import QuizAttempt
+        from services.quiz_service import get_attempt_summary, reserve_attempt_number
+
+        # Attempts có từ trước khi có collection summary (chưa chạy backfill)
+        for number, score in ((1, 40.0), (2, 75.0)):
+            await QuizAttempt(
+                quiz_id="legacy-quiz",
+                user_id="legacy-user",
+                attempt_number=number,
+                score=score,
+                passed=score >= 70,
+                submitted_at=datetime.utcnow() - timedelta(hours=number)
+            ).insert()
+
+        assert await reserve_attempt_number("legacy-user", "legacy-quiz", max_attempts=3) == 3
+        assert await reserve_attempt_number("legacy-user", "legacy-quiz", max_attempts=3) is None
+
+        summary = await get_attempt_summary("legacy-user", "legacy-quiz")
+        assert summary.attempt_count == 3
+        assert summary.best_score == 75.0
+        assert summary.passed
+
+
+class TestQuizSubmissionIdempotency:
+    """Nộp quiz lặp lại cùng Idempotency-Key trả kết quả cũ, không ghi thêm."""
+
+    @pytest.mark.asyncio
+    async def test_duplicate_submission_replays_result(self, test_users, test_course, test_enrollment):
+        import asyncio
+
+        from fastapi import HTTPException
+
+        from controllers.quiz_controller import handle_attempt_quiz
+        from models.models import IdempotencyRecord, Quiz, QuizAttempt
+        from schemas.quiz import AnswerItem, QuizAttemptRequest
+        from services.quiz_service import create_new_attempt, get_attempt_count, submit_quiz_attempt
+
+        quiz = Quiz(
+            lesson_id=test_course["modules"][0].lessons[0].id,
+            course_id=test_course["course_id"],
+            title="Quiz idempotency",
+            description="Quiz",
+            questions=[
+                {"question_id": "q1", "correct_answer": "A", "is_mandatory": True},
+                {"question_id": "q2", "correct_answer": "B"}
+            ],
+            created_by=test_users["admin"]["id"]
+        )
+        await quiz.insert()
+        quiz_id = str(quiz.id)
+        student = {"user_id": test_users["student1"]["id"], "role": "student"}
+        request = QuizAttemptRequest(answers=[
+            AnswerItem(question_id="q1", selected_option="A"),
+            AnswerItem(question_id="q2", selected_option="C")
+        ])
+
+        first = await handle_attempt_quiz(quiz_id, request, student, idempotency_key="submit-1")
+        replay = await handle_attempt_quiz(quiz_id, request, student, idempotency_key="submit-1")
+
+        assert replay == first
+        assert first.score == 50.0
+        assert await QuizAttempt.find(QuizAttempt.quiz_id == quiz_id).count() == 1
+        assert await get_attempt_count(student["user_id"], quiz_id) == 1
+        record = await IdempotencyRecord.find_one(IdempotencyRecord.user_id == student["user_id"])
+        assert record.status == "completed"
+        assert record.status_code == 201
+
+        # Cùng key nhưng bài nộp khác -> 422
+        changed = QuizAttemptRequest(answers=[
+            AnswerItem(question_id="q1", selected_option="A"),
+            AnswerItem(question_id="q2", selected_option="B")
+        ])
+        with pytest.raises(HTTPException) as exc_info:
+            await handle_attempt_quiz(quiz_id, changed, student, idempotency_key="submit-1")
+        assert exc_info.value.status_code == 422
+
+        # Nộp đồng thời cùng một attempt -> chỉ một request ghi kết quả
+        attempt = await create_new_attempt(student["user_id"], quiz_id)
+        answers = [{"question_id": "q1", "answer": "A"}, {"question_id": "q2", "answer": "B"}]
+        results = await asyncio.gather(
+            *(submit_quiz_attempt(attempt.id, answers) for _ in range(5))
+        )
+        submitted = [result for result in results if result is not None]
+        assert len(submitted) == 1
+        assert submitted[0].score == 100.0
+        stored = await QuizAttempt.get(attempt.id)
+        assert stored.passed and stored.status == "Pass"
+
+    @pytest.mark.asyncio
+    async def test_double_submit_without_key_writes_one_attempt(self, test_users, test_course, test_enrollment):
+        """Nộp trùng đồng thời ghi vào cùng attempt đang làm và nhận cùng kết quả."""
+        import asyncio
+
+        from controllers.quiz_controller import handle_attempt_quiz
+        from models.models import Quiz, QuizAttempt
+        from schemas.quiz import AnswerItem, QuizAttemptRequest
+        from services.quiz_service import get_attempt_count, get_attempt_summary
+
+        quiz = Quiz(
+            lesson_id=test_course["modules"][0].lessons[0].id,
+            course_id=test_course["course_id"],
+            title="Quiz double-click",
+            description="Quiz",
+            questions=[{"question_id": "q1", "correct_answer": "A"}],
+            created_by=test_users["admin"]["id"]
+        )
+        await quiz.insert()
+        quiz_id = str(quiz.id)
+        student = {"user_id": test_users["student1"]["id"], "role": "student"}
+        request = QuizAttemptRequest(answers=[AnswerItem(question_id="q1", selected_option="A")])
+
+        results = await asyncio.gather(
+            *(handle_attempt_quiz(quiz_id, request, student) for _ in range(3))
+        )
+        assert {result.attempt_id for result in results} == {results[0].attempt_id}
+        assert all(result.score == 100.0 and result.attempt_number == 1 for result in results)
+        assert await QuizAttempt.find(QuizAttempt.quiz_id == quiz_id).count() == 1
+        assert await get_attempt_count(student["user_id"], quiz_id) == 1
+        assert (await get_attempt_summary(student["user_id"], quiz_id)).live_attempt_id is None
+
+        # Lần nộp sau (không còn attempt đang làm) là một attempt mới, không bị chặn
+        second = await handle_attempt_quiz(quiz_id, request, student)
+        assert second.attempt_id != results[0].attempt_id
+        assert second.attempt_number == 2
+        assert await QuizAttempt.find(QuizAttempt.quiz_id == quiz_id).count() == 2
+
+
+class TestStudentQuizPayload:
+    """Chi tiết quiz: phần chung build một lần mỗi phiên bản, poll lặp lại nhận 304."""
+
+    @pytest.mark.asyncio
+    async def test_serialized_payload_and_conditional_get(self, test_users, test_course, test_enrollment):
+        import json
+
+        from controllers.quiz_controller import handle_get_quiz_detail
+        from models.models import Quiz
+        from schemas.quiz import QuizDetailResponse
+        from services import quiz_service
+
+        quiz = Quiz(
+            lesson_id=test_course["modules"][0].lessons[0].id,
+            course_id=test_course["course_id"],
+            title="Quiz giữa kỳ",
+            description="Quiz",
+            time_limit_minutes=30,
+            questions=[
+                {
+                    "question_id": f"q{i}",
+                    "question_text": f"Câu {i}",
+                    "type": "multiple_choice",
+                    "options": ["A", "B", "C", "D"],
+                    "correct_answer": "A",
+                    "explanation": "Giải thích",
+                    "points": 10,
+                    "is_mandatory": i < 2,
+                    "order": i + 1
+                }
+                for i in range(40)
+            ],
+            created_by=test_users["admin"]["id"]
+        )
+        await quiz.insert()
+        quiz_id = str(quiz.id)
+        student = {"user_id": test_users["student1"]["id"], "role": "student"}
+
+        response = await handle_get_quiz_detail(quiz_id, student)
+        assert response.status_code == 200
+        assert b"correct_answer" not in response.body and b"explanation" not in response.body
+        detail = QuizDetailResponse.model_validate(json.loads(response.body))
+        assert detail.question_count == 40
+        assert detail.mandatory_question_count == 2
+        assert detail.user_attempts == 0
+        etag = response.headers["etag"]
+
+        # Cả lớp mở cùng phiên bản quiz -> dùng chung một payload
+        version = await quiz_service.get_quiz_version(quiz_id)
+        first = await quiz_service.get_student_quiz_payload(quiz_id, version.updated_at)
+        assert await quiz_service.get_student_quiz_payload(quiz_id, version.updated_at) is first
+
+        not_modified = await handle_get_quiz_detail(quiz_id, student, if_none_match=etag)
+        assert not_modified.status_code == 304
+        assert not_modified.body == b""
+
+        # Attempt mới đổi summary -> ETag đổi, body mới
+        await quiz_service.reserve_attempt_number(student["user_id"], quiz_id, quiz.max_attempts)
+        changed = await handle_get_quiz_detail(quiz_id, student, if_none_match=etag)
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+        assert json.loads(changed.body)["user_attempts"] == 1
+
+
+class TestQuizLeaderboard:
+    """Bảng xếp hạng lớp cập nhật khi nộp bài; top-N và hạng đọc từ index."""
+
+    @pytest.mark.asyncio
+    async def test_best_attempt_and_rank(self, test_db, test_users, test_course):
+        from datetime import timedelta
+
+        from models.models import Class, Quiz
+        from services import leaderboard_service
+
+        course_id = test_course["course_id"]
+        student_ids = [test_users[f"student{i}"]["id"] for i in range(1, 6)]
+        now = datetime.utcnow()
+        cls = Class(
+            name="Lớp xếp hạng",
+            description="Benchmark bảng xếp hạng",
+            course_id=course_id,
+            instructor_id=test_users["instructor1"]["id"],
+            max_students=50,
+            start_date=now,
+            end_date=now + timedelta(days=30),
+            status="active",
+            student_ids=student_ids
+        )
+        await cls.insert()
+        quiz = await Quiz.find_one(Quiz.course_id == course_id)
+        quiz_id = quiz.id if quiz else "leaderboard-quiz"
+
+        async def submit(user_id: str, score: float, seconds: int) -> int:
+            return await leaderboard_service.record_submission(
+                quiz_id, course_id, user_id, score, score >= 70, seconds, datetime.utcnow()
+            )
+
+        # student1: bài sau điểm thấp hơn không thay attempt tốt nhất
+        assert await submit(student_ids[0], 80, 600) == 1
+        await submit(student_ids[0], 60, 300)
+        # student2: bằng điểm nhưng nhanh hơn -> thay attempt tốt nhất
+        await submit(student_ids[1], 80, 900)
+        await submit(student_ids[1], 80, 500)
+        await submit(student_ids[2], 95, 1200)
+        await submit(student_ids[3], 40, 200)
+
+        entries = await leaderboard_service.get_top_entries(quiz_id, cls.id, 10)
+        assert [entry.user_id for entry in entries] == [
+            student_ids[2], student_ids[1], student_ids[0], student_ids[3]
+        ]
+        first = next(entry for entry in entries if entry.user_id == student_ids[0])
+        assert (first.score, first.time_spent_seconds, first.attempt_count) == (80, 600, 2)
+        second = next(entry for entry in entries if entry.user_id == student_ids[1])
+        assert (second.score, second.time_spent_seconds, second.attempt_count) == (80, 500, 2)
+
+        # Hạng đếm từ index khớp thứ tự top-N
+        for rank, entry in enumerate(entries, start=1):
+            ranked = await leaderboard_service.get_user_rank(quiz_id, cls.id, entry.user_id)
+            assert ranked[0] == rank
+        assert await leaderboard_service.get_user_rank(quiz_id, cls.id, student_ids[4]) is None
+
+        board = await leaderboard_service.get_leaderboard(quiz_id, cls.id, student_ids[3], limit=2)
+        assert board["total_ranked"] == 4
+        assert [item["user_id"] for item in board["top"]] == student_ids[2:0:-1]
+        assert board["my_rank"]["rank"] == 4
+
+        # Học viên rời lớp -> biến mất khỏi bảng xếp hạng
+        await leaderboard_service.remove_class_member(cls.id, student_ids[2])
+        entries = await leaderboard_service.get_top_entries(quiz_id, cls.id, 10)
+        assert entries[0].user_id == student_ids[1]
@@ -252,3 +252,274 @@ class TestUniversalSearch:
                 assert course["level"] == "Beginner"
                 if "avg_rating" in course:
                     assert course["avg_rating"] >= 4.0
+
+
+class TestAccessScopeCache:
+    """Scope truy cập của search: cache theo (role, user) và bị xóa khi enroll."""
+    
+    def test_ttl_cache_lru_ttl_and_hit_ratio(self):
+        """TTLCache loại entry cũ nhất khi đầy, bỏ entry hết hạn, đếm hit/miss."""
+        from utils.cache import TTLCache
+        
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1  # "a" thành mới dùng nhất
+        cache.set("c", 3)           # vượt maxsize -> loại "b"
+        assert "b" not in cache
+        assert cache.get("b", "missing") == "missing"
+        
+        cache.set("expired", 4, ttl=0)
+        assert cache.get("expired") is None
+        assert "expired" not in cache
+        
+        assert cache.invalidate_where(lambda key: key in ("a", "c")) == 2
+        assert len(cache) == 0
+        assert (cache.hits, cache.misses) == (1, 2)
+        assert cache.hit_ratio == pytest.approx(1 / 3)
+    
+    @pytest.mark.asyncio
+    async def test_scope_cached_until_enrollment(self, test_db, test_users):
+        """Lần đọc thứ hai lấy từ cache; enroll làm mới scope của đúng user đó."""
+        from models.models import Course
+        from services import search_service
+        from services.enrollment_service import create_enrollment
+        
+        course = Course(
+            title="Scope Cache Draft",
+            description="Khóa học chưa publish",
+            category="Programming",
+            level="Beginner",
+            status="draft",
+            owner_id=test_users["admin"]["id"],
+            owner_type="admin"
+        )
+        await course.insert()
+        search_service.invalidate_all_course_scopes()
+        
+        student = {"user_id": test_users["student3"]["id"], "role": "student"}
+        other = {"user_id": test_users["student4"]["id"], "role": "student"}
+        
+        course_ids, digest = await search_service._get_course_scope(student)
+        await search_service._get_course_scope(other)
+        assert course.id not in course_ids
+        
+        hits = search_service._course_scope_cache.hits
+        assert await search_service._get_course_scope(student) == (course_ids, digest)
+        assert search_service._course_scope_cache.hits == hits + 1
+        
+        await create_enrollment(student["user_id"], course.id)
+        
+        # Scope của user khác vẫn giữ trong cache
+        assert ("student", other["user_id"]) in search_service._course_scope_cache
+        enrolled_ids, enrolled_digest = await search_service._get_course_scope(student)
+        assert course.id in enrolled_ids
+        assert enrolled_digest != digest
+
+
+class TestConcurrentCategorySearch:
+    """Sub-search chạy đồng thời: category quá hạn bị bỏ, các category khác vẫn trả."""
+    
+    @pytest.mark.asyncio
+    async def test_timeout_returns_partial_results(self):
+        """Category chậm thành _TIMED_OUT; lỗi khác vẫn raise."""
+        import asyncio
+        
+        from services import search_service
+        
+        async def slow_search():
+            await asyncio.sleep(5)
+            return {"category": "users", "items": [{"id": "u1"}], "count": 1}
+        
+        async def broken_search():
+            raise ValueError("query lỗi")
+        
+        courses = {"category": "courses", "items": [{"id": "c1"}, {"id": "c2"}], "count": 2}
+        lessons = {"category": "lessons", "items": [{"id": "l1"}], "count": 1}
+        
+        async def fast_search(result):
+            return result
+        
+        outcomes = await asyncio.gather(
+            search_service._run_with_timeout(fast_search(lessons), timeout=1),
+            search_service._run_with_timeout(slow_search(), timeout=0.01),
+            search_service._run_with_timeout(fast_search(courses), timeout=1)
+        )
+        assert outcomes[1] is search_service._TIMED_OUT
+        
+        with pytest.raises(ValueError):
+            await search_service._run_with_timeout(broken_search(), timeout=1)
+        
+        results, timed_out, total = search_service._collect_category_results({
+            "lessons": outcomes[0],
+            "users": outcomes[1],
+            "courses": outcomes[2],
+            "modules": {"category": "modules", "items": [], "count": 0}
+        })
+        # Thứ tự theo _CATEGORY_ORDER, category rỗng bị bỏ
+        assert [group["category"] for group in results] == ["courses", "lessons"]
+        assert timed_out == ["users"]
+        assert total == 3
+
+
+class TestFuzzyMatching:
+    """Sửa lỗi chính tả bằng trigram index + edit distance có giới hạn."""
+    
+    def test_bounded_edit_distance(self):
+        """Đếm chèn/xóa/thay thế/hoán vị; vượt giới hạn thì trả None."""
+        from utils.fuzzy import bounded_edit_distance
+        
+        assert bounded_edit_distance("python", "python", 2) == 0
+        assert bounded_edit_distance("pyhton", "python", 2) == 1  # hoán vị
+        assert bounded_edit_distance("pythn", "python", 2) == 1   # thiếu ký tự
+        assert bounded_edit_distance("pithan", "python", 2) == 2
+        assert bounded_edit_distance("java", "python", 2) is None
+        assert bounded_edit_distance("abcdef", "ghijkl", 2) is None
+    
+    def test_trigram_index_correct(self):
+        """Sửa từng từ sai, ưu tiên từ gần nhất rồi từ phổ biến hơn."""
+        from utils.fuzzy import TrigramIndex
+        
+        index = TrigramIndex()
+        index.add_texts([
+            "lap trinh python co ban",
+            "python nang cao",
+            "cau truc du lieu",
+            "pytorch cho deep learning"
+        ])
+        
+        assert "python" in index
+        assert "co" not in index  # từ quá ngắn không vào vocabulary
+        assert index.closest_term("python") == "python"
+        assert index.correct("pyhton nang cao") == "python nang cao"
+        assert index.correct("cau truk du lieu") == "cau truc du lieu"
+        # Query đúng hoặc không có từ nào đủ gần -> None
+        assert index.correct("python nang cao") is None
+        assert index.correct("kubernetes") is None
+
+
+class TestSearchResultCache:
+    """Result cache của search: ghi dữ liệu thì kết quả cache cũ bị bỏ."""
+    
+    @pytest.mark.asyncio
+    async def test_user_writes_invalidate_user_results(self, test_db):
+        """Tạo/khóa user làm mới cache category users, không đụng cache course."""
+        from services import search_service, user_service
+        
+        search_service._search_result_cache.set(("courses-key",), {"categories": {}})
+        search_service._user_search_cache.set(("users-key",), {"category": "users"})
+        generation = search_service._user_search_generation
+        
+        user = await user_service.create_user(
+            email="search.cache@example.com",
+            password="Search@12345",
+            full_name="Search Cache"
+        )
+        
+        assert search_service._user_search_cache.get(("users-key",)) is None
+        assert search_service._user_search_generation == generation + 1
+        assert search_service._search_result_cache.get(("courses-key",)) is not None
+        
+        search_service._user_search_cache.set(("users-key",), {"category": "users"})
+        await user_service.update_user_status(user.id, "suspended")
+        assert search_service._user_search_cache.get(("users-key",)) is None
+    
+    @pytest.mark.asyncio
+    async def test_course_writes_bump_generation(self, test_db, test_users):
+        """Ghi course tăng generation, xóa cache course/scope, giữ cache users."""
+        from services import course_service, search_service
+        
+        search_service.bump_search_generation()
+        generation = search_service._search_generation
+        key = (generation, "python", (None, None, None, None), "student", "digest")
+        search_service._search_result_cache.set(key, {"categories": {}, "suggestions": []})
+        search_service._user_search_cache.set(("users-key",), {"category": "users"})
+        
+        hits = search_service.get_search_cache_stats()["hits"]
+        assert search_service._search_result_cache.get(key) is not None
+        assert search_service.get_search_cache_stats()["hits"] == hits + 1
+        
+        await course_service.create_course(
+            title="Generation Course",
+            description="Ghi course mới",
+            category="Programming",
+            level="Beginner",
+            owner_id=test_users["admin"]["id"]
+        )
+        
+        stats = search_service.get_search_cache_stats()
+        assert stats["generation"] == generation + 1
+        assert stats["size"] == 0
+        assert search_service._search_result_cache.get(key) is None
+        assert len(search_service._course_scope_cache) == 0
+        assert search_service._user_search_cache.get(("users-key",)) is not None
+
+
+class TestSearchEvents:
+    """Search events ghi theo batch, là nguồn cho lịch sử và analytics."""
+    
+    @pytest.mark.asyncio
+    async def test_events_buffered_then_flushed_in_one_batch(self, test_db, test_users):
+        """Events nằm trong buffer tới khi flush, flush ghi toàn bộ một lần."""
+        from models.models import SearchEvent
+        from services import search_service
+        
+        # Bỏ events còn lại từ test trước
+        await search_service.flush_search_events()
+        user_id = test_users["student1"]["id"]
+        for i in range(3):
+            search_service._record_search_event(
+                user_id=user_id,
+                query=f"Python {i}",
+                normalized_query=f"python {i}",
+                category_counts={"courses": i},
+                total_results=i,
+                latency_ms=5
+            )
+        
+        assert len(search_service._pending_search_events) == 3
+        assert await SearchEvent.find(SearchEvent.user_id == user_id).count() == 0
+        
+        await search_service.flush_search_events()
+        
+        assert search_service._pending_search_events == []
+        assert await SearchEvent.find(SearchEvent.user_id == user_id).count() == 3
+        zero = await SearchEvent.find_one(SearchEvent.query == "Python 0")
+        assert zero.zero_results is True
+    
+    @pytest.mark.asyncio
+    async def test_history_and_analytics(self, test_db, test_users):
+        """Popular search lấy cách viết mới nhất; analytics chỉ tính trong khoảng ngày."""
+        from datetime import datetime, timedelta
+        
+        from models.models import SearchEvent
+        from services import search_service
+        
+        user_id = test_users["student2"]["id"]
+        now = datetime.utcnow()
+        await SearchEvent.insert_many([
+            SearchEvent(
+                user_id=user_id, query="python", normalized_query="python",
+                total_results=3, created_at=now - timedelta(hours=2)
+            ),
+            SearchEvent(
+                user_id=user_id, query="Python", normalized_query="python",
+                total_results=3, created_at=now - timedelta(hours=1)
+            ),
+            SearchEvent(
+                user_id=user_id, query="pascal", normalized_query="pascal",
+                total_results=0, zero_results=True, created_at=now - timedelta(days=40)
+            )
+        ])
+        
+        history = await search_service.get_search_history(user_id)
+        assert [item["query"] for item in history["search_history"]] == ["Python", "python", "pascal"]
+        assert history["popular_searches"][0] == "Python"
+        
+        analytics = await search_service.get_search_analytics(window_days=30)
+        assert analytics["total_searches"] == 2
+        assert analytics["no_results_queries"] == []
+        
+        analytics = await search_service.get_search_analytics(window_days=60)
+        assert analytics["total_searches"] == 3
+        assert analytics["no_results_queries"] == ["pascal"]
@@ -0,0 +1,125 @@
+"""
+Answer key biên dịch sẵn cho chấm điểm quiz
+Chuẩn hóa đáp án, tính trước các dạng đáp án được chấp nhận và bitmask
+câu bắt buộc một lần cho mỗi phiên bản quiz; chấm bài chỉ còn một vòng lặp.
+
+Quy tắc khớp đáp án (không phân biệt hoa thường, bỏ khoảng trắng đầu/cuối):
+- Đáp án user bắt đầu bằng đáp án đúng (gồm cả khớp chính xác):
+  "a. python -m venv" khớp đáp án "a"
+- User chỉ gửi chữ cái đầu của đáp án đúng: "a" khớp "a. python -m venv"
+- User gửi phần trước dấu "." của đáp án đúng: "a" khớp "a. ..."
+"""
+
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+
+def normalize_answer(value: Any) -> str:
+    return str(value).strip().lower()
+
+
+def answer_value(answer: Any) -> Any:
+    """Lấy đáp án từ AnswerItem hoặc dict (answer/student_answer/selected_option)."""
+    if isinstance(answer, dict):
+        return answer.get("answer") or answer.get("student_answer") or answer.get("selected_option")
+    return getattr(answer, "selected_option", None) or getattr(answer, "answer", None)
+
+
+def answers_by_question(answers: List[Any]) -> Dict[str, Any]:
+    """question_id -> đáp án user."""
+    return {
+        (answer.get("question_id") if isinstance(answer, dict) else answer.question_id): answer_value(answer)
+        for answer in answers
+    }
+
+
+def _accepted_short_forms(correct: str) -> FrozenSet[str]:
+    """Các dạng rút gọn (chữ cái option, phần trước dấu chấm) được chấp nhận."""
+    forms = {correct[:1]}
+    forms.update(correct[:index] for index, char in enumerate(correct) if char == ".")
+    return frozenset(forms)
+
+
+class CompiledAnswerKey:
+    """
+    Answer key của một phiên bản quiz
+
+    Attributes:
+        question_ids: question_id theo thứ tự câu hỏi
+        mandatory_mask: Bit i bật nếu câu i bắt buộc
+        mandatory_total: Số câu bắt buộc
+    """
+
+    __slots__ = ("question_ids", "mandatory_mask", "mandatory_total", "_keys")
+
+    def __init__(self, questions: List[dict]):
+        question_ids = []
+        keys: List[Optional[Tuple[str, FrozenSet[str]]]] = []
+        mandatory_mask = 0
+
+        for index, question in enumerate(questions):
+            question_ids.append(question.get("question_id") or question.get("id"))
+
+            correct_answer = question.get("correct_answer")
+            correct = normalize_answer(correct_answer) if correct_answer else ""
+            # Câu không có đáp án đúng thì không bao giờ được tính đúng
+            keys.append((correct, _accepted_short_forms(correct)) if correct else None)
+
+            if question.get("is_mandatory", False):
+                mandatory_mask |= 1 << index
+
+        self.question_ids: Tuple[Optional[str], ...] = tuple(question_ids)
+        self.mandatory_mask = mandatory_mask
+        self.mandatory_total = bin(mandatory_mask).count("1")
+        self._keys = tuple(keys)
+
+    @property
+    def total(self) -> int:
+        return len(self.question_ids)
+
+    def is_correct(self, index: int, answer: Any) -> bool:
+        """Kiểm tra đáp án user cho câu thứ index."""
+        key = self._keys[index]
+        if key is None or not answer:
+            return False
+        normalized = normalize_answer(answer)
+        correct, short_forms = key
+        return normalized.startswith(correct) or normalized in short_forms
+
+    def grade(self, answers_by_question: Mapping[str, Any]) -> int:
+        """
+        Chấm toàn bộ bài
+
+        Args:
+            answers_by_question: question_id -> đáp án user
+
+        Returns:
+            Bitmask các câu đúng (bit i = câu i)
+        """
+        correct_mask = 0
+        for index, (question_id, key) in enumerate(zip(self.question_ids, self._keys)):
+            if key is None:
+                continue
+            answer = answers_by_question.get(question_id)
+            if not answer:
+                continue
+            normalized = normalize_answer(answer)
+            if normalized.startswith(key[0]) or normalized in key[1]:
+                correct_mask |= 1 << index
+        return correct_mask
+
+    def mandatory_correct(self, correct_mask: int) -> int:
+        return bin(correct_mask & self.mandatory_mask).count("1")
+
+    def mandatory_passed(self, correct_mask: int) -> bool:
+        return (correct_mask & self.mandatory_mask) == self.mandatory_mask
+
+
+def summarize_grade(key: CompiledAnswerKey, correct_mask: int) -> Dict[str, Any]:
+    """Tổng hợp số câu đúng/bắt buộc từ bitmask kết quả."""
+    return {
+        "correct_count": bin(correct_mask).count("1"),
+        "total_count": key.total,
+        "mandatory_correct": key.mandatory_correct(correct_mask),
+        "mandatory_total": key.mandatory_total,
+        "mandatory_passed": key.mandatory_passed(correct_mask),
+    }
@@ -0,0 +1,83 @@
+"""
+Cache in-memory dùng chung trong một worker (LRU + TTL)
+Dùng cho dữ liệu đọc nhiều, ghi ít: scope truy cập, kết quả search, ...
+Không thread-safe - chỉ dùng trong event loop của FastAPI.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    LRU cache có thời hạn sống (TTL) cho từng entry
+
+    - Khi vượt maxsize: loại entry ít dùng gần đây nhất
+    - Entry hết hạn bị coi như không tồn tại và bị xóa khi đọc
+    - Đếm hits/misses để expose hit ratio cho monitoring
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Lấy value theo key, trả default nếu không có hoặc đã hết hạn."""
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Lưu value với TTL mặc định hoặc TTL riêng (giây)."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        """Xóa một key (không lỗi nếu key không tồn tại)."""
+        self._data.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Xóa tất cả keys thỏa predicate, trả về số entry đã xóa."""
+        stale_keys = [key for key in self._data if predicate(key)]
+        for key in stale_keys:
+            del self._data[key]
+        return len(stale_keys)
+
+    def clear(self) -> None:
+        """Xóa toàn bộ cache (giữ nguyên thống kê hits/misses)."""
+        self._data.clear()
+
+    @property
+    def hit_ratio(self) -> float:
+        """Tỉ lệ hit trên tổng số lần đọc (0-1)."""
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key, _MISSING)
+        return entry is not _MISSING and entry[0] > time.monotonic()
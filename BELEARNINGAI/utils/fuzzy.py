@@ -0,0 +1,162 @@
+"""
+Fuzzy matching dựa trên trigram index
+Dùng cho gợi ý "did you mean" và tìm kiếm chịu lỗi chính tả:
+- Sinh candidates qua các trigram chung (posting lists), không so sánh từng cặp
+- Xác minh candidates bằng edit distance có giới hạn (dừng sớm)
+Input phải là text đã fold (normalize_search_query).
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set
+
+
+# Từ ngắn hơn không đủ trigram để sửa lỗi đáng tin cậy
+MIN_TERM_LENGTH = 3
+
+
+def _trigrams(term: str) -> Set[str]:
+    """Tập trigram của một từ, có padding để giữ thông tin đầu/cuối từ."""
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _max_distance_for(term: str) -> int:
+    """Số lỗi cho phép theo độ dài từ."""
+    return 1 if len(term) <= 4 else 2
+
+
+def bounded_edit_distance(a: str, b: str, max_distance: int) -> Optional[int]:
+    """
+    Edit distance (Damerau - tính cả hoán vị 2 ký tự liền kề) giữa a và b
+
+    Returns:
+        Khoảng cách, hoặc None nếu vượt max_distance (dừng sớm theo từng hàng)
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(
+                previous[j] + 1,         # xóa
+                current[j - 1] + 1,      # chèn
+                previous[j - 1] + cost   # thay thế
+            )
+            if (
+                previous_previous is not None
+                and j > 1
+                and a[i - 1] == b[j - 2]
+                and a[i - 2] == b[j - 1]
+            ):
+                value = min(value, previous_previous[j - 2] + 1)  # hoán vị
+            current[j] = value
+            row_min = min(row_min, value)
+
+        if row_min > max_distance:
+            return None
+        previous_previous, previous = previous, current
+
+    distance = previous[-1]
+    return distance if distance <= max_distance else None
+
+
+class TrigramIndex:
+    """
+    Index trigram -> các từ trong vocabulary
+
+    Lookup chỉ duyệt posting lists của các trigram có trong từ cần sửa,
+    nên chi phí phụ thuộc số candidate chứ không phải kích thước catalog.
+    """
+
+    def __init__(self, max_candidates: int = 50):
+        self.max_candidates = max_candidates
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        self._frequency: Dict[str, int] = defaultdict(int)
+
+    def add_text(self, text: str) -> None:
+        """Thêm các từ trong một đoạn text đã fold vào vocabulary."""
+        for term in text.split():
+            if len(term) < MIN_TERM_LENGTH:
+                continue
+            if term not in self._frequency:
+                for gram in _trigrams(term):
+                    self._postings[gram].add(term)
+            self._frequency[term] += 1
+
+    def add_texts(self, texts: Iterable[str]) -> None:
+        for text in texts:
+            self.add_text(text)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self._frequency
+
+    def __len__(self) -> int:
+        return len(self._frequency)
+
+    def closest_term(self, term: str) -> Optional[str]:
+        """
+        Từ gần nhất trong vocabulary (trong giới hạn edit distance)
+
+        Returns:
+            Chính term nếu đã có trong vocabulary, từ sửa lỗi nếu tìm được,
+            None nếu không có candidate đủ gần
+        """
+        if term in self._frequency:
+            return term
+        if len(term) < MIN_TERM_LENGTH:
+            return None
+
+        max_distance = _max_distance_for(term)
+        grams = _trigrams(term)
+
+        # Đếm số trigram chung qua posting lists
+        shared_counts: Dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for candidate in self._postings.get(gram, ()):
+                shared_counts[candidate] += 1
+
+        # Mỗi lỗi làm hỏng tối đa 3 trigram -> loại sớm candidate quá xa
+        min_shared = max(1, len(grams) - 3 * max_distance)
+        candidates = sorted(
+            (candidate for candidate, count in shared_counts.items() if count >= min_shared),
+            key=lambda candidate: shared_counts[candidate],
+            reverse=True
+        )[:self.max_candidates]
+
+        best_term = None
+        best_rank = None
+        for candidate in candidates:
+            distance = bounded_edit_distance(term, candidate, max_distance)
+            if distance is None:
+                continue
+            # Ưu tiên khoảng cách nhỏ, sau đó từ xuất hiện nhiều hơn
+            rank = (distance, -self._frequency[candidate])
+            if best_rank is None or rank < best_rank:
+                best_term, best_rank = candidate, rank
+
+        return best_term
+
+    def correct(self, text: str) -> Optional[str]:
+        """
+        Sửa lỗi chính tả từng từ trong query đã fold
+
+        Returns:
+            Query đã sửa, hoặc None nếu không có từ nào cần/thể sửa
+        """
+        terms = text.split()
+        corrected_terms = []
+        changed = False
+        for term in terms:
+            corrected = self.closest_term(term)
+            if corrected and corrected != term:
+                corrected_terms.append(corrected)
+                changed = True
+            else:
+                corrected_terms.append(term)
+
+        return " ".join(corrected_terms) if changed else None
@@ -0,0 +1,22 @@
+"""
+Helper HTTP conditional GET (ETag / If-None-Match)
+"""
+
+from typing import Optional
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Kiểm tra header If-None-Match có khớp ETag hiện tại không
+
+    Hỗ trợ danh sách nhiều ETag, "*" và prefix weak W/ (so sánh weak theo RFC 9110).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == current
+        for candidate in if_none_match.split(",")
+    )
@@ -0,0 +1,126 @@
+"""
+Context theo từng request (contextvars)
+- Memo dữ liệu đã đọc trong phạm vi một request (enrollment, ...)
+- Identity map cho Beanie document: get() cùng id trong một request chỉ query một lần
+- get() cùng id từ nhiều request đồng thời dùng chung một query (single-flight)
+Do RequestContextMiddleware khởi tạo. Ngoài request (script, test gọi service
+trực tiếp) không có context -> đọc thẳng DB, không memo.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional, Type, TypeVar
+
+from utils.single_flight import SingleFlight
+
+
+DocumentT = TypeVar("DocumentT")
+
+# Sentinel cho memo_lookup: phân biệt "chưa memo" với giá trị None đã memo
+MISSING = object()
+
+
+class RequestContext:
+    """Dữ liệu sống trong một request"""
+
+    __slots__ = ("memo", "queries_saved")
+
+    def __init__(self):
+        self.memo: dict = {}
+        # Số query DB tránh được nhờ memo/identity map (debug header)
+        self.queries_saved = 0
+
+
+_request_context: ContextVar[Optional[RequestContext]] = ContextVar("request_context", default=None)
+
+
+def get_request_context() -> Optional[RequestContext]:
+    """Context của request hiện tại, None nếu không ở trong request."""
+    return _request_context.get()
+
+
+def get_request_memo() -> Optional[dict]:
+    """Dict memo của request hiện tại, None nếu không ở trong request."""
+    context = _request_context.get()
+    return context.memo if context is not None else None
+
+
+def memo_lookup(key: Any) -> Any:
+    """
+    Đọc một entry memo và đếm query đã tránh được
+
+    Returns:
+        Giá trị đã memo, hoặc MISSING nếu chưa có / không ở trong request
+    """
+    context = _request_context.get()
+    if context is None:
+        return MISSING
+    value = context.memo.get(key, MISSING)
+    if value is not MISSING:
+        context.queries_saved += 1
+    return value
+
+
+def memo_store(key: Any, value: Any) -> None:
+    """Lưu entry memo (bỏ qua nếu không ở trong request)."""
+    context = _request_context.get()
+    if context is not None:
+        context.memo[key] = value
+
+
+# ============================================================================
+# IDENTITY MAP
+# ============================================================================
+
+# Query get() đang chạy theo (model, id), dùng chung giữa các request trong worker
+_document_flight = SingleFlight()
+
+
+def _document_key(model: type, document_id: Any) -> tuple:
+    return ("document", model.__name__, str(document_id))
+
+
+async def get_document(model: Type[DocumentT], document_id: Any) -> Optional[DocumentT]:
+    """
+    model.get(document_id) qua identity map của request
+
+    Cùng id trong một request trả về cùng instance: thay đổi và save()
+    trên instance đó được các đoạn code đọc sau nhìn thấy.
+    Request khác đọc cùng id trong lúc query đang chạy dùng chung query đó
+    nhưng nhận bản copy riêng - instance không bao giờ dùng chung giữa các request.
+    """
+    key = _document_key(model, document_id)
+    document = memo_lookup(key)
+    if document is not MISSING:
+        return document
+
+    leader = False
+
+    async def fetch():
+        nonlocal leader
+        leader = True
+        return await model.get(document_id)
+
+    document = await _document_flight.do(key, fetch)
+    if document is not None and not leader:
+        document = document.model_copy(deep=True)
+    memo_store(key, document)
+    return document
+
+
+def forget_document(model: type, document_id: Any) -> None:
+    """Bỏ document khỏi identity map (sau khi xóa document)."""
+    memo = get_request_memo()
+    if memo is not None:
+        memo.pop(_document_key(model, document_id), None)
+
+
+@contextmanager
+def request_scope() -> Iterator[RequestContext]:
+    """Mở context mới cho một request và dọn khi request kết thúc."""
+    context = RequestContext()
+    token = _request_context.set(context)
+    try:
+        yield context
+    finally:
+        _request_context.reset(token)
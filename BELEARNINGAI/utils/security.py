@@ -1,48 +1,248 @@
 """Hàm bảo mật dùng chung cho dịch vụ xác thực."""
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+import asyncio
 import hashlib
+import os
 import uuid
 import secrets
 import string
-from typing import Any, Dict
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
 
-from fastapi import Request
-from jose import jwt
+from fastapi import HTTPException, Request, status
+import jwt
 from passlib.context import CryptContext
 
 from config.config import get_settings
+from utils.cache import TTLCache
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 _settings = get_settings()
 
 
-def hash_password(password: str) -> str:
+# ============================================================================
+# PASSWORD HASHER REGISTRY
+# ============================================================================
+
+# scheme passlib -> hàm trả cost options hiện tại của scheme đó
+_PASSWORD_HASHERS: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def register_password_hasher(scheme: str, options_factory: Callable[[], Dict[str, Any]]) -> None:
+    """
+    Đăng ký một scheme băm mật khẩu (tên scheme của passlib)
+
+    Mọi scheme đã đăng ký đều verify được; chỉ PASSWORD_HASH_SCHEME dùng để
+    băm mới, các scheme còn lại bị coi là legacy và được rehash khi login.
+    options_factory trả đúng tên tham số mà passlib handler parse từ hash
+    (rounds, memory_cost, ...) để so cost của hash cũ với cấu hình hiện tại.
+    """
+    _PASSWORD_HASHERS[scheme] = options_factory
+
+
+def _bcrypt_options() -> Dict[str, Any]:
+    return {"rounds": _settings.bcrypt_rounds}
+
+
+def _argon2_options() -> Dict[str, Any]:
+    # passlib gọi time_cost của argon2 là rounds
+    return {
+        "memory_cost": _settings.argon2_memory_cost_kib,
+        "parallelism": _settings.argon2_parallelism,
+        "rounds": _settings.argon2_time_cost,
+    }
+
+
+register_password_hasher("bcrypt", _bcrypt_options)
+register_password_hasher("argon2", _argon2_options)
+
+
+def _default_password_scheme() -> str:
+    scheme = _settings.password_hash_scheme
+    return scheme if scheme in _PASSWORD_HASHERS else "bcrypt"
+
+
+def _build_password_context() -> CryptContext:
+    """
+    Tạo CryptContext từ registry: scheme mặc định đứng đầu, các scheme khác
+    được đánh dấu deprecated để verify_and_update trả hash mới.
+    """
+    default_scheme = _default_password_scheme()
+    schemes = [default_scheme] + [s for s in _PASSWORD_HASHERS if s != default_scheme]
+
+    options: Dict[str, Any] = {}
+    for scheme in schemes:
+        for key, value in _PASSWORD_HASHERS[scheme]().items():
+            options[f"{scheme}__{key}"] = value
+
+    return CryptContext(schemes=schemes, default=default_scheme, deprecated="auto", **options)
+
+
+pwd_context = _build_password_context()
+
+# bcrypt/argon2 là CPU-bound (~100-250ms mỗi lần) nhưng nhả GIL -> chạy trong
+# thread pool riêng, sized theo số core, để không chặn event loop.
+_password_workers = _settings.password_hash_workers or os.cpu_count() or 2
+_password_executor = ThreadPoolExecutor(
+    max_workers=_password_workers,
+    thread_name_prefix="password-hash"
+)
+# Số thao tác băm đang chạy + đang chờ trong pool (chỉ truy cập từ event loop)
+_password_pending = 0
+
+
+def _prepare_password(password: str) -> str:
     """
-    Băm mật khẩu bằng bcrypt.
     Bcrypt chỉ hỗ trợ tối đa 72 ký tự, nếu dài hơn sẽ bị lỗi.
-    Do đó cần cắt ngắn mật khẩu trước khi hash.
+    Cắt giống nhau khi hash và verify để hash cũ (bcrypt) và hash mới
+    (scheme khác) cho cùng kết quả với mật khẩu dài.
     """
-    password = password[:72]  # Giới hạn độ dài mật khẩu tránh lỗi ValueError
-    return pwd_context.hash(password)
+    return password[:72]
+
+
+def hash_password(password: str) -> str:
+    """Băm mật khẩu bằng scheme mặc định (PASSWORD_HASH_SCHEME)."""
+
+    return pwd_context.hash(_prepare_password(password))
 
 
 def verify_password(password: str, password_hash: str) -> bool:
     """Kiểm tra mật khẩu người dùng."""
 
-    return pwd_context.verify(password, password_hash)
+    return pwd_context.verify(_prepare_password(password), password_hash)
+
+
+def password_hash_needs_update(password_hash: str) -> bool:
+    """
+    Hash cần băm lại khi scheme khác PASSWORD_HASH_SCHEME hoặc bất kỳ tham số
+    cost nào (rounds, memory_cost, parallelism) khác cấu hình hiện tại -
+    kể cả khi cost cũ cao hơn. CryptContext.needs_update của passlib chỉ
+    bắt được cost thấp hơn min_rounds nên không dùng được để nâng cost.
+    """
+    scheme = pwd_context.identify(password_hash)
+    if scheme != _default_password_scheme():
+        return True
+
+    parsed = pwd_context.handler(scheme).from_string(password_hash)
+    return any(
+        getattr(parsed, key, value) != value
+        for key, value in _PASSWORD_HASHERS[scheme]().items()
+    )
+
+
+def verify_and_update_password(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    """
+    Kiểm tra mật khẩu và trả hash mới nếu hash hiện tại cần nâng cấp
+    (scheme legacy hoặc cost khác cấu hình hiện tại)
+
+    Returns:
+        (hợp lệ, hash mới hoặc None)
+    """
+    prepared = _prepare_password(password)
+    if not pwd_context.verify(prepared, password_hash):
+        return False, None
+    if password_hash_needs_update(password_hash):
+        return True, pwd_context.hash(prepared)
+    return True, None
+
+
+async def _run_password_job(func, *args):
+    """
+    Chạy thao tác băm/verify mật khẩu trong password pool
+
+    Khi hàng đợi vượt PASSWORD_HASH_QUEUE_LIMIT thì trả 503 ngay (shed load)
+    thay vì để request xếp hàng tới timeout.
+    """
+    global _password_pending
+
+    if _password_pending >= _settings.password_hash_queue_limit:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Hệ thống đang quá tải, vui lòng thử lại sau",
+            headers={"Retry-After": "1"}
+        )
+
+    _password_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_password_executor, func, *args)
+    finally:
+        _password_pending -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    """Băm mật khẩu trong password pool (không chặn event loop)."""
+
+    return await _run_password_job(hash_password, password)
+
+
+async def verify_password_async(password: str, password_hash: str) -> bool:
+    """Kiểm tra mật khẩu trong password pool (không chặn event loop)."""
+
+    return await _run_password_job(verify_password, password, password_hash)
+
+
+async def verify_and_update_password_async(
+    password: str,
+    password_hash: str
+) -> Tuple[bool, Optional[str]]:
+    """verify_and_update_password chạy trong password pool."""
+
+    return await _run_password_job(verify_and_update_password, password, password_hash)
 
 
-def _token_payload(base_payload: Dict[str, Any], expires_delta: timedelta) -> Dict[str, Any]:
-    expire = datetime.now(timezone.utc) + expires_delta
+def calibrate_argon2_time_cost(target_ms: int, max_time_cost: int = 10) -> int:
+    """
+    Tìm time_cost để verify argon2 mất khoảng target_ms trên máy hiện tại
+
+    Chỉ dùng để chọn giá trị ARGON2_TIME_COST khi triển khai
+    (scripts/calibrate_password_hashing.py). Server luôn dùng cost đã cấu hình
+    để mọi worker/host băm cùng tham số.
+    """
+
+    base_options = _argon2_options()
+    time_cost = 1
+    while True:
+        context = CryptContext(
+            schemes=["argon2"],
+            argon2__memory_cost=base_options["memory_cost"],
+            argon2__parallelism=base_options["parallelism"],
+            argon2__rounds=time_cost,
+        )
+        sample_hash = context.hash("calibration-password")
+        start = time.perf_counter()
+        context.verify("calibration-password", sample_hash)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        if elapsed_ms >= target_ms or time_cost >= max_time_cost:
+            return time_cost
+        # Thời gian verify tăng gần tuyến tính theo time_cost
+        time_cost = min(
+            max_time_cost,
+            max(time_cost + 1, int(time_cost * target_ms / max(elapsed_ms, 1.0)))
+        )
+
+
+def build_token_payload(base_payload: Dict[str, Any], expires_delta: timedelta) -> Dict[str, Any]:
+    """
+    Thêm exp và iat vào payload JWT
+
+    iat lưu tới mili giây (NumericDate cho phép số thực) để so với mốc logout
+    (User.tokens_revoked_at) không bị làm tròn về giây.
+    """
+    issued_at = int(time.time() * 1000) / 1000
     payload = base_payload.copy()
-    payload.update({"exp": expire})
+    payload.update({
+        "iat": issued_at,
+        "exp": datetime.fromtimestamp(issued_at, timezone.utc) + expires_delta
+    })
     return payload
 
 
 def create_access_token(data: Dict[str, Any]) -> str:
     """Sinh access token JWT."""
 
-    to_encode = _token_payload(data, timedelta(minutes=_settings.access_token_expire_minutes))
+    to_encode = build_token_payload(data, timedelta(minutes=_settings.access_token_expire_minutes))
     return jwt.encode(to_encode, _settings.secret_key, algorithm=_settings.algorithm)
 
 
@@ -50,7 +250,7 @@ def create_refresh_token(data: Dict[str, Any]) -> str:
     """Sinh refresh token JWT."""
 
     expire_days = getattr(_settings, "refresh_token_expire_days", 7)
-    to_encode = _token_payload(data, timedelta(days=expire_days))
+    to_encode = build_token_payload(data, timedelta(days=expire_days))
     return jwt.encode(to_encode, _settings.secret_key, algorithm=_settings.algorithm)
 
 
@@ -60,6 +260,34 @@ def decode_token(token: str) -> Dict[str, Any]:
     return jwt.decode(token, _settings.secret_key, algorithms=[_settings.algorithm])
 
 
+# Payload JWT đã verify theo sha256 digest của token, mỗi entry sống tới exp.
+# Một trang dashboard gọi 6-10 API cùng token -> chỉ verify HMAC lần đầu.
+_verified_token_cache = TTLCache(
+    maxsize=10000,
+    ttl=_settings.access_token_expire_minutes * 60
+)
+
+
+def decode_token_cached(token: str) -> Dict[str, Any]:
+    """
+    Giải mã JWT như decode_token, nhưng cache payload đã verify tới thời điểm exp.
+    Token không hợp lệ không được cache (luôn raise như decode_token).
+    Payload trả về được dùng chung giữa các request - không được sửa.
+    """
+    cache_key = hashlib.sha256(token.encode("utf-8")).digest()
+    payload = _verified_token_cache.get(cache_key)
+    if payload is not None:
+        return payload
+
+    payload = decode_token(token)
+
+    # Token không có exp thì không cache
+    remaining_seconds = payload.get("exp", 0) - time.time()
+    if remaining_seconds > 0:
+        _verified_token_cache.set(cache_key, payload, ttl=remaining_seconds)
+    return payload
+
+
 def generate_session_id() -> str:
     """Sinh mã phiên duy nhất."""
 
@@ -0,0 +1,47 @@
+"""
+Single-flight: gộp các lời gọi đồng thời cùng key thành một lần chạy
+Khi cả lớp bắt đầu bài kiểm tra, hàng trăm request cùng đọc một Quiz/Course/Class
+trong vài giây; trong một worker chỉ request đầu tiên query DB, các request
+đến trong lúc query đang chạy chờ chung kết quả đó.
+Không cache: lời gọi xong là key được giải phóng, lời gọi sau query lại.
+Chỉ dùng trong event loop của FastAPI (không thread-safe).
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+
+ResultT = TypeVar("ResultT")
+
+
+class SingleFlight:
+    """
+    Nhóm các lời gọi in-flight theo key
+
+    - Lời gọi đầu tiên với key chạy fn() trong task riêng
+    - Lời gọi cùng key khi task chưa xong chờ chung task đó
+    - Request đầu bị hủy (client ngắt kết nối) không hủy task của các request còn lại
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        # Số lời gọi đã dùng chung kết quả thay vì tự query (monitoring/test)
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[ResultT]]) -> ResultT:
+        """Chạy fn() hoặc chờ lời gọi fn() đang chạy cùng key, trả về kết quả chung."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def __len__(self) -> int:
+        return len(self._calls)